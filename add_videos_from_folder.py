@@ -1,7 +1,24 @@
 """
-Script to add videos or playlists to the Streamer application from a local folder.
-- If folder contains 1 video: adds it as a single video
-- If folder contains multiple videos: creates a playlist with all videos
+Bulk import local video folders into the Streamer application.
+
+Every folder under each root that directly holds video files is one import
+group: a playlist named after the folder when it holds at least
+--playlist-min videos, single videos otherwise. Encodes run --jobs at a time
+and each finished video is committed right away, so an interrupted run keeps
+everything already imported.
+
+Imported files are recorded in the imported_files manifest. Re-runs skip
+files whose size and mtime are unchanged; with --hash, changed or moved files
+whose content was already imported are skipped too. New files in a folder
+that already became a playlist are appended to it.
+
+--watch keeps running after the first pass and imports files created in or
+moved into the roots once they stop changing (import_settle_seconds). Roots
+and user default to import_watch_folders and import_watch_user.
+
+    python add_videos_from_folder.py --user alice /mnt/archive/shows /mnt/archive/movies --jobs 4
+    python add_videos_from_folder.py --user alice /mnt/archive --dry-run
+    python add_videos_from_folder.py --user alice /srv/incoming --watch
 """
 
 import warnings
@@ -10,266 +27,504 @@ warnings.filterwarnings("ignore", message=".*trapped.*")
 
 import os
 import sys
+import time
 import uuid
-from pathlib import Path
+import shutil
+import signal
+import hashlib
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
-from db import SessionLocal, engine, Base
+from sqlalchemy import select, update, func
+from db import SessionLocal
 from models.users import User
-from models.videos import Video, VideoStatus, Playlist, PlaylistVideoMapping
-from utils.downloads_processor import DownloadedVideoProcessor
+from models.videos import Video, VideoStatus, Playlist, PlaylistVideoMapping, POSITION_GAP
+from models.imports import ImportedFile
+from utils.downloads_processor import DownloadedVideoProcessor, VIDEO_EXTENSIONS
+from utils.admission import AdmissionController
+from utils.folder_watch import create_watcher, SettleTracker
 from config import setting
+from utils.migrations import upgrade_database
+
+
+def format_bytes(size: float) -> str:
+    for unit in ("B", "KB", "MB", "GB", "TB"):
+        if size < 1024 or unit == "TB":
+            return f"{size:.1f} {unit}"
+        size /= 1024
+
+
+def format_duration(seconds: float) -> str:
+    seconds = int(seconds)
+    hours, rest = divmod(seconds, 3600)
+    return f"{hours}h{rest // 60:02d}m" if hours else f"{rest // 60}m{rest % 60:02d}s"
+
+
+def is_video(name: str) -> bool:
+    return not name.startswith(".") and os.path.splitext(name)[1].lower() in VIDEO_EXTENSIONS
 
 
-def add_videos_from_folder(username: str, folder_path: str):
+def folder_group(root: str, folder: str, names: list, playlist_min: int, only: set = None) -> dict:
     """
-    Process videos from a folder and add them to the database for the specified user.
-    
-    Args:
-        username: Username of the owner
-        folder_path: Absolute path to the folder containing video(s)
+    Import group for the videos `names` of `folder`, as a dict with title,
+    folder, playlist (bool) and files [(path, size, mtime)]. Whether it is a
+    playlist depends on all of the folder's videos, even when `only` limits
+    the files to import. Titles are the folder path from the root's parent,
+    e.g. "shows / Show A / Season 1".
     """
-    
-    # Create all tables if they don't exist
-    Base.metadata.create_all(bind=engine)
-    
-    # Create a database session
-    db = SessionLocal()
-    
-    try:
-        # Find the user
-        user = db.query(User).filter(User.username == username).first()
-        
-        if not user:
-            print(f"❌ User '{username}' not found in database.")
-            print("   Please create the user first.")
-            return
-        
-        print(f"✅ Found user: {username} (ID: {user.id})")
-        
-        # Validate folder path
-        if not os.path.isdir(folder_path):
-            print(f"❌ Error: '{folder_path}' is not a valid directory.")
-            return
-        
-        # Initialize video processor
-        processor = DownloadedVideoProcessor(
-            base_storage_path=setting.base_storage_path,
-            tmp_downloaded_path=os.path.dirname(folder_path)
-        )
-        
-        # Find all videos in the folder
-        folder_name = os.path.basename(folder_path)
-        videos_found = processor.find_all_videos(folder_name)
-        
-        if not videos_found:
-            print(f"❌ No video files found in '{folder_path}'")
-            return
-        
-        print(f"\n📹 Found {len(videos_found)} video(s) in folder")
-        for i, video_path in enumerate(videos_found, 1):
-            print(f"   {i}. {os.path.basename(video_path)}")
-        
-        # Determine if single video or playlist
-        if len(videos_found) == 1:
-            print("\n🎬 Processing as single video...")
-            _process_single_video(db, processor, videos_found[0], user.id, folder_name)
+    videos = sorted((name for name in names if is_video(name)), key=str.lower)
+    files = []
+    for name in videos:
+        path = os.path.join(folder, name)
+        if only is not None and path not in only:
+            continue
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue
+        files.append((path, stat.st_size, stat.st_mtime))
+    return {
+        "title": " / ".join(os.path.relpath(folder, os.path.dirname(root)).split(os.sep)),
+        "folder": folder,
+        "playlist": len(videos) >= playlist_min,
+        "files": files,
+    }
+
+
+def scan_roots(roots: list, playlist_min: int) -> list:
+    """Import groups for every folder below `roots` that directly holds videos."""
+    groups = []
+    for root in roots:
+        for folder, dirs, files in os.walk(root):
+            # Hidden folders (.Trash, .thumbnails ...) never hold anything worth importing
+            dirs[:] = sorted(d for d in dirs if not d.startswith("."))
+            group = folder_group(root, folder, files, playlist_min)
+            if group["files"]:
+                groups.append(group)
+    return groups
+
+
+def file_hash(path: str) -> str:
+    with open(path, "rb") as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
+
+
+class ImportManifest:
+    """
+    Decides which scanned files still need importing, from the owner's
+    imported_files rows: unchanged size and mtime means imported. Only new
+    and changed files are hashed (with `use_hash`), --jobs at a time.
+    """
+
+    def __init__(self, db, owner_id: str, use_hash: bool, jobs: int):
+        self.db = db
+        self.owner_id = owner_id
+        self.use_hash = use_hash
+        self.jobs = jobs
+
+    def _known(self, folders: set) -> dict:
+        """Manifest rows of files directly in `folders`, by path."""
+        known = {}
+        for folder in folders:
+            rows = self.db.scalars(
+                select(ImportedFile).where(
+                    ImportedFile.owner_id == self.owner_id,
+                    ImportedFile.path.startswith(folder + os.sep, autoescape=True),
+                )
+            )
+            known.update((row.path, row) for row in rows if os.path.dirname(row.path) == folder)
+        return known
+
+    def filter(self, groups: list, record: bool = True) -> tuple:
+        """
+        (groups left to import, skipped file count). Copies of imported
+        content found with --hash are recorded unless `record` is false. Each
+        returned group also carries playlist_id and base_position of the
+        folder's existing playlist, or the adopt list of video ids imported
+        from the folder as single videos, which go first in a playlist created
+        for it.
+        """
+        known = self._known({group["folder"] for group in groups})
+        candidates = [
+            (group, file) for group in groups for file in group["files"]
+            if not self._unchanged(known.get(file[0]), file)
+        ]
+        hashes = {}
+        if self.use_hash and candidates:
+            with ThreadPoolExecutor(self.jobs, thread_name_prefix="import-hash") as executor:
+                paths = [file[0] for _, file in candidates]
+                hashes = dict(zip(paths, executor.map(file_hash, paths)))
+
+        skipped = sum(len(group["files"]) for group in groups) - len(candidates)
+        remaining = {}
+        for group, file in candidates:
+            path = file[0]
+            if path in hashes and self._record_duplicate(known.get(path), file, hashes[path]):
+                skipped += 1
+                continue
+            remaining.setdefault(group["folder"], []).append(file + (hashes.get(path),))
+        if record:
+            self.db.commit()
         else:
-            print("\n📚 Processing as playlist...")
-            _process_playlist(db, processor, videos_found, user.id, folder_name)
-        
-        print("\n" + "="*60)
-        print("✅ All videos processed successfully!")
-        print("="*60)
-        
-    except Exception as e:
-        print(f"\n❌ Error occurred: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        db.rollback()
-    finally:
-        db.close()
+            self.db.rollback()
 
+        result = []
+        for group in groups:
+            if group["folder"] not in remaining:
+                continue
+            group = dict(group, files=remaining[group["folder"]], playlist_id=None, base_position=0, adopt=[])
+            imported = sorted(
+                (row for row in known.values() if os.path.dirname(row.path) == group["folder"]),
+                key=lambda row: os.path.basename(row.path).lower()
+            )
+            playlist_ids = {row.playlist_id for row in imported if row.playlist_id}
+            existing = self.db.scalars(select(Playlist.id).where(Playlist.id.in_(playlist_ids))).first()
+            if existing:
+                group["playlist"] = True
+                group["playlist_id"] = existing
+                group["base_position"] = self.db.scalar(
+                    select(func.max(PlaylistVideoMapping.position)).where(PlaylistVideoMapping.playlist_id == existing)
+                ) or 0
+            elif group["playlist"] and imported:
+                video_ids = [row.video_id for row in imported]
+                alive = set(self.db.scalars(select(Video.id).where(Video.id.in_(video_ids))))
+                group["adopt"] = [video_id for video_id in video_ids if video_id in alive]
+            result.append(group)
+        return result, skipped
+
+    @staticmethod
+    def _unchanged(row: ImportedFile, file: tuple) -> bool:
+        return row is not None and row.size_bytes == file[1] and row.mtime == file[2]
+
+    def _record_duplicate(self, row: ImportedFile, file: tuple, content_hash: str) -> bool:
+        """Point the manifest at the video already imported from this content, if any."""
+        path, size, mtime = file
+        if row is not None and row.content_hash == content_hash:
+            # Touched or copied over with the same content
+            row.size_bytes, row.mtime = size, mtime
+            return True
+        match = self.db.scalars(
+            select(ImportedFile).where(
+                ImportedFile.owner_id == self.owner_id, ImportedFile.content_hash == content_hash
+            ).limit(1)
+        ).first()
+        if match is None:
+            return False
+        # Moved or duplicated within the roots
+        self.db.merge(ImportedFile(
+            owner_id=self.owner_id, path=path, size_bytes=size, mtime=mtime, content_hash=content_hash,
+            video_id=match.video_id, imported_at=time.time()
+        ))
+        return True
+
+
+def print_plan(groups: list, skipped: int = 0):
+    total_files = sum(len(group["files"]) for group in groups)
+    total_bytes = sum(file[1] for group in groups for file in group["files"])
+    playlists = [group for group in groups if group["playlist"]]
+    for group in groups:
+        size = format_bytes(sum(file[1] for file in group["files"]))
+        if group.get("playlist_id"):
+            print(f"   📚 playlist '{group['title']}': {len(group['files'])} new videos, {size}")
+        elif group["playlist"]:
+            print(f"   📚 playlist '{group['title']}': {len(group['files'])} videos, {size}")
+        else:
+            for path, file_size, *_ in group["files"]:
+                print(f"   🎬 video '{os.path.splitext(os.path.basename(path))[0]}': {format_bytes(file_size)}")
+    print(f"\n📹 {total_files} video(s) in {len(groups)} folder(s), {len(playlists)} playlist(s), {format_bytes(total_bytes)}")
+    if skipped:
+        print(f"   {skipped} file(s) already imported, skipped")
+
+
+class DiskGuard:
+    """
+    Refuses an encode whose estimated renditions, plus those of encodes
+    already running, would leave less than `min_free` bytes on the storage disk.
+    """
+
+    def __init__(self, path: str, min_free: int):
+        self.path = path
+        self.min_free = min_free
+        self.outstanding = 0
+        self.lock = threading.Lock()
+
+    def reserve(self, required: int) -> bool:
+        with self.lock:
+            free = shutil.disk_usage(self.path).free
+            if free - self.outstanding - required < self.min_free:
+                return False
+            self.outstanding += required
+            return True
+
+    def release(self, required: int):
+        with self.lock:
+            self.outstanding -= required
+
+
+class BulkImporter:
+    def __init__(self, owner_id: str, jobs: int, progress_seconds: float):
+        self.owner_id = owner_id
+        self.jobs = jobs
+        self.progress_seconds = progress_seconds
+        self.processor = DownloadedVideoProcessor(setting.base_storage_path, setting.tmp_downloading_path)
+        os.makedirs(setting.base_storage_path, exist_ok=True)
+        self.disk = DiskGuard(setting.base_storage_path, setting.min_free_disk_bytes)
+        self.playlists = {}
+        self.failures = []
+        self.imported = 0
+        self.done_bytes = 0
+        self.output_bytes = 0
+
+    def encode(self, path: str) -> dict:
+        """Probe, check disk space and transcode one file. Runs on an executor thread."""
+        meta = self.processor.probe_video(path)
+        variants = self.processor.select_variants(meta["width"], meta["height"])
+        if not variants:
+            raise Exception(f"{meta['width']}x{meta['height']} is below the smallest rendition")
+        required = AdmissionController.estimate_encode_bytes(
+            meta["duration"], [self.processor.presets[variant][2] for variant in variants]
+        )
+        if not self.disk.reserve(required):
+            raise Exception(f"Not enough disk space for an estimated {format_bytes(required)} of renditions")
 
-def _process_single_video(db, processor, video_path, owner_id, folder_name):
-    """Process and add a single video to the database."""
-    
-    video_filename = os.path.basename(video_path)
-    video_title = os.path.splitext(video_filename)[0]
-    
-    print(f"\n   Processing: {video_filename}")
-    print(f"   - Video path: {video_path}")
-    
-    # Verify file exists
-    if not os.path.isfile(video_path):
-        raise FileNotFoundError(f"Video file not found: {video_path}")
-    
-    # Create unique storage path for this video
-    video_id = str(uuid.uuid4())
-    storage_path = os.path.join(owner_id, video_id)
-    output_dir = os.path.join(setting.base_storage_path, storage_path)
-    
-    # Process the video (generate HLS, thumbnail, etc.)
-    print("   - Generating HLS streams...")
-    try:
-        metadata = processor.process_video(video_path, output_dir)
-    except Exception as e:
-        print(f"   ❌ Failed to process video: {str(e)}")
-        raise
-    
-    # Create video record
-    video = Video(
-        id=video_id,
-        title=video_title,
-        owner_id=owner_id,
-        storage_path=storage_path,
-        thumbnail_url=f"{storage_path}/thumbnail.jpg",
-        status=VideoStatus.PROCESSED,
-        duration_seconds=int(metadata["duration"]),
-        width=metadata["width"],
-        height=metadata["height"],
-        size_bytes=metadata["size_bytes"]
-    )
-    
-    db.add(video)
-    db.commit()
-    
-    print(f"   ✅ Video added: '{video_title}' (ID: {video_id})")
-    print(f"      Duration: {int(metadata['duration'])}s | Resolution: {metadata['width']}x{metadata['height']}")
-    print(f"      Size: {metadata['size_bytes'] / (1024*1024):.2f} MB")
-    print(f"      Variants: {', '.join(metadata['variants'])}")
-
-
-def _process_playlist(db, processor, video_paths, owner_id, folder_name):
-    """Process multiple videos and create a playlist."""
-    
-    # Create playlist
-    playlist_id = str(uuid.uuid4())
-    playlist_title = folder_name
-    
-    playlist = Playlist(
-        id=playlist_id,
-        title=playlist_title,
-        owner_id=owner_id
-    )
-    
-    db.add(playlist)
-    db.commit()
-    
-    print(f"   ✅ Created playlist: '{playlist_title}' (ID: {playlist_id})")
-    
-    # Process each video
-    for position, video_path in enumerate(video_paths, start=1):
-        video_filename = os.path.basename(video_path)
-        video_title = os.path.splitext(video_filename)[0]
-        
-        print(f"\n   [{position}/{len(video_paths)}] Processing: {video_filename}")
-        print(f"       - Video path: {video_path}")
-        
-        # Verify file exists
-        if not os.path.isfile(video_path):
-            print(f"       ❌ Video file not found, skipping...")
-            continue
-        
-        # Create unique storage path for this video
         video_id = str(uuid.uuid4())
-        storage_path = os.path.join(owner_id, video_id)
+        storage_path = f"users/{self.owner_id}/videos/{video_id}"
         output_dir = os.path.join(setting.base_storage_path, storage_path)
-        
-        # Process the video
-        print("       - Generating HLS streams...")
+        started = time.monotonic()
         try:
-            metadata = processor.process_video(video_path, output_dir)
-        except Exception as e:
-            print(f"       ❌ Failed to process video: {str(e)}")
-            continue
-        
-        # Create video record
-        video = Video(
-            id=video_id,
-            title=video_title,
-            owner_id=owner_id,
-            storage_path=storage_path,
-            thumbnail_url=f"{storage_path}/thumbnail.jpg",
+            metadata = self.processor.process_video(path, output_dir)
+        except Exception:
+            # Half-written renditions would never be referenced by a video row
+            shutil.rmtree(output_dir, ignore_errors=True)
+            raise
+        finally:
+            self.disk.release(required)
+        return {
+            "video_id": video_id,
+            "storage_path": storage_path,
+            "metadata": metadata,
+            "elapsed": time.monotonic() - started,
+            "output_bytes": sum(
+                entry.stat().st_size for variant in os.scandir(output_dir) if variant.is_dir()
+                for entry in os.scandir(variant.path)
+            ),
+        }
+
+    def record(self, db, group: dict, position: int, file: tuple, result: dict):
+        """
+        Insert the video, its manifest entry and its playlist on first use
+        from the main thread, one commit per video.
+        """
+        path, size, mtime, content_hash = file
+        metadata = result["metadata"]
+        db.add(Video(
+            id=result["video_id"],
+            title=os.path.splitext(os.path.basename(path))[0],
+            owner_id=self.owner_id,
+            storage_path=result["storage_path"],
+            thumbnail_url=f"{result['storage_path']}/thumbnail.jpg",
             status=VideoStatus.PROCESSED,
             duration_seconds=int(metadata["duration"]),
             width=metadata["width"],
             height=metadata["height"],
             size_bytes=metadata["size_bytes"]
-        )
-        
-        db.add(video)
-        db.flush()  # Get the video ID
-        
-        # Create playlist mapping
-        mapping = PlaylistVideoMapping(
-            playlist_id=playlist_id,
-            video_id=video_id,
-            position=position
-        )
-        
-        db.add(mapping)
+        ))
+        playlist_id = None
+        if group["playlist"]:
+            playlist_id = self.playlists.get(group["folder"]) or group.get("playlist_id")
+            if playlist_id is None:
+                playlist_id = self.playlists[group["folder"]] = str(uuid.uuid4())
+                db.add(Playlist(id=playlist_id, title=group["title"], owner_id=self.owner_id))
+                # Videos imported from the folder before it had enough for a playlist go first
+                for index, video_id in enumerate(group.get("adopt", []), start=1):
+                    db.add(PlaylistVideoMapping(playlist_id=playlist_id, video_id=video_id, position=index * POSITION_GAP))
+                if group.get("adopt"):
+                    db.execute(
+                        update(ImportedFile)
+                        .where(ImportedFile.owner_id == self.owner_id, ImportedFile.video_id.in_(group["adopt"]))
+                        .values(playlist_id=playlist_id)
+                    )
+            db.flush()
+            # Positions follow file name order whatever order the encodes finish in
+            db.add(PlaylistVideoMapping(playlist_id=playlist_id, video_id=result["video_id"], position=position))
+        db.merge(ImportedFile(
+            owner_id=self.owner_id, path=path, size_bytes=size, mtime=mtime, content_hash=content_hash,
+            video_id=result["video_id"], playlist_id=playlist_id, imported_at=time.time()
+        ))
         db.commit()
-        
-        print(f"       ✅ Added to playlist at position {position}")
-        print(f"          Duration: {int(metadata['duration'])}s | Resolution: {metadata['width']}x{metadata['height']}")
-        print(f"          Size: {metadata['size_bytes'] / (1024*1024):.2f} MB")
-    
-    print(f"\n   ✅ Playlist complete with {len(video_paths)} videos")
+
+    def run(self, db, groups: list):
+        # Gapped like the playlist endpoints number them, appended after an existing playlist's last video
+        items = [
+            (group, group.get("base_position", 0) + (len(group.get("adopt", [])) + index) * POSITION_GAP, file)
+            for group in groups
+            for index, file in enumerate(group["files"], start=1)
+        ]
+        total_bytes = sum(file[1] for *_, file in items)
+        started = time.monotonic()
+
+        def eta() -> str:
+            elapsed = time.monotonic() - started
+            if not self.done_bytes:
+                return "ETA unknown"
+            return f"ETA {format_duration((total_bytes - self.done_bytes) * elapsed / self.done_bytes)}"
+
+        executor = ThreadPoolExecutor(self.jobs, thread_name_prefix="import-encode")
+        pending = {executor.submit(self.encode, item[2][0]): item for item in items}
+        finished = 0
+        try:
+            while pending:
+                done, _ = wait(pending, timeout=self.progress_seconds, return_when=FIRST_COMPLETED)
+                if not done:
+                    running = min(self.jobs, len(pending))
+                    print(f"   … {running} encoding, {finished}/{len(items)} done, {eta()}", flush=True)
+                    continue
+                for future in done:
+                    group, position, file = pending.pop(future)
+                    path = file[0]
+                    finished += 1
+                    self.done_bytes += file[1]
+                    name = os.path.relpath(path, os.path.dirname(group["folder"]))
+                    try:
+                        result = future.result()
+                        self.record(db, group, position, file, result)
+                    except Exception as e:
+                        db.rollback()
+                        self.failures.append((path, str(e)))
+                        print(f"   [{finished}/{len(items)}] ❌ {name}: {str(e)}", flush=True)
+                        continue
+                    self.imported += 1
+                    self.output_bytes += result["output_bytes"]
+                    metadata = result["metadata"]
+                    speed = metadata["duration"] / result["elapsed"] if result["elapsed"] else 0
+                    print(
+                        f"   [{finished}/{len(items)}] ✅ {name} | {format_duration(metadata['duration'])} "
+                        f"| {', '.join(metadata['variants'])} | {format_duration(result['elapsed'])} ({speed:.1f}x) | {eta()}",
+                        flush=True
+                    )
+        except KeyboardInterrupt:
+            print("\n❌ Interrupted: waiting for running encodes, queued files are skipped", flush=True)
+            executor.shutdown(wait=True, cancel_futures=True)
+            raise
+        finally:
+            executor.shutdown(wait=True)
+        return time.monotonic() - started
+
+    def print_summary(self, elapsed: float, total: int):
+        print("\n" + "=" * 60)
+        print(f"✅ Imported {self.imported}/{total} video(s) into {len(self.playlists)} new playlist(s) in {format_duration(elapsed)}")
+        print(f"   Source {format_bytes(self.done_bytes)} -> renditions {format_bytes(self.output_bytes)}")
+        if self.failures:
+            print(f"❌ {len(self.failures)} failed:")
+            for path, error in self.failures:
+                print(f"   {path}: {error}")
+        print("=" * 60)
+
+
+def import_groups(db, manifest: ImportManifest, groups: list, args, dry_run: bool = False) -> int:
+    """Filter `groups` through the manifest and import what is left. Returns the failure count."""
+    groups, skipped = manifest.filter(groups, record=not dry_run)
+    print_plan(groups, skipped)
+    if dry_run or not groups:
+        return 0
+    print(f"\n✅ Importing with {args.jobs} parallel transcode(s)\n")
+    importer = BulkImporter(manifest.owner_id, args.jobs, args.progress_seconds)
+    elapsed = importer.run(db, groups)
+    importer.print_summary(elapsed, sum(len(group["files"]) for group in groups))
+    return len(importer.failures)
+
+
+def watch(db, manifest: ImportManifest, watcher, roots: list, args):
+    """Import video files that appear under `roots` once they stop changing, until interrupted."""
+    settle = SettleTracker(args.settle_seconds)
+    print(f"\n👀 Watching {', '.join(roots)} ({type(watcher).__name__}), files settle after {args.settle_seconds}s", flush=True)
+    try:
+        while True:
+            changed = watcher.poll(1.0)
+            if watcher.overflowed:
+                # Events were dropped, the manifest tells what is actually new
+                watcher.overflowed = False
+                changed = {file[0] for group in scan_roots(roots, args.playlist_min) for file in group["files"]}
+            settle.add(path for path in changed if is_video(os.path.basename(path)))
+            ready = settle.settled()
+            if not ready:
+                continue
+            folders = {}
+            for path in ready:
+                folders.setdefault(os.path.dirname(path), set()).add(path)
+            groups = []
+            for folder, paths in sorted(folders.items()):
+                root = max((root for root in roots if folder == root or folder.startswith(root + os.sep)), key=len)
+                try:
+                    names = os.listdir(folder)
+                except FileNotFoundError:
+                    continue
+                groups.append(folder_group(root, folder, names, args.playlist_min, only=paths))
+            print(f"\n📥 {len(ready)} new file(s) settled", flush=True)
+            import_groups(db, manifest, [group for group in groups if group["files"]], args)
+    finally:
+        watcher.close()
 
 
 def main():
-    """Main entry point with user input prompts."""
-    
-    print("="*60)
-    print("  Video/Playlist Importer for Streamer")
-    print("="*60)
-    
-    # Get username
-    username = input("\nEnter username: ").strip()
-    
-    if not username:
-        print("❌ Username cannot be empty")
-        return
-    
-    # Get folder path
-    folder_path = input("Enter full path to video folder: ").strip()
-    
-    # Remove quotes if user wrapped path in quotes
-    folder_path = folder_path.strip("'\"")
-    
-    if not folder_path:
-        print("❌ Folder path cannot be empty")
-        return
-    
-    # Expand user path (handles ~)
-    folder_path = os.path.expanduser(folder_path)
-    folder_path = os.path.abspath(folder_path)
-    
-    print(f"\n📂 Using folder: {folder_path}")
-    
-    # Confirm before processing
-    confirm = input("\nProceed with processing? (y/n): ").strip().lower()
-    
-    if confirm != 'y':
-        print("❌ Operation cancelled")
-        return
-    
-    print("\n" + "="*60)
-    print("Starting video processing...")
-    print("="*60)
-    
-    # Process videos
-    add_videos_from_folder(username, folder_path)
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("roots", nargs="*", help="Folders to import, searched recursively (default: import_watch_folders)")
+    parser.add_argument("--user", default=setting.import_watch_user or None,
+                        help="Username that will own the videos (default: import_watch_user)")
+    parser.add_argument("--jobs", type=int, default=max(1, (os.cpu_count() or 2) // 2),
+                        help="Parallel transcodes (default: half the CPUs)")
+    parser.add_argument("--playlist-min", type=int, default=2,
+                        help="Folders with at least this many videos become a playlist")
+    parser.add_argument("--progress-seconds", type=float, default=60,
+                        help="Print a status line when nothing finished for this long")
+    parser.add_argument("--hash", action="store_true",
+                        help="Compare new and changed files by content (sha256) to skip copies of imported files")
+    parser.add_argument("--watch", action="store_true",
+                        help="Keep running and import new files as they settle")
+    parser.add_argument("--settle-seconds", type=float, default=setting.import_settle_seconds,
+                        help="How long a new file must stay unchanged before it is imported in --watch mode")
+    parser.add_argument("--dry-run", action="store_true", help="Only print what would be imported")
+    args = parser.parse_args()
+
+    if not args.user:
+        parser.error("--user is required (or set import_watch_user)")
+    roots = [os.path.abspath(os.path.expanduser(root)) for root in args.roots or setting.import_watch_folders]
+    if not roots:
+        parser.error("no folders given (or set import_watch_folders)")
+    missing = [root for root in roots if not os.path.isdir(root)]
+    if missing:
+        parser.error(f"not a directory: {', '.join(missing)}")
+
+    # Create or migrate the tables if needed
+    upgrade_database()
+    db = SessionLocal()
+    try:
+        user = db.query(User).filter(User.username == args.user).first()
+        if not user:
+            print(f"❌ User '{args.user}' not found in database. Please create the user first.")
+            return 1
+        print(f"✅ Importing as {args.user} (ID: {user.id})\n")
+
+        manifest = ImportManifest(db, user.id, args.hash, args.jobs)
+        if not args.watch or args.dry_run:
+            failures = import_groups(db, manifest, scan_roots(roots, args.playlist_min), args, args.dry_run)
+            return 1 if failures else 0
+
+        # A service manager stops the daemon with SIGTERM, handled like Ctrl-C
+        signal.signal(signal.SIGTERM, signal.default_int_handler)
+        # Watch before the first pass so files arriving during it aren't missed
+        watcher = create_watcher(roots, setting.import_poll_seconds)
+        import_groups(db, manifest, scan_roots(roots, args.playlist_min), args)
+        watch(db, manifest, watcher, roots, args)
+        return 0
+    finally:
+        db.close()
 
 
 if __name__ == "__main__":
     try:
-        main()
+        sys.exit(main())
     except KeyboardInterrupt:
-        print("\n\n❌ Operation cancelled by user")
-        sys.exit(0)
-    except Exception as e:
-        print(f"\n❌ Unexpected error: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        sys.exit(1)
+        print("\n❌ Operation cancelled by user")
+        sys.exit(130)
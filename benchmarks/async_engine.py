@@ -0,0 +1,69 @@
+"""
+Compare the sync (threadpool) and async database paths under concurrent load.
+
+Serves the same owner video listing twice from one uvicorn process: once as a
+sync `def` route on get_db (run in FastAPI's threadpool, 40 threads by default)
+and once as an `async def` route on get_async_db. Both use the engines and pool
+settings from db.py, so db_pool_size / db_max_overflow apply to both.
+
+    python -m benchmarks.async_engine --owner <user_id> --concurrency 128
+
+Use a concurrency well above the threadpool size to see the sync path queue up.
+"""
+
+import argparse
+import threading
+import time
+import uvicorn
+from fastapi import Depends, FastAPI
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from db import get_db, get_async_db
+from models.videos import Video
+from benchmarks.http_load import run_load, print_results
+
+
+def build_app() -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/sync/{owner_id}")
+    def sync_videos(owner_id: str, db: Session = Depends(get_db)):
+        return [video.id for video in db.query(Video).filter(Video.owner_id == owner_id).all()]
+
+    @app.get("/async/{owner_id}")
+    async def async_videos(owner_id: str, db: AsyncSession = Depends(get_async_db)):
+        result = await db.execute(select(Video).where(Video.owner_id == owner_id))
+        return [video.id for video in result.scalars().all()]
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--owner", required=True, help="ID of a user that owns some videos")
+    parser.add_argument("--port", type=int, default=8011)
+    parser.add_argument("--concurrency", type=int, default=128)
+    parser.add_argument("--duration", type=float, default=15)
+    args = parser.parse_args()
+
+    server = uvicorn.Server(uvicorn.Config(build_app(), port=args.port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+
+    base = f"http://127.0.0.1:{args.port}"
+    print(f"{args.concurrency} clients, {args.duration}s per path")
+    for label in ("sync", "async"):
+        url = f"{base}/{label}/{args.owner}"
+        # Warm the pool before measuring
+        run_load([url], concurrency=4, duration=1)
+        print_results(label, run_load([url], concurrency=args.concurrency, duration=args.duration))
+
+    server.should_exit = True
+    thread.join()
+
+
+if __name__ == "__main__":
+    main()
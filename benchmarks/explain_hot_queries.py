@@ -0,0 +1,147 @@
+"""
+Check that the hot listing and lookup queries are planned on their indexes.
+
+Runs EXPLAIN for each query (listings, playlist lookups, usage, job claims,
+import manifest and title search) against the configured database (migrated
+to head) and exits with status 1 if any plan reads a whole table of
+GUARDED_TABLES:
+
+    alembic upgrade head
+    python -m benchmarks.explain_hot_queries
+
+SQLite plans are read from EXPLAIN QUERY PLAN. On PostgreSQL sequential scans
+are disabled for the check, since the planner rightly prefers them on small tables.
+"""
+
+import re
+import sys
+from datetime import datetime
+from sqlalchemy import text
+from db import engine
+from models.videos import Video, Playlist
+from utils.search import title_search
+
+PARAMS = {
+    "owner_id": "owner",
+    "video_id": "video",
+    "playlist_id": "playlist",
+    "content_hash": "hash",
+    "stage": "QUEUED",
+    "since": datetime(2000, 1, 1),
+}
+
+# Large tables: a full scan of any of them fails the check, whichever query it shows up in
+GUARDED_TABLES = ["videos", "playlists", "playlists_videos_mappings", "user_usage", "imported_files", "ingest_jobs"]
+
+# (name, SQL text or a function of the dialect name returning a SQLAlchemy select).
+# SQLite plans name tables by their alias, so only alias where the table is already checked elsewhere
+
+HOT_QUERIES = [
+    (
+        "get_videos",
+        "SELECT id FROM videos WHERE owner_id = :owner_id ORDER BY created_at DESC, id DESC LIMIT 50",
+    ),
+    (
+        "get_playlists",
+        "SELECT id FROM playlists WHERE owner_id = :owner_id ORDER BY created_at DESC, id DESC LIMIT 50",
+    ),
+    (
+        "playlist videos",
+        "SELECT playlists_videos_mappings.playlist_id, videos.id, videos.title FROM playlists_videos_mappings "
+        "JOIN videos ON videos.id = playlists_videos_mappings.video_id "
+        "WHERE playlists_videos_mappings.playlist_id IN (:playlist_id) "
+        "ORDER BY playlists_videos_mappings.playlist_id, playlists_videos_mappings.position",
+    ),
+    (
+        "next playlist item",
+        "SELECT videos.id FROM videos JOIN playlists_videos_mappings ON playlists_videos_mappings.video_id = videos.id "
+        "JOIN playlists ON playlists.id = playlists_videos_mappings.playlist_id "
+        "WHERE playlists_videos_mappings.playlist_id = :playlist_id AND playlists.owner_id = :owner_id "
+        "AND playlists_videos_mappings.position > (SELECT position FROM playlists_videos_mappings AS current "
+        "WHERE current.playlist_id = :playlist_id AND current.video_id = :video_id) "
+        "ORDER BY playlists_videos_mappings.position LIMIT 1",
+    ),
+    (
+        "delete_video mappings",
+        "SELECT playlist_id FROM playlists_videos_mappings WHERE video_id = :video_id",
+    ),
+    (
+        "usage by user",
+        "SELECT SUM(bandwidth_used) FROM user_usage WHERE user_id = :owner_id AND created_at >= :since",
+    ),
+    (
+        "claim queued jobs",
+        "SELECT id FROM ingest_jobs WHERE stage = :stage ORDER BY created_at LIMIT 1",
+    ),
+    (
+        "imported file by hash",
+        "SELECT path FROM imported_files WHERE owner_id = :owner_id AND content_hash = :content_hash LIMIT 1",
+    ),
+    (
+        "search videos",
+        lambda dialect: title_search(dialect, Video, [Video.id], "owner", ["show", "s01"]).limit(50),
+    ),
+    (
+        "search playlists",
+        lambda dialect: title_search(dialect, Playlist, [Playlist.id], "owner", ["show"]).limit(50),
+    ),
+]
+
+
+def explain_target(query):
+    """(SQL, params) of a HOT_QUERIES entry; selects are rendered with their values inlined."""
+    if isinstance(query, str):
+        return text(query), PARAMS
+    compiled = query(engine.dialect.name).compile(engine, compile_kwargs={"literal_binds": True})
+    return text(str(compiled).replace(":", r"\:")), {}
+
+
+def sqlite_plan(connection, query):
+    sql, params = explain_target(query)
+    rows = connection.execute(text("EXPLAIN QUERY PLAN " + sql.text), params).all()
+    return [row[-1] for row in rows]
+
+
+def sqlite_full_scan(plan):
+    # "SCAN videos" (or "SCAN TABLE videos" before SQLite 3.36) reads every row, and so does
+    # "SCAN videos USING COVERING INDEX ..." without a constraint: hot queries must SEARCH
+    table = re.compile(rf"^SCAN (?:TABLE )?(?:{'|'.join(GUARDED_TABLES)})\b")
+    return any(table.match(line) for line in plan)
+
+
+def postgres_plan(connection, query):
+    sql, params = explain_target(query)
+    connection.execute(text("SET LOCAL enable_seqscan = off"))
+    return [row[0] for row in connection.execute(text("EXPLAIN " + sql.text), params).all()]
+
+
+def postgres_full_scan(plan):
+    table = re.compile(rf"Seq Scan on (?:{'|'.join(GUARDED_TABLES)})\b")
+    return any(table.search(line) for line in plan)
+
+
+def main():
+    dialect = engine.dialect.name
+    if dialect == "sqlite":
+        plan_for, full_scan = sqlite_plan, sqlite_full_scan
+    elif dialect == "postgresql":
+        plan_for, full_scan = postgres_plan, postgres_full_scan
+    else:
+        print(f"No plan check for {dialect}")
+        return 0
+
+    failures = 0
+    with engine.begin() as connection:
+        for name, query in HOT_QUERIES:
+            plan = plan_for(connection, query)
+            ok = not full_scan(plan)
+            failures += not ok
+            print(f"{'ok' if ok else 'FULL SCAN':<10} {name}")
+            for line in plan:
+                print(f"{'':<10} {line}")
+    print(f"{failures} of {len(HOT_QUERIES)} queries fall back to a full scan" if failures else "All queries use indexes")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
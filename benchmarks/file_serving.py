@@ -0,0 +1,62 @@
+"""
+Compare segment throughput of the redirect (nginx X-Accel-Redirect) and native serving modes.
+
+Run the same processed video behind two deployments and point this script at both:
+
+    # API with file_serving_mode=native
+    uvicorn main:app --port 8001
+    # API with file_serving_mode=accel behind nginx (docs/Nginx.md) on port 8080
+
+    python -m benchmarks.file_serving --token <jwt> --video <video_id> \
+        --target native=http://localhost:8001 --target accel=http://localhost:8080
+
+Every segment of the video's variants is fetched in a loop by --concurrency clients.
+"""
+
+import argparse
+import os
+from config import setting
+from benchmarks.http_load import run_load, print_results
+
+
+def segment_paths(storage_path):
+    base = os.path.join(setting.base_storage_path, storage_path)
+    paths = []
+    for variant in sorted(os.listdir(base)):
+        variant_dir = os.path.join(base, variant)
+        if os.path.isdir(variant_dir):
+            paths += [f"{variant}/{name}" for name in sorted(os.listdir(variant_dir)) if name.endswith(".ts")]
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--token", required=True, help="Access token of the video owner")
+    parser.add_argument("--video", required=True, help="ID of a processed video")
+    parser.add_argument("--target", action="append", required=True, help="label=base_url, repeatable")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=15)
+    args = parser.parse_args()
+
+    from db import SessionLocal
+    from models.videos import Video
+
+    db = SessionLocal()
+    video = db.query(Video).filter(Video.id == args.video).first()
+    db.close()
+    if not video:
+        parser.error(f"Video {args.video} not found")
+
+    segments = segment_paths(video.storage_path)
+    if not segments:
+        parser.error("The video has no segments on disk")
+
+    headers = {"Authorization": f"Bearer {args.token}"}
+    for target in args.target:
+        label, base_url = target.split("=", 1)
+        urls = [f"{base_url}/videos/{args.video}/play/{path}" for path in segments]
+        print_results(label, run_load(urls, headers, args.concurrency, args.duration))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,400 @@
+"""
+How many simultaneous viewers one API instance sustains.
+
+Everything runs on this machine. A scratch database and storage folder get
+--users synthetic users with --videos processed videos each. The source clip
+is generated with ffmpeg's lavfi test sources and run through
+DownloadedVideoProcessor.process_video once, then hard-linked into every
+video folder. The API is started with uvicorn in a subprocess, so its CPU is
+measured apart from the load generator's. Then --players synthetic players
+each play a video through /videos/{id}/play/...:
+
+  * fetch master.m3u8, pick a variant (--variant, highest by default), fetch
+    its index.m3u8
+  * fetch segments back to back until --buffer-seconds of media are in, then
+    start the playhead and fetch each next segment only when the buffer
+    drops under --buffer-seconds, like a real player
+  * count a stall whenever a segment arrives after its playback deadline
+  * start over on another video when one ends
+
+    python -m benchmarks.hls_load --players 50 --duration 60
+    python -m benchmarks.hls_load --players 200 --standin     # accel mode behind a stand-in
+    python -m benchmarks.hls_load --processed /path/to/video  # skip the encode
+
+--standin serves the API in file_serving_mode=accel behind a small stdlib
+proxy that follows X-Accel-Redirect from base_storage_path, like nginx
+(docs/Nginx.md) does. X-Accel-Limit-Rate is not applied. Without it, the
+API serves files natively.
+
+The report has latency percentiles and errors per request kind, stalls, and
+the API process' CPU (in cores) over the run.
+"""
+
+import os
+import re
+import sys
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import threading
+import subprocess
+import http.client
+import urllib.error
+import urllib.request
+from urllib.parse import urljoin
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from benchmarks.http_load import fetch, percentile
+
+SOURCE_SIZE = "1280x720"
+HOP_BY_HOP = {"connection", "keep-alive", "transfer-encoding", "te", "trailer", "upgrade"}
+
+
+# Fixtures
+
+def make_source(path, seconds):
+    """Test pattern video with a tone, from ffmpeg's lavfi sources."""
+    import ffmpeg
+
+    video = ffmpeg.input(f"testsrc2=size={SOURCE_SIZE}:rate=30", f="lavfi", t=seconds)
+    audio = ffmpeg.input("sine=frequency=440:sample_rate=44100", f="lavfi", t=seconds)
+    ffmpeg.output(video, audio, path, vcodec="libx264", preset="veryfast", acodec="aac").overwrite_output().run(quiet=True)
+
+
+def encode_fixture(scratch, seconds):
+    from utils.downloads_processor import DownloadedVideoProcessor
+    from config import setting
+
+    source = os.path.join(scratch, "source.mp4")
+    output_dir = os.path.join(scratch, "fixture")
+    print(f"encoding a {seconds}s {SOURCE_SIZE} lavfi clip ...", flush=True)
+    make_source(source, seconds)
+    processor = DownloadedVideoProcessor(setting.base_storage_path, setting.tmp_downloading_path)
+    started = time.monotonic()
+    meta = processor.process_video(source, output_dir)
+    print(f"encoded {', '.join(meta['variants'])} in {time.monotonic() - started:.1f}s", flush=True)
+    return output_dir, meta
+
+
+def link_tree(source, destination):
+    # Hard links keep thousands of videos cheap; copies if the filesystem refuses
+    def link(src, dst):
+        try:
+            os.link(src, dst)
+        except OSError:
+            shutil.copy2(src, dst)
+    shutil.copytree(source, destination, copy_function=link)
+
+
+def seed(users, videos_per_user, fixture_dir, meta):
+    from db import SessionLocal
+    from models.users import User
+    from models.videos import Video, VideoStatus
+    from utils.auth import create_access_token
+    from utils.migrations import upgrade_database
+    from config import setting
+
+    upgrade_database()
+    db = SessionLocal()
+    viewers = []
+    for index in range(users):
+        # Players never log in, so the password hash is never checked
+        user = User(username=f"viewer{index}", password_hash="-")
+        db.add(user)
+        db.flush()
+        video_ids = []
+        for number in range(videos_per_user):
+            video = Video(title=f"Load test {number}", owner_id=user.id, storage_path="", status=VideoStatus.PROCESSED,
+                          duration_seconds=meta.get("duration"), width=meta.get("width"), height=meta.get("height"))
+            db.add(video)
+            db.flush()
+            video.storage_path = f"users/{user.id}/videos/{video.id}"
+            link_tree(fixture_dir, os.path.join(setting.base_storage_path, video.storage_path))
+            video_ids.append(video.id)
+        viewers.append((create_access_token(user.id), video_ids))
+    db.commit()
+    db.close()
+    return viewers
+
+
+# Servers
+
+def start_api(port, workers):
+    command = [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port),
+               "--workers", str(workers), "--log-level", "warning"]
+    server = subprocess.Popen(command, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise SystemExit("The API exited during startup")
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/docs", timeout=1).read()
+            return server
+        except OSError:
+            time.sleep(0.2)
+    server.terminate()
+    raise SystemExit("The API did not start within 60s")
+
+
+def process_tree_cpu_seconds(pid):
+    """User + system CPU seconds of `pid` and its children, None where /proc isn't available."""
+    tick = os.sysconf("SC_CLK_TCK")
+    total = 0.0
+    pending = [pid]
+    try:
+        while pending:
+            current = pending.pop()
+            with open(f"/proc/{current}/stat") as f:
+                # Fields after the ")" that closes the command name; utime and stime are 14 and 15
+                fields = f.read().rsplit(")", 1)[1].split()
+            total += (int(fields[11]) + int(fields[12])) / tick
+            for task in os.listdir(f"/proc/{current}/task"):
+                with open(f"/proc/{current}/task/{task}/children") as f:
+                    pending += [int(child) for child in f.read().split()]
+    except (OSError, ValueError):
+        return None
+    return total
+
+
+class StandinHandler(BaseHTTPRequestHandler):
+    """Proxies to the API and follows X-Accel-Redirect, as the nginx config in docs/Nginx.md does."""
+
+    protocol_version = "HTTP/1.1"
+    upstream = None
+    storage_path = None
+
+    def do_GET(self):
+        connection = http.client.HTTPConnection(*self.upstream, timeout=60)
+        headers = {k: v for k, v in self.headers.items() if k.lower() not in HOP_BY_HOP}
+        connection.request("GET", self.path, headers=headers)
+        upstream = connection.getresponse()
+        body = upstream.read()
+        connection.close()
+
+        redirect = upstream.getheader("X-Accel-Redirect")
+        if redirect and redirect.startswith("/_protected_hls/"):
+            path = os.path.join(self.storage_path, redirect[len("/_protected_hls/"):])
+            try:
+                with open(path, "rb") as f:
+                    body = f.read()
+            except OSError:
+                self._reply(404, {"Content-Type": "text/plain"}, b"not found")
+                return
+            self._reply(200, {"Content-Type": upstream.getheader("Content-Type", "application/octet-stream")}, body)
+            return
+        headers = {k: v for k, v in upstream.getheaders() if k.lower() not in HOP_BY_HOP | {"content-length"}}
+        self._reply(upstream.status, headers, body)
+
+    def _reply(self, status, headers, body):
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_standin(port, api_port, storage_path):
+    handler = type("Handler", (StandinHandler,), {"upstream": ("127.0.0.1", api_port), "storage_path": storage_path})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+# Players
+
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = {"master": [], "variant": [], "segment": []}
+        self.errors = {"master": 0, "variant": 0, "segment": 0}
+        self.bytes = 0
+        self.stalls = 0
+        self.sessions = 0
+
+    def record(self, kind, status, size, latency):
+        with self.lock:
+            self.latencies[kind].append(latency)
+            self.bytes += size
+            if not 200 <= status < 400:
+                self.errors[kind] += 1
+        return 200 <= status < 400
+
+
+def get_text(url, headers):
+    request = urllib.request.Request(url, headers=headers)
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=30) as response:
+            body = response.read()
+            return response.status, body.decode(errors="ignore"), time.perf_counter() - started
+    except urllib.error.HTTPError as e:
+        return e.code, "", time.perf_counter() - started
+    except OSError:
+        return 0, "", time.perf_counter() - started
+
+
+def pick_variant(master, variant):
+    uris = [line.strip() for line in master.splitlines() if line.strip() and not line.startswith("#")]
+    if not uris:
+        return None
+    if variant:
+        matching = [uri for uri in uris if uri.startswith(f"{variant}/")]
+        return matching[0] if matching else None
+    # The generator writes variants lowest first
+    return uris[-1]
+
+
+def parse_segments(playlist):
+    segments, duration = [], None
+    for line in playlist.splitlines():
+        line = line.strip()
+        if line.startswith("#EXTINF:"):
+            duration = float(re.match(r"#EXTINF:([\d.]+)", line).group(1))
+        elif line and not line.startswith("#") and duration is not None:
+            segments.append((line, duration))
+            duration = None
+    return segments
+
+
+def play(base_url, viewer, args, stats, deadline):
+    token, video_ids = viewer
+    headers = {"Authorization": f"Bearer {token}"}
+    while time.monotonic() < deadline:
+        play_url = f"{base_url}/videos/{random.choice(video_ids)}/play/"
+        status, master, latency = get_text(play_url + "master.m3u8", headers)
+        if not stats.record("master", status, len(master), latency):
+            time.sleep(1)
+            continue
+        variant_uri = pick_variant(master, args.variant)
+        if variant_uri is None:
+            raise SystemExit(f"No {args.variant or ''} variant in the master playlist")
+        variant_url = urljoin(play_url + "master.m3u8", variant_uri)
+        status, playlist, latency = get_text(variant_url, headers)
+        if not stats.record("variant", status, len(playlist), latency):
+            time.sleep(1)
+            continue
+        with stats.lock:
+            stats.sessions += 1
+
+        # Playback starts once the startup buffer is in, the playhead then advances in real time
+        buffered = 0.0
+        playback_started = None
+        for uri, duration in parse_segments(playlist):
+            if playback_started is not None:
+                playhead = time.monotonic() - playback_started
+                wait = buffered - playhead - args.buffer_seconds
+                if wait > 0:
+                    if time.monotonic() + wait >= deadline:
+                        return
+                    time.sleep(wait)
+            if time.monotonic() >= deadline:
+                return
+            status, size, latency = fetch(urljoin(variant_url, uri), headers)
+            stats.record("segment", status, size, latency)
+            if playback_started is not None and time.monotonic() - playback_started > buffered:
+                # The segment arrived after the playhead ran out of media
+                with stats.lock:
+                    stats.stalls += 1
+                playback_started = time.monotonic() - buffered
+            buffered += duration
+            if playback_started is None and buffered >= args.buffer_seconds:
+                playback_started = time.monotonic()
+
+
+def report(stats, elapsed, cpu_seconds, players):
+    print(f"\n{players} players for {elapsed:.0f}s, {stats.sessions} playback sessions")
+    for kind, latencies in stats.latencies.items():
+        print(
+            f"{kind:<8} {len(latencies):>8} req {stats.errors[kind]:>6} err "
+            f"p50 {percentile(latencies, 50) * 1000:>8.1f} ms p95 {percentile(latencies, 95) * 1000:>8.1f} ms "
+            f"p99 {percentile(latencies, 99) * 1000:>8.1f} ms"
+        )
+    print(f"stalls   {stats.stalls:>8}")
+    print(f"served   {stats.bytes / elapsed / 1024**2:>8.1f} MB/s")
+    if cpu_seconds is None:
+        print("api cpu       n/a (needs /proc)")
+    else:
+        print(f"api cpu  {cpu_seconds / elapsed:>8.2f} cores of {os.cpu_count()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--players", type=int, default=20, help="Simultaneous players")
+    parser.add_argument("--duration", type=float, default=60, help="Seconds of playback load")
+    parser.add_argument("--users", type=int, default=10, help="Synthetic users, players are spread across them")
+    parser.add_argument("--videos", type=int, default=2, help="Processed videos per user")
+    parser.add_argument("--clip-seconds", type=int, default=120, help="Length of the generated source clip")
+    parser.add_argument("--processed", help="Already processed video folder to reuse instead of encoding")
+    parser.add_argument("--variant", help="Variant to play, e.g. 360p (default: highest)")
+    parser.add_argument("--buffer-seconds", type=float, default=12, help="Media a player keeps buffered")
+    parser.add_argument("--ramp-seconds", type=float, default=5, help="Players start spread over this long")
+    parser.add_argument("--port", type=int, default=8021)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers")
+    parser.add_argument("--standin", action="store_true", help="accel mode behind the stdlib nginx stand-in")
+    parser.add_argument("--keep", action="store_true", help="Keep the scratch folder")
+    args = parser.parse_args()
+
+    scratch = tempfile.mkdtemp(prefix="hls-load-")
+    os.environ.update({
+        "db_url": f"sqlite:///{scratch}/db.sqlite",
+        "base_storage_path": f"{scratch}/storage",
+        "tmp_downloading_path": f"{scratch}/tmp",
+        "file_serving_mode": "accel" if args.standin else "native",
+        "hls_signed_urls": "false",
+    })
+
+    server = None
+    standin = None
+    try:
+        if args.processed:
+            fixture_dir, meta = args.processed, {}
+        else:
+            fixture_dir, meta = encode_fixture(scratch, args.clip_seconds)
+        viewers = seed(args.users, args.videos, fixture_dir, meta)
+
+        server = start_api(args.port, args.workers)
+        base_url = f"http://127.0.0.1:{args.port}"
+        if args.standin:
+            from config import setting
+            standin = start_standin(args.port + 1, args.port, setting.base_storage_path)
+            base_url = f"http://127.0.0.1:{args.port + 1}"
+
+        stats = Stats()
+        started = time.monotonic()
+        deadline = started + args.duration
+        cpu_before = process_tree_cpu_seconds(server.pid)
+        threads = []
+        for index in range(args.players):
+            thread = threading.Thread(
+                target=play, args=(base_url, viewers[index % len(viewers)], args, stats, deadline), daemon=True
+            )
+            thread.start()
+            threads.append(thread)
+            time.sleep(args.ramp_seconds / max(args.players, 1))
+        for thread in threads:
+            thread.join()
+        elapsed = time.monotonic() - started
+        cpu_after = process_tree_cpu_seconds(server.pid)
+        cpu_seconds = None if cpu_before is None or cpu_after is None else cpu_after - cpu_before
+
+        report(stats, elapsed, cpu_seconds, args.players)
+    finally:
+        if standin:
+            standin.shutdown()
+        if server:
+            server.terminate()
+            server.wait()
+        if args.keep:
+            print(f"scratch folder kept at {scratch}")
+        else:
+            shutil.rmtree(scratch, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
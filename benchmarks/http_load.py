@@ -0,0 +1,78 @@
+"""
+Small closed-loop HTTP load generator shared by the benchmarks.
+
+Each of `concurrency` threads fetches its URLs back to back for `duration`
+seconds; the result has request count, throughput and latency percentiles.
+Only the standard library is used so it runs anywhere the API does.
+"""
+
+import time
+import threading
+import urllib.request
+import urllib.error
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def fetch(url, headers=None, timeout=30):
+    """Return (status, body_bytes, latency_seconds) for a GET."""
+    request = urllib.request.Request(url, headers=headers or {})
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            body = response.read()
+            return response.status, len(body), time.perf_counter() - started
+    except urllib.error.HTTPError as e:
+        return e.code, 0, time.perf_counter() - started
+    except (urllib.error.URLError, OSError):
+        return 0, 0, time.perf_counter() - started
+
+
+def run_load(urls, headers=None, concurrency=16, duration=10.0):
+    latencies = []
+    errors = [0]
+    transferred = [0]
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def client(offset):
+        index = offset
+        while time.monotonic() < deadline:
+            status, size, latency = fetch(urls[index % len(urls)], headers)
+            index += 1
+            with lock:
+                latencies.append(latency)
+                transferred[0] += size
+                if not 200 <= status < 400:
+                    errors[0] += 1
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(concurrency)]
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+
+    return {
+        "requests": len(latencies),
+        "errors": errors[0],
+        "requests_per_second": len(latencies) / elapsed,
+        "megabytes_per_second": transferred[0] / elapsed / 1024**2,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+    }
+
+
+def print_results(label, result):
+    print(
+        f"{label:<24} {result['requests']:>8} req {result['errors']:>5} err "
+        f"{result['requests_per_second']:>9.1f} req/s {result['megabytes_per_second']:>8.1f} MB/s "
+        f"p50 {result['p50_ms']:>7.1f} ms p95 {result['p95_ms']:>7.1f} ms p99 {result['p99_ms']:>7.1f} ms"
+    )
@@ -0,0 +1,143 @@
+"""
+Segment latency while a login storm hits the API.
+
+Starts the API on a scratch SQLite database and storage folder (native file
+serving), measures segment requests alone, then again while --storm clients
+post logins with the right password back to back, so every one costs a bcrypt
+verify:
+
+    python -m benchmarks.login_storm --storm 32
+    python -m benchmarks.login_storm --storm 32 --legacy
+
+--legacy sends the storm to a copy of the old login that verified on the
+request threadpool, for comparison.
+"""
+
+import os
+import json
+import argparse
+import tempfile
+import threading
+import time
+import urllib.request
+
+SCRATCH = tempfile.mkdtemp(prefix="login-storm-")
+os.environ.setdefault("db_url", f"sqlite:///{SCRATCH}/db.sqlite")
+os.environ.setdefault("base_storage_path", f"{SCRATCH}/storage")
+os.environ.setdefault("file_serving_mode", "native")
+# Every storm login succeeds, keep the failure throttle out of the picture
+os.environ.setdefault("login_max_failures", "1000000")
+
+PASSWORD = "storm-password"
+SEGMENT_BYTES = 256 * 1024
+
+
+def setup():
+    from db import SessionLocal
+    from models.users import User
+    from models.videos import Video, VideoStatus
+    from utils.pswds import secure_pwd
+    from utils.auth import create_access_token
+    from utils.migrations import upgrade_database
+    from config import setting
+
+    upgrade_database()
+    db = SessionLocal()
+    user = User(username="storm", password_hash=secure_pwd(PASSWORD))
+    db.add(user)
+    db.flush()
+    storage_path = f"users/{user.id}/videos/bench"
+    video = Video(title="bench", owner_id=user.id, storage_path=storage_path, status=VideoStatus.PROCESSED)
+    db.add(video)
+    db.commit()
+
+    variant_dir = os.path.join(setting.base_storage_path, storage_path, "360p")
+    os.makedirs(variant_dir, exist_ok=True)
+    with open(os.path.join(variant_dir, "seg_000.ts"), "wb") as f:
+        f.write(os.urandom(SEGMENT_BYTES))
+    video_id, token = video.id, create_access_token(user.id)
+    db.close()
+    return video_id, token
+
+
+def add_legacy_login(app):
+    from fastapi import Depends, HTTPException
+    from sqlalchemy.orm import Session
+    from db import get_db
+    from models.users import User
+    from utils.pswds import verify_pwd
+
+    @app.post("/bench/legacy-login")
+    def legacy_login(payload: dict, db: Session = Depends(get_db)):
+        user = db.query(User).filter(User.username == payload["username"]).first()
+        if not user or not verify_pwd(payload["password"], user.password_hash):
+            raise HTTPException(status_code=401)
+        return {"ok": True}
+
+
+def storm(url, clients, stop, counts):
+    body = json.dumps({"username": "storm", "password": PASSWORD}).encode()
+
+    def client():
+        while not stop.is_set():
+            request = urllib.request.Request(url, data=body, headers={"Content-Type": "application/json"})
+            try:
+                with urllib.request.urlopen(request, timeout=60) as response:
+                    response.read()
+                    counts["ok"] += 1
+            except Exception:
+                counts["rejected"] += 1
+
+    threads = [threading.Thread(target=client, daemon=True) for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    return threads
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8012)
+    parser.add_argument("--storm", type=int, default=32, help="Concurrent login clients")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent segment clients")
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--legacy", action="store_true")
+    args = parser.parse_args()
+
+    import uvicorn
+    import main as api
+    from benchmarks.http_load import run_load, print_results
+
+    video_id, token = setup()
+    if args.legacy:
+        add_legacy_login(api.app)
+
+    server = uvicorn.Server(uvicorn.Config(api.app, port=args.port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+
+    base = f"http://127.0.0.1:{args.port}"
+    segment = [f"{base}/videos/{video_id}/play/360p/seg_000.ts"]
+    headers = {"Authorization": f"Bearer {token}"}
+    run_load(segment, headers, concurrency=2, duration=1)
+
+    print_results("segments, idle", run_load(segment, headers, args.concurrency, args.duration))
+
+    login_url = f"{base}/bench/legacy-login" if args.legacy else f"{base}/auth/login"
+    stop = threading.Event()
+    counts = {"ok": 0, "rejected": 0}
+    storm_threads = storm(login_url, args.storm, stop, counts)
+    label = "segments, legacy storm" if args.legacy else "segments, login storm"
+    print_results(label, run_load(segment, headers, args.concurrency, args.duration))
+    stop.set()
+    for storm_thread in storm_threads:
+        storm_thread.join()
+    print(f"logins during the run: {counts['ok']} ok, {counts['rejected']} rejected (503 when the hash queue is full)")
+
+    server.should_exit = True
+    thread.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Compare ingest scheduling policies on a simulated single-worker workload.
+
+One user queues a large batch, other users trickle in short clips, and each
+policy is replayed against the same arrivals. Prints mean and p95
+time-to-playable per policy.
+
+Usage: python -m benchmarks.scheduler_policies [--seed 1]
+"""
+
+import argparse
+import random
+from utils.scheduler import IngestScheduler, POLICIES
+
+
+def build_workload(seed):
+    rng = random.Random(seed)
+    jobs = []
+    # Heavy user queues 40 big torrents up front (hours of work each)
+    for i in range(40):
+        jobs.append({"owner_id": "batch-user", "arrival": 0, "cost": rng.uniform(3600, 4 * 3600)})
+    # Several users each add a few short clips throughout the day
+    for user in range(5):
+        for i in range(6):
+            jobs.append({
+                "owner_id": f"user-{user}",
+                "arrival": rng.uniform(0, 24 * 3600),
+                "cost": rng.uniform(300, 1200),
+            })
+    return sorted(jobs, key=lambda j: j["arrival"])
+
+
+def simulate(policy, jobs):
+    scheduler = IngestScheduler(policy)
+    pending = list(jobs)
+    clock = 0.0
+    results = []
+
+    while pending or scheduler.qsize():
+        while pending and pending[0]["arrival"] <= clock:
+            job = pending.pop(0)
+            task = {"job_id": str(id(job)), "owner_id": job["owner_id"], "job": job}
+            scheduler.put(task)
+            # Metadata gives an estimate within 25% of the real cost
+            scheduler.update_estimate(task["job_id"], duration=job["cost"] * 2 * random.uniform(0.75, 1.25))
+
+        if not scheduler.qsize():
+            clock = pending[0]["arrival"]
+            continue
+
+        task = scheduler.get()
+        job = task["job"]
+        # First video playable after the download and the first encode
+        results.append(clock + job["cost"] * 0.6 - job["arrival"])
+        clock += job["cost"]
+        scheduler.task_done()
+
+    results.sort()
+    return sum(results) / len(results), results[int(len(results) * 0.95)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    jobs = build_workload(args.seed)
+    random.seed(args.seed)
+    print(f"{'policy':<8} {'mean (h)':>10} {'p95 (h)':>10}")
+    for policy in POLICIES:
+        mean, p95 = simulate(policy, jobs)
+        print(f"{policy:<8} {mean / 3600:>10.2f} {p95 / 3600:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Cost of turning 1,000 videos into a JSON response body, old path vs new path.
+
+    orm:  load Video instances, rewrite storage_path/thumbnail_url on them,
+          validate List[VideoResponse] from attributes, dump to JSON (what
+          FastAPI did for response_model=List[VideoResponse])
+    rows: select the response columns only, build dicts, orjson.dumps
+
+Both run against an in-memory SQLite database so nothing else is measured:
+
+    python -m benchmarks.serialization --videos 1000 --rounds 50
+"""
+
+import argparse
+import json
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import List
+import orjson
+from pydantic import TypeAdapter
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+from db import Base
+from models.users import User
+from models.videos import Video, VideoStatus
+from schemas.videos import VideoResponse
+from utils.serialization import video_columns, video_dto
+from config import setting
+from benchmarks.http_load import percentile
+
+
+def seed(session, count):
+    owner = User(username="bench", password_hash="x")
+    session.add(owner)
+    session.flush()
+    started = datetime(2026, 1, 1)
+    session.add_all([
+        Video(
+            id=str(uuid.uuid4()),
+            title=f"Video {i}",
+            owner_id=owner.id,
+            storage_path=f"users/{owner.id}/videos/{i}",
+            thumbnail_url=f"users/{owner.id}/videos/{i}/thumbnail.jpg",
+            status=VideoStatus.PROCESSED,
+            created_at=started + timedelta(seconds=i),
+            duration_seconds=1800,
+            width=1920,
+            height=1080,
+            size_bytes=1_500_000_000,
+        )
+        for i in range(count)
+    ])
+    session.commit()
+    return owner.id
+
+
+def orm_path(session, owner_id, adapter):
+    videos = session.execute(select(Video).where(Video.owner_id == owner_id)).scalars().all()
+    for video in videos:
+        video.storage_path = f"{setting.api_base_url}/videos/{video.id}/play"
+        if video.thumbnail_url:
+            video.thumbnail_url = f"{setting.api_base_url}/videos/{video.id}/thumbnail"
+    body = json.dumps(adapter.dump_python(adapter.validate_python(videos, from_attributes=True), mode="json"))
+    # Discard the rewritten URLs, as the request's session would
+    session.rollback()
+    return body
+
+
+def rows_path(session, owner_id):
+    rows = session.execute(select(*video_columns()).where(Video.owner_id == owner_id)).all()
+    return orjson.dumps([video_dto(row) for row in rows])
+
+
+def measure(label, fn, rounds, count):
+    timings = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    scale = 1000 / count * 1000
+    print(
+        f"{label:<6} per 1,000 videos: p50 {percentile(timings, 50) * scale:7.2f} ms  "
+        f"p95 {percentile(timings, 95) * scale:7.2f} ms  min {min(timings) * scale:7.2f} ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--videos", type=int, default=1000)
+    parser.add_argument("--rounds", type=int, default=50)
+    args = parser.parse_args()
+
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine, expire_on_commit=False)()
+    owner_id = seed(session, args.videos)
+    adapter = TypeAdapter(List[VideoResponse])
+
+    # Same payload either way
+    assert json.loads(orm_path(session, owner_id, adapter)) == orjson.loads(rows_path(session, owner_id))
+
+    measure("orm", lambda: orm_path(session, owner_id, adapter), args.rounds, args.videos)
+    measure("rows", lambda: rows_path(session, owner_id), args.rounds, args.videos)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Startup cost of an API process per process_role.
+
+For each role, --runs fresh interpreters are timed on `import main` (what
+every gunicorn/uvicorn worker pays before serving), and as many uvicorn
+servers on the time from spawn to the first answered request:
+
+    python -m benchmarks.startup_time --runs 5
+
+Also prints whether libtorrent and ffmpeg got imported and which threads were
+running once the server answered. Uses the database and settings from the
+environment, so run it against a migrated database (or with migrate_on_startup).
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_PROBE = """
+import json, sys, time, threading
+started = time.perf_counter()
+import main
+print(json.dumps({
+    "seconds": time.perf_counter() - started,
+    "libtorrent": "libtorrent" in sys.modules,
+    "ffmpeg": "ffmpeg" in sys.modules,
+    "threads": sorted(thread.name for thread in threading.enumerate()),
+}))
+"""
+
+# Runs uvicorn in-process so the probe can list the server's own threads after the first request
+SERVER_PROBE = """
+import json, sys, threading, time, urllib.request
+import uvicorn
+server = uvicorn.Server(uvicorn.Config("main:app", port=int(sys.argv[1]), log_level="warning"))
+thread = threading.Thread(target=server.run)
+thread.start()
+while True:
+    try:
+        urllib.request.urlopen(f"http://127.0.0.1:{sys.argv[1]}/openapi.json", timeout=1).read()
+        break
+    except OSError:
+        time.sleep(0.01)
+print(json.dumps({"threads": sorted(t.name for t in threading.enumerate())}), flush=True)
+server.should_exit = True
+thread.join()
+"""
+
+
+def run_probe(code, role, *args):
+    env = dict(os.environ, process_role=role)
+    started = time.perf_counter()
+    output = subprocess.run(
+        [sys.executable, "-c", code, *args], cwd=ROOT, env=env, capture_output=True, text=True, check=True
+    ).stdout
+    return time.perf_counter() - started, json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--roles", default="api,all", help="Comma separated process roles")
+    parser.add_argument("--port", type=int, default=8041)
+    args = parser.parse_args()
+
+    for role in args.roles.split(","):
+        imports = [run_probe(IMPORT_PROBE, role)[1] for _ in range(args.runs)]
+        # Wall time includes interpreter start, import, lifespan startup and the first response
+        servers = [run_probe(SERVER_PROBE, role, str(args.port)) for _ in range(args.runs)]
+
+        import_seconds = [probe["seconds"] for probe in imports]
+        ready_seconds = [seconds for seconds, _ in servers]
+        print(
+            f"{role:<6} import main: median {statistics.median(import_seconds) * 1000:7.1f} ms "
+            f"(min {min(import_seconds) * 1000:7.1f})  first response: median "
+            f"{statistics.median(ready_seconds) * 1000:7.1f} ms (min {min(ready_seconds) * 1000:7.1f})"
+        )
+        print(f"       libtorrent imported: {imports[0]['libtorrent']}, ffmpeg imported: {imports[0]['ffmpeg']}")
+        print(f"       threads after import: {', '.join(imports[0]['threads'])}")
+        print(f"       threads while serving: {', '.join(servers[0][1]['threads'])}")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,23 @@ from sqlalchemy.ext.declarative import declarative_base
 class Settings(BaseSettings):
     # database related
     db_url: str
+    # Apply pending migrations when a process starts. Turn off when several processes start
+    # at once (gunicorn workers) and run `alembic upgrade head` before starting them instead
+    migrate_on_startup: bool = True
+
+    # "api" serves HTTP only and hands ingest jobs to worker processes through the ingest_jobs
+    # table, "worker" (python worker.py) downloads and encodes them, "all" does both in one
+    # process with an in-memory queue
+    process_role: str = "all"
+    # How often workers claim new jobs and api event streams look for job changes
+    ingest_poll_seconds: float = 1.0
+    # Unfinished jobs a worker holds at once: the one it runs plus the ones queued behind it (whose
+    # metadata it resolves ahead). Everything else stays in ingest_jobs for other workers to claim
+    ingest_worker_slots: int = 2
+    db_pool_size: int = 10
+    db_max_overflow: int = 20
+    db_pool_recycle: int = 1800
+    db_pool_timeout: int = 30
     
     # JWT Token Related
     secret_key: str
@@ -17,9 +34,108 @@ class Settings(BaseSettings):
     base_storage_path : str
     tmp_downloading_path : str
     api_base_url : str
+
+    # Ingest admission control
+    min_free_disk_bytes: int = 2 * 1024**3
+    hls_output_overhead: float = 1.1
+    max_concurrent_encodes: int = 1
+    max_load_per_cpu: float = 1.5
+    api_p99_budget_ms: float = 500
+    # process_role "api" processes publish their p99 this often; workers throttle on the worst fresh one
+    latency_report_seconds: float = 5
+    admission_retry_seconds: int = 300
+    admission_max_wait_seconds: int = 6 * 60 * 60
+    # How long load/p99 throttling may hold back an encode while none is running (max_concurrent_encodes=1 included)
+    admission_overload_max_wait_seconds: int = 15 * 60
+    # How long a torrent job waits for an encode slot before it is requeued (the ingest worker runs one
+    # job at a time); longer than admission_overload_max_wait_seconds so a lone encode still starts
+    ingest_encode_max_wait_seconds: int = 20 * 60
+
+    # Ingest scheduling
+    scheduler_policy: str = "fair"
+    scheduler_assumed_download_rate: int = 5 * 1024**2
+    scheduler_assumed_source_bitrate: int = 2_500_000
+    scheduler_encode_factor: float = 0.5
+    scheduler_default_job_seconds: int = 1800
+    metadata_timeout_seconds: int = 120
+
+    # Authentication cache
+    auth_cache_ttl_seconds: int = 60
+    auth_cache_max_entries: int = 10000
+
+    # Signed HLS URLs verified by nginx secure_link (docs/Nginx.md)
+    hls_signed_urls: bool = False
+    hls_signing_secret: str = ""
+    hls_signed_url_ttl_seconds: int = 6 * 60 * 60
+    hls_signed_prefix: str = "/hls"
+    hls_signed_base_url: str = ""
+
+    # "accel" hands files to nginx with X-Accel-Redirect (sendfile), "native" serves them from the API,
+    # streamed through Python under uvicorn (no ASGI pathsend support): for development and small setups
+    file_serving_mode: str = "accel"
+    native_cache_max_age: int = 3600
+    manifest_cache_max_entries: int = 5000
+
+    # Next playlist item readahead. Masters requested with ?playlist_id= name the next item
+    # (#EXT-X-SESSION-DATA); once playback is within prefetch_lead_seconds of the end, the next
+    # item's playlists and first prefetch_segments segments per variant are read into the page cache
+    prefetch_segments: int = 3
+    prefetch_lead_seconds: float = 60
+    # A video is read ahead at most once per this many seconds
+    prefetch_repeat_seconds: float = 600
+
+    # Listing responses (GET /videos/, GET /playlists/) cached per user data version
+    listing_cache_max_entries: int = 2000
+    # How long a user's data version is trusted before re-reading it; bounds staleness
+    # for writes made by other processes (local writes invalidate immediately)
+    listing_version_ttl_seconds: int = 5
+
+    # Bandwidth accounting
+    usage_flush_seconds: int = 10
+    usage_counter_ttl_seconds: int = 30
+    # nginx access log written with `log_format usage '$status $body_bytes_sent $request_uri';`,
+    # tailed by the process_role "all" process or by worker.py, never by "api" processes
+    usage_access_log: str = ""
+
+    # Per-user token bucket burst, in seconds of the user's rate
+    shaping_burst_seconds: float = 2.0
+
+    # Password hashing runs off the request path: "process" pool or "thread" pool
+    password_hash_executor: str = "process"
+    password_hash_workers: int = 2
+    # Hash/verify calls allowed in flight (running + queued) before logins get a 503
+    password_hash_max_pending: int = 16
+    # Failed logins per username within the window before further attempts get a 429
+    login_max_failures: int = 5
+    login_failure_window_seconds: int = 300
+
+    # add_videos_from_folder.py --watch: folders and owner used when none are given on the
+    # command line, how long a new file must stay unchanged before it is imported, and the
+    # rescan interval where inotify isn't available
+    import_watch_folders: list[str] = []
+    import_watch_user: str = ""
+    import_settle_seconds: float = 30
+    import_poll_seconds: float = 30
+
+    # GET /metrics requires "Authorization: Bearer <metrics_token>" when set
+    metrics_token: str = ""
+    # Per-user storage usage walks the storage tree, at most once per this many seconds
+    metrics_disk_usage_ttl_seconds: int = 300
+
+    # Request profiling (off: the middleware isn't even installed). When on, every response
+    # carries Server-Timing; sampled requests and requests sending profiling_header also get
+    # a stack-sampled profile, written to profiling_output_dir when slower than profiling_slow_ms
+    profiling_enabled: bool = False
+    profiling_sample_rate: float = 0.0
+    profiling_header: str = "X-Profile"
+    # When set, profiling_header must carry this value
+    profiling_token: str = ""
+    profiling_slow_ms: float = 500
+    profiling_interval_ms: float = 5
+    profiling_output_dir: str = "profiles"
+
     class Config:
         env_file = Path(Path(__file__).resolve().parent) / ".env"
-        print(f'environment created - {Path(Path(__file__).resolve().name)}')
 
 
 setting = Settings()
\ No newline at end of file
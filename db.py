@@ -1,17 +1,57 @@
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from config import setting
 
+# Async drivers for the sync URL in db_url (postgres needs asyncpg installed)
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "postgres": "postgresql+asyncpg",
+    "mysql": "mysql+aiomysql",
+}
+
+
+def async_db_url(db_url: str) -> str:
+    url = make_url(db_url)
+    backend = url.get_backend_name()
+    if backend in ASYNC_DRIVERS:
+        url = url.set(drivername=ASYNC_DRIVERS[backend])
+    return url.render_as_string(hide_password=False)
+
+
+def pool_options(db_url: str) -> dict:
+    url = make_url(db_url)
+    # In-memory SQLite runs on a single static connection, there is nothing to size
+    if url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:"):
+        return {}
+    return {
+        "pool_size": setting.db_pool_size,
+        "max_overflow": setting.db_max_overflow,
+        "pool_recycle": setting.db_pool_recycle,
+        "pool_timeout": setting.db_pool_timeout,
+        "pool_pre_ping": True,
+    }
+
 
 Base = declarative_base()
-engine = create_engine(setting.db_url)
+engine = create_engine(setting.db_url, **pool_options(setting.db_url))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+async_engine = create_async_engine(async_db_url(setting.db_url), **pool_options(setting.db_url))
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
 
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -1,19 +1,48 @@
 import asyncio
+import time
 import threading
-from queue import Queue
+from concurrent.futures import ThreadPoolExecutor
 from utils.downloader import TorrentVideosDownloader
-from utils.downloads_processor import DownloadedVideoProcessor
 from config import setting
 from utils.torrent_processor import download_and_process_torrent
+from utils.jobs import job_tracker, JobStage
+from utils.admission import AdmissionDeferred
+from utils.scheduler import IngestScheduler
+from utils.metrics import metrics
 
-downloader = TorrentVideosDownloader(setting.tmp_downloading_path)
-downloads_processor = DownloadedVideoProcessor(setting.base_storage_path, setting.tmp_downloading_path)
+# Created by start(): the libtorrent session binds its listen ports. It only runs metadata lookups
+downloader = None
+worker_thread = None
 
-# Queue for torrent processing
-torrent_queue = Queue()
+# Session of the job the worker is running. Every job downloads in a session of its own, so a
+# metadata lookup of the same torrent in `downloader` can't remove the download's handle
+job_downloader = None
+
+# Scheduler for torrent processing (same interface as the Queue it replaced)
+torrent_queue = IngestScheduler(setting.scheduler_policy)
+
+# Metadata lookups run ahead of the worker so the scheduler knows job sizes
+metadata_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="torrent-metadata")
+
+def resolve_metadata(task):
+    """Fetch torrent metadata for a queued task and feed its size to the scheduler."""
+    try:
+        torrent_info = downloader.get_info(task['magnet_link'], timeout=setting.metadata_timeout_seconds)
+    except Exception:
+        # The worker fetches it again when the job runs
+        return
+    task['torrent_info'] = torrent_info
+    torrent_queue.update_estimate(task.get('job_id'), size_bytes=torrent_info['total_size'])
+    job_tracker.update(task.get('job_id'), name=torrent_info['name'], total_size=torrent_info['total_size'])
+
+def enqueue_torrent(task):
+    """Queue a torrent task and start resolving its metadata in the background."""
+    torrent_queue.put(task)
+    metadata_pool.submit(resolve_metadata, task)
 
 def process_torrent_queue():
     """Background worker that processes torrents from the queue."""
+    global job_downloader
     while True:
         try:
             task = torrent_queue.get()
@@ -23,13 +52,67 @@ def process_torrent_queue():
             magnet_link = task['magnet_link']
             owner_id = task['owner_id']
             torrent_name = task.get('torrent_name')
+            job_id = task.get('job_id')
             
-            download_and_process_torrent(magnet_link, owner_id, torrent_name)
+            job_downloader = TorrentVideosDownloader(setting.tmp_downloading_path)
+            try:
+                download_and_process_torrent(
+                    magnet_link, owner_id, torrent_name, job_id, task.get('torrent_info'), job_downloader,
+                    task.get('resume')
+                )
+            finally:
+                job_downloader = None
             
             torrent_queue.task_done()
+        except AdmissionDeferred as e:
+            # Not due again until retry_after, other jobs that fit run meanwhile. A deferred encode
+            # attaches the state the next run resumes from (its records and download exist already)
+            task['resume'] = getattr(e, 'resume', None) or task.get('resume')
+            task['not_before'] = time.time() + e.retry_after
+            job_tracker.update(task.get('job_id'), JobStage.QUEUED, deferred=e.reason, retry_at=task['not_before'])
+            torrent_queue.requeue(task)
         except Exception as e:
-            pass
+            job_tracker.update(task.get('job_id'), JobStage.FAILED, error=str(e))
+            torrent_queue.task_done()
+
+def collect_ingest_metrics():
+    """Queue depth, unfinished job ages and per-torrent transfer state for /metrics."""
+    stages = job_tracker.stage_summary()
+    families = [
+        ("ingest_queue_depth", "gauge", "Torrent tasks waiting for the worker.", [({}, torrent_queue.qsize())]),
+        ("ingest_jobs", "gauge", "Unfinished ingest jobs per stage.",
+         [({"stage": stage}, count) for stage, (count, _) in stages.items()]),
+        ("ingest_oldest_job_age_seconds", "gauge", "Age of the oldest unfinished ingest job per stage.",
+         [({"stage": stage}, round(oldest, 3)) for stage, (_, oldest) in stages.items()]),
+    ]
+
+    session = job_downloader.session if job_downloader else None
+    statuses = [handle.status() for handle in session.get_torrents()] if session else []
+    downloading = [status for status in statuses if not status.is_seeding]
+    labels = [{"info_hash": str(status.info_hash), "name": status.name} for status in downloading]
+    families += [
+        ("torrents_active", "gauge", "Torrents still downloading.", [({}, len(downloading))]),
+        ("torrent_download_rate_bytes", "gauge", "Current download rate per torrent.",
+         [(label, status.download_rate) for label, status in zip(labels, downloading)]),
+        ("torrent_peers", "gauge", "Connected peers per torrent.",
+         [(label, status.num_peers) for label, status in zip(labels, downloading)]),
+        ("torrent_progress_ratio", "gauge", "Downloaded fraction per torrent.",
+         [(label, round(status.progress, 4)) for label, status in zip(labels, downloading)]),
+    ]
+    return families
+
+def start():
+    """Open the torrent session and start the background worker (process_role worker or all)."""
+    global downloader, worker_thread
+    if worker_thread is not None:
+        return
+    downloader = TorrentVideosDownloader(setting.tmp_downloading_path)
+    metrics.register_collector(collect_ingest_metrics)
+    worker_thread = threading.Thread(target=process_torrent_queue, daemon=True, name="ingest-worker")
+    worker_thread.start()
 
-# Start background worker thread
-worker_thread = threading.Thread(target=process_torrent_queue, daemon=True)
-worker_thread.start()
\ No newline at end of file
+def stop():
+    """Let the worker exit after its current job; a job still running is abandoned on exit."""
+    if worker_thread is not None:
+        torrent_queue.close()
+        metadata_pool.shutdown(wait=False, cancel_futures=True)
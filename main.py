@@ -1,17 +1,43 @@
-from fastapi import FastAPI
+import time
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from routers import auth, videos, playlists
-from db import engine, Base
-from models.users import User, UserUsage
-from models.videos import Video, Playlist, PlaylistVideoMapping
+from routers import auth, videos, playlists, search, metrics
+from utils.admission import admission
+from utils.usage import usage_recorder
+from utils.pswds import password_hasher
+from utils.migrations import upgrade_database
+from utils.metrics import instrument_engine, start_request, observe_request
+from db import engine, async_engine
+from utils.ingest import ingest
+from config import setting
 
-# Create all database tables
-Base.metadata.create_all(bind=engine)
+# Per-request query counts and time for /metrics
+instrument_engine(engine)
+instrument_engine(async_engine.sync_engine)
+
+# Importing this module has no side effects: migrations, background threads and the
+# torrent session (process_role "all" only) start here, once per server process
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if setting.process_role == "worker":
+        raise RuntimeError("process_role=worker doesn't serve HTTP, run `python worker.py`")
+    if setting.migrate_on_startup:
+        # Create or migrate the database tables (see migrations/)
+        upgrade_database()
+    usage_recorder.start(tail_access_log=setting.process_role == "all")
+    ingest.start()
+    yield
+    ingest.stop()
+    # Flushes bandwidth usage still held in memory
+    usage_recorder.stop()
+    password_hasher.shutdown()
 
 app = FastAPI(
     title="Streamer API",
     description="A FastAPI application for video streaming platform",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Configure CORS
@@ -23,6 +49,27 @@ app.add_middleware(
     allow_headers=["*"],  # Allow all headers
 )
 
+# Feed API latency into ingest admission control so encodes back off when the API slows down,
+# and into the per-route histograms served at /metrics
+@app.middleware("http")
+async def record_latency(request: Request, call_next):
+    started = time.perf_counter()
+    db_stats = start_request()
+    response = await call_next(request)
+    elapsed = time.perf_counter() - started
+    admission.latency.record(elapsed * 1000)
+    observe_request(request, response.status_code, elapsed, db_stats)
+    return response
+
+# Opt-in per-request phase timings and sampled profiles, see utils/profiling.py
+if setting.profiling_enabled:
+    from utils import profiling
+    profiling.instrument_engine(engine)
+    profiling.instrument_engine(async_engine.sync_engine)
+    app.middleware("http")(profiling.profile_requests)
+
 app.include_router(auth.route)
 app.include_router(videos.route)
-app.include_router(playlists.route)
\ No newline at end of file
+app.include_router(playlists.route)
+app.include_router(search.route)
+app.include_router(metrics.route)
\ No newline at end of file
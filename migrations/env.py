@@ -0,0 +1,64 @@
+import re
+from logging.config import fileConfig
+from alembic import context
+from sqlalchemy import create_engine
+from config import setting
+from db import Base
+# Register every table on Base.metadata for autogenerate
+from models.users import User, UserUsage, UserUsageDaily, UserUsageMonthly
+from models.videos import Video, Playlist, PlaylistVideoMapping
+from models.jobs import IngestJob, ApiLatencyReport
+from models.imports import ImportedFile
+
+config = context.config
+if config.config_file_name is not None and config.attributes.get("configure_logging", True):
+    fileConfig(config.config_file_name)
+
+target_metadata = Base.metadata
+
+# Full-text search objects of migration 0007 are raw SQL with no model behind them
+SEARCH_OBJECTS = re.compile(r"^(videos|playlists)_fts(_\w+)?$|^ix_\w+_title_search$")
+
+
+def include_name(name, type_, parent_names):
+    return not (type_ in ("table", "index") and SEARCH_OBJECTS.match(name))
+
+
+def run_migrations_offline():
+    context.configure(
+        url=setting.db_url,
+        target_metadata=target_metadata,
+        include_name=include_name,
+        literal_binds=True,
+        render_as_batch=setting.db_url.startswith("sqlite"),
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_with_connection(connection):
+    context.configure(
+        connection=connection,
+        target_metadata=target_metadata,
+        include_name=include_name,
+        # SQLite can't ALTER most constraints, batch mode rebuilds the table instead
+        render_as_batch=connection.dialect.name == "sqlite",
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online():
+    # utils.migrations passes the app's own connection (startup upgrades, in-memory SQLite)
+    connection = config.attributes.get("connection")
+    if connection is not None:
+        run_with_connection(connection)
+        return
+    with create_engine(setting.db_url).connect() as connection:
+        run_with_connection(connection)
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
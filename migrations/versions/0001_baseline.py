@@ -0,0 +1,74 @@
+"""Baseline schema
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "users",
+        sa.Column("id", sa.String(36), primary_key=True),
+        sa.Column("username", sa.String(), unique=True),
+        sa.Column("password_hash", sa.String(), nullable=False),
+        sa.Column("daily_bandwidth_limit", sa.Integer()),
+        sa.Column("monthly_bandwidth_limit", sa.Integer()),
+        sa.Column("created_at", sa.DateTime(), server_default=sa.func.now()),
+    )
+    op.create_table(
+        "videos",
+        sa.Column("id", sa.String(36), primary_key=True),
+        sa.Column("title", sa.String(), nullable=False),
+        sa.Column("owner_id", sa.String(36), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("storage_path", sa.String(), nullable=False),
+        sa.Column("thumbnail_url", sa.String()),
+        sa.Column(
+            "status",
+            sa.Enum("DOWNLOADING", "PROCESSING", "PROCESSED", "FAILED", name="videostatus", native_enum=False),
+            nullable=False,
+        ),
+        sa.Column("created_at", sa.DateTime(), server_default=sa.func.now()),
+        sa.Column("duration_seconds", sa.Integer()),
+        sa.Column("width", sa.Integer()),
+        sa.Column("height", sa.Integer()),
+        sa.Column("size_bytes", sa.Integer()),
+    )
+    op.create_table(
+        "playlists",
+        sa.Column("id", sa.String(36), primary_key=True),
+        sa.Column("title", sa.String(), nullable=False),
+        sa.Column("owner_id", sa.String(36), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("created_at", sa.DateTime(), server_default=sa.func.now()),
+    )
+    op.create_table(
+        "playlists_videos_mappings",
+        sa.Column("playlist_id", sa.String(36), sa.ForeignKey("playlists.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("video_id", sa.String(36), sa.ForeignKey("videos.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("position", sa.Integer(), nullable=False),
+        sa.UniqueConstraint("playlist_id", "position", name="uq_playlist_position"),
+    )
+    op.create_table(
+        "user_usage",
+        sa.Column("id", sa.String(36), primary_key=True),
+        sa.Column("user_id", sa.String(36), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("video_id", sa.String(36), sa.ForeignKey("videos.id")),
+        sa.Column("bandwidth_used", sa.Integer(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), server_default=sa.func.now()),
+    )
+
+
+def downgrade():
+    op.drop_table("user_usage")
+    op.drop_table("playlists_videos_mappings")
+    op.drop_table("playlists")
+    op.drop_table("videos")
+    op.drop_table("users")
@@ -0,0 +1,41 @@
+"""Per-user quality and rate caps, daily and monthly usage rollups
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table("users") as batch:
+        batch.add_column(sa.Column("max_quality", sa.Integer()))
+        batch.add_column(sa.Column("rate_limit", sa.Integer()))
+
+    op.create_table(
+        "user_usage_daily",
+        sa.Column("user_id", sa.String(36), sa.ForeignKey("users.id"), primary_key=True),
+        sa.Column("day", sa.Date(), primary_key=True),
+        sa.Column("bytes_used", sa.BigInteger(), nullable=False),
+    )
+    op.create_table(
+        "user_usage_monthly",
+        sa.Column("user_id", sa.String(36), sa.ForeignKey("users.id"), primary_key=True),
+        sa.Column("month", sa.Date(), primary_key=True),
+        sa.Column("bytes_used", sa.BigInteger(), nullable=False),
+    )
+
+
+def downgrade():
+    op.drop_table("user_usage_monthly")
+    op.drop_table("user_usage_daily")
+    with op.batch_alter_table("users") as batch:
+        batch.drop_column("rate_limit")
+        batch.drop_column("max_quality")
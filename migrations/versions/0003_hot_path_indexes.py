@@ -0,0 +1,29 @@
+"""Indexes for owner listings, mapping lookups by video and usage by user
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-19
+"""
+from alembic import op
+
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # get_videos / get_playlists: owner equality, then created_at order with id as tie breaker
+    op.create_index("ix_videos_owner_created", "videos", ["owner_id", "created_at", "id"])
+    op.create_index("ix_playlists_owner_created", "playlists", ["owner_id", "created_at", "id"])
+    # delete_video removes mappings by video_id, the primary key leads with playlist_id
+    op.create_index("ix_playlist_mappings_video", "playlists_videos_mappings", ["video_id"])
+    op.create_index("ix_user_usage_user_created", "user_usage", ["user_id", "created_at"])
+
+
+def downgrade():
+    op.drop_index("ix_user_usage_user_created", table_name="user_usage")
+    op.drop_index("ix_playlist_mappings_video", table_name="playlists_videos_mappings")
+    op.drop_index("ix_playlists_owner_created", table_name="playlists")
+    op.drop_index("ix_videos_owner_created", table_name="videos")
@@ -0,0 +1,40 @@
+"""Ingest jobs table for handing jobs from API processes to workers
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "ingest_jobs",
+        sa.Column("id", sa.String(32), primary_key=True),
+        sa.Column("owner_id", sa.String(36), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("magnet_link", sa.Text(), nullable=False),
+        sa.Column("torrent_name", sa.String()),
+        sa.Column("stage", sa.String(16), nullable=False),
+        sa.Column("priority", sa.Integer(), nullable=False),
+        sa.Column("progress", sa.Text()),
+        sa.Column("claimed_by", sa.String()),
+        sa.Column("created_at", sa.Float(), nullable=False),
+        sa.Column("updated_at", sa.Float(), nullable=False),
+        sa.Column("playable_at", sa.Float()),
+    )
+    # Workers claim the oldest queued jobs, event streams poll a user's recently updated jobs
+    op.create_index("ix_ingest_jobs_stage_created", "ingest_jobs", ["stage", "created_at"])
+    op.create_index("ix_ingest_jobs_owner_updated", "ingest_jobs", ["owner_id", "updated_at"])
+
+
+def downgrade():
+    op.drop_index("ix_ingest_jobs_owner_updated", table_name="ingest_jobs")
+    op.drop_index("ix_ingest_jobs_stage_created", table_name="ingest_jobs")
+    op.drop_table("ingest_jobs")
@@ -0,0 +1,35 @@
+"""Import manifest of source files ingested from local folders
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "imported_files",
+        sa.Column("owner_id", sa.String(36), sa.ForeignKey("users.id"), primary_key=True),
+        sa.Column("path", sa.String(), primary_key=True),
+        sa.Column("size_bytes", sa.BigInteger(), nullable=False),
+        sa.Column("mtime", sa.Float(), nullable=False),
+        sa.Column("content_hash", sa.String(64)),
+        sa.Column("video_id", sa.String(36), nullable=False),
+        sa.Column("playlist_id", sa.String(36)),
+        sa.Column("imported_at", sa.Float(), nullable=False),
+    )
+    # --hash runs recognise moved or copied files by content
+    op.create_index("ix_imported_files_owner_hash", "imported_files", ["owner_id", "content_hash"])
+
+
+def downgrade():
+    op.drop_index("ix_imported_files_owner_hash", table_name="imported_files")
+    op.drop_table("imported_files")
@@ -0,0 +1,68 @@
+"""Full-text indexes on video and playlist titles
+
+SQLite: FTS5 tables videos_fts and playlists_fts (external content, keyed
+by rowid) kept in sync by triggers. A later batch migration that recreates
+videos or playlists drops these triggers and renumbers rowids, so it has to
+recreate the triggers and rebuild both indexes.
+
+PostgreSQL: GIN indexes on the title's tsvector, which PostgreSQL keeps in
+sync itself. The expression is repeated by utils/search.py.
+
+Other databases get no index, search falls back to LIKE.
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-19
+"""
+from alembic import op
+
+
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+TABLES = ("videos", "playlists")
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    for table in TABLES:
+        if dialect == "sqlite":
+            # unicode61 splits on punctuation like the Postgres expression below; prefix
+            # indexes make short prefix terms ("s0*") as cheap as whole words
+            op.execute(
+                f"CREATE VIRTUAL TABLE {table}_fts USING fts5("
+                f"title, content='{table}', content_rowid='rowid', "
+                f"tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+            )
+            op.execute(
+                f"CREATE TRIGGER {table}_fts_insert AFTER INSERT ON {table} BEGIN "
+                f"INSERT INTO {table}_fts(rowid, title) VALUES (new.rowid, new.title); END"
+            )
+            op.execute(
+                f"CREATE TRIGGER {table}_fts_delete AFTER DELETE ON {table} BEGIN "
+                f"INSERT INTO {table}_fts({table}_fts, rowid, title) VALUES ('delete', old.rowid, old.title); END"
+            )
+            op.execute(
+                f"CREATE TRIGGER {table}_fts_update AFTER UPDATE OF title ON {table} BEGIN "
+                f"INSERT INTO {table}_fts({table}_fts, rowid, title) VALUES ('delete', old.rowid, old.title); "
+                f"INSERT INTO {table}_fts(rowid, title) VALUES (new.rowid, new.title); END"
+            )
+            op.execute(f"INSERT INTO {table}_fts({table}_fts) VALUES ('rebuild')")
+        elif dialect == "postgresql":
+            op.execute(
+                f"CREATE INDEX ix_{table}_title_search ON {table} USING gin "
+                f"(to_tsvector('simple', regexp_replace({table}.title, '[^[:alnum:]]+', ' ', 'g')))"
+            )
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    for table in TABLES:
+        if dialect == "sqlite":
+            for trigger in ("insert", "delete", "update"):
+                op.execute(f"DROP TRIGGER IF EXISTS {table}_fts_{trigger}")
+            op.execute(f"DROP TABLE IF EXISTS {table}_fts")
+        elif dialect == "postgresql":
+            op.execute(f"DROP INDEX IF EXISTS ix_{table}_title_search")
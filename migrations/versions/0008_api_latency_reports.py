@@ -0,0 +1,27 @@
+"""API latency reports read by ingest workers for encode throttling
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0008"
+down_revision = "0007"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "api_latency_reports",
+        sa.Column("reporter", sa.String(), primary_key=True),
+        sa.Column("p99_ms", sa.Float(), nullable=False),
+        sa.Column("updated_at", sa.Float(), nullable=False),
+    )
+
+
+def downgrade():
+    op.drop_table("api_latency_reports")
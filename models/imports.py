@@ -0,0 +1,27 @@
+from sqlalchemy import Column, Float, BigInteger, String, ForeignKey, Index
+from db import Base
+
+
+class ImportedFile(Base):
+    """
+    Manifest of source files imported by add_videos_from_folder.py, so re-runs
+    and watch mode skip files whose size and mtime (or, with --hash, content)
+    haven't changed. video_id and playlist_id aren't foreign keys: deleting a
+    video through the API keeps its source marked as imported.
+    """
+    __tablename__ = "imported_files"
+
+    owner_id = Column(String(36), ForeignKey("users.id"), primary_key=True)
+    # Absolute path of the source file
+    path = Column(String, primary_key=True)
+    size_bytes = Column(BigInteger, nullable=False)
+    mtime = Column(Float, nullable=False)
+    # sha256 hex digest, only recorded by runs with --hash
+    content_hash = Column(String(64))
+    video_id = Column(String(36), nullable=False)
+    playlist_id = Column(String(36))
+    imported_at = Column(Float, nullable=False)
+
+    __table_args__ = (
+        Index("ix_imported_files_owner_hash", "owner_id", "content_hash"),
+    )
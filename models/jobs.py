@@ -0,0 +1,45 @@
+from sqlalchemy import Column, Integer, Float, String, Text, ForeignKey, Index
+from db import Base
+
+
+class IngestJob(Base):
+    """
+    Ingest job handed from API processes to worker processes (process_role
+    api/worker). Workers claim queued rows and write their progress back, so
+    the job endpoints and event streams of any API process can report it.
+    Times are epoch seconds, as the job tracker reports them.
+    """
+    __tablename__ = "ingest_jobs"
+
+    id = Column(String(32), primary_key=True)
+    owner_id = Column(String(36), ForeignKey("users.id"), nullable=False)
+    magnet_link = Column(Text, nullable=False)
+    torrent_name = Column(String)
+    stage = Column(String(16), nullable=False)
+    priority = Column(Integer, nullable=False, default=0)
+    # JSON of the tracker's progress fields for the current stage
+    progress = Column(Text)
+    # "<hostname>:<pid>" of the worker running the job, NULL while unclaimed
+    claimed_by = Column(String)
+    created_at = Column(Float, nullable=False)
+    updated_at = Column(Float, nullable=False)
+    playable_at = Column(Float)
+
+    __table_args__ = (
+        Index("ix_ingest_jobs_stage_created", "stage", "created_at"),
+        Index("ix_ingest_jobs_owner_updated", "owner_id", "updated_at"),
+    )
+
+
+class ApiLatencyReport(Base):
+    """
+    Recent API p99 latency of one process_role "api" process, refreshed every
+    latency_report_seconds. Worker processes serve no requests themselves and
+    throttle encodes on the worst fresh report instead.
+    """
+    __tablename__ = "api_latency_reports"
+
+    # "<hostname>:<pid>" of the reporting API process
+    reporter = Column(String, primary_key=True)
+    p99_ms = Column(Float, nullable=False)
+    updated_at = Column(Float, nullable=False)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, func
+from sqlalchemy import Column, Integer, BigInteger, String, Date, DateTime, ForeignKey, func, Index
 from passlib.context import CryptContext
 from db import Base
 import uuid
@@ -11,8 +11,13 @@ class User(Base):
     id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     username = Column(String, unique=True)
     password_hash = Column(String, nullable=False)
+    # Bandwidth limits are in megabytes, NULL means unlimited
     daily_bandwidth_limit = Column(Integer)
     monthly_bandwidth_limit = Column(Integer)
+    # Highest rendition height (e.g. 360) this user may stream, NULL means no cap
+    max_quality = Column(Integer)
+    # Sustained transfer rate in kilobytes per second, NULL means unshaped
+    rate_limit = Column(Integer)
     created_at = Column(DateTime, server_default=func.now())
 
 class UserUsage(Base):
@@ -22,4 +27,23 @@ class UserUsage(Base):
     user_id = Column(String(36), ForeignKey("users.id"), nullable=False)
     video_id = Column(String(36), ForeignKey("videos.id"))
     bandwidth_used = Column(Integer, nullable=False)
-    created_at = Column(DateTime, server_default=func.now())
\ No newline at end of file
+    created_at = Column(DateTime, server_default=func.now())
+
+    __table_args__ = (
+        Index("ix_user_usage_user_created", "user_id", "created_at"),
+    )
+
+class UserUsageDaily(Base):
+    __tablename__ = "user_usage_daily"
+
+    user_id = Column(String(36), ForeignKey("users.id"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    bytes_used = Column(BigInteger, nullable=False, default=0)
+
+class UserUsageMonthly(Base):
+    __tablename__ = "user_usage_monthly"
+
+    user_id = Column(String(36), ForeignKey("users.id"), primary_key=True)
+    # First day of the month
+    month = Column(Date, primary_key=True)
+    bytes_used = Column(BigInteger, nullable=False, default=0)
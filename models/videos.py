@@ -1,6 +1,9 @@
-from sqlalchemy import Column, Integer, String,DateTime, ForeignKey, func, UniqueConstraint
+from sqlalchemy import Column, Integer, BigInteger, String,DateTime, ForeignKey, func, UniqueConstraint, Index
+from sqlalchemy import event, select, update, insert
+from sqlalchemy.exc import IntegrityError
 from enum import Enum
 from sqlalchemy import Enum as SAEnum
+from sqlalchemy.orm import object_session, Session
 import uuid
 
 # Importing Base
@@ -27,6 +30,11 @@ class Video(Base):
     height = Column(Integer)
     size_bytes = Column(Integer)
 
+    __table_args__ = (
+        # Owner listings, newest first, with id as the tie breaker
+        Index("ix_videos_owner_created", "owner_id", "created_at", "id"),
+    )
+
 class Playlist(Base):
     __tablename__ = "playlists" 
 
@@ -35,6 +43,14 @@ class Playlist(Base):
     owner_id = Column(String(36), ForeignKey("users.id"), nullable=False)
     created_at = Column(DateTime, server_default=func.now())
 
+    __table_args__ = (
+        Index("ix_playlists_owner_created", "owner_id", "created_at", "id"),
+    )
+
+# Playlist positions are spaced out so videos can be placed between two others without renumbering:
+# every writer numbers them 1 * POSITION_GAP, 2 * POSITION_GAP, ...
+POSITION_GAP = 1024
+
 class PlaylistVideoMapping(Base):
     __tablename__ = "playlists_videos_mappings"
     playlist_id = Column(
@@ -51,4 +67,93 @@ class PlaylistVideoMapping(Base):
 
     __table_args__ = (
         UniqueConstraint("playlist_id", "position", name="uq_playlist_position"),
-    )
\ No newline at end of file
+        # The primary key leads with playlist_id, lookups by video (deletes, usage) need their own
+        Index("ix_playlist_mappings_video", "video_id"),
+    )
+
+class UserDataVersion(Base):
+    """
+    Per-user counter bumped on every write to the user's videos, playlists or
+    playlist mappings. Listing endpoints use it as their ETag and cache key.
+    """
+    __tablename__ = "user_data_versions"
+
+    user_id = Column(String(36), ForeignKey("users.id"), primary_key=True)
+    version = Column(BigInteger, nullable=False, default=0)
+
+
+def _touched(target):
+    session = object_session(target)
+    if session is None:
+        return None
+    return session.info.setdefault("touched_data", {"owners": set(), "playlists": set()})
+
+
+@event.listens_for(Video, "after_insert")
+@event.listens_for(Video, "after_update")
+@event.listens_for(Video, "after_delete")
+@event.listens_for(Playlist, "after_insert")
+@event.listens_for(Playlist, "after_update")
+@event.listens_for(Playlist, "after_delete")
+def _touch_owner(mapper, connection, target):
+    touched = _touched(target)
+    if touched is not None:
+        touched["owners"].add(target.owner_id)
+
+
+@event.listens_for(PlaylistVideoMapping, "after_insert")
+@event.listens_for(PlaylistVideoMapping, "after_update")
+@event.listens_for(PlaylistVideoMapping, "after_delete")
+def _touch_playlist(mapper, connection, target):
+    touched = _touched(target)
+    if touched is not None:
+        touched["playlists"].add(target.playlist_id)
+
+
+def bump_data_versions(connection, user_ids):
+    """Bump the data version of `user_ids` in the connection's transaction."""
+    for user_id in user_ids:
+        result = connection.execute(
+            update(UserDataVersion)
+            .where(UserDataVersion.user_id == user_id)
+            .values(version=UserDataVersion.version + 1)
+        )
+        if result.rowcount:
+            continue
+        try:
+            with connection.begin_nested():
+                connection.execute(insert(UserDataVersion).values(user_id=user_id, version=1))
+        except IntegrityError:
+            # Created by a concurrent writer
+            connection.execute(
+                update(UserDataVersion)
+                .where(UserDataVersion.user_id == user_id)
+                .values(version=UserDataVersion.version + 1)
+            )
+
+
+@event.listens_for(Session, "after_flush")
+def _bump_touched_versions(session, flush_context):
+    touched = session.info.pop("touched_data", None)
+    if not touched:
+        return
+    owners = set(touched["owners"])
+    if touched["playlists"]:
+        owners.update(session.connection().execute(
+            select(Playlist.owner_id).where(Playlist.id.in_(touched["playlists"]))
+        ).scalars())
+    owners.discard(None)
+    record_data_change(session, owners)
+
+
+def record_data_change(session, user_ids):
+    """
+    Bump the data version of `user_ids` within the session's transaction.
+    Called by the flush hook; bulk insert/update/delete statements skip the
+    ORM events and have to call it themselves.
+    """
+    if not user_ids:
+        return
+    bump_data_versions(session.connection(), user_ids)
+    # Read by utils.listing_cache to drop its cached versions once the transaction commits
+    session.info.setdefault("bumped_owners", set()).update(user_ids)
@@ -1,10 +1,13 @@
 from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy import select
 from sqlalchemy.orm import Session
-from db import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from db import get_db, get_async_db
 from schemas.users import UserLogin, UserCreate, UserResponse, UserShortResponse
 from models.users import User
-from utils.pswds import secure_pwd, verify_pwd
+from utils.pswds import secure_pwd, password_hasher, login_throttle, PasswordHasherBusy
 from utils.auth import create_access_token, create_refresh_token, get_current_user
+from utils.usage import usage_recorder
 from datetime import timedelta
 from fastapi.security import OAuth2PasswordBearer
 from typing import List
@@ -47,30 +50,52 @@ def register_user(payload: UserCreate, db: Session = Depends(get_db)):
 
 
 @route.post("/login")
-def login_user(payload: UserLogin, db: Session = Depends(get_db)):
+async def login_user(payload: UserLogin, db: AsyncSession = Depends(get_async_db)):
     """
-    Login user based on username and password
+    Login user based on username and password.
+    bcrypt runs in the password hashing executor, never on the request threadpool;
+    repeated failures for a username are answered with 429 before any hashing.
     """
     if not payload.username:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Please provide username",
         )
+
+    retry_after = login_throttle.retry_after(payload.username)
+    if retry_after:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many failed login attempts",
+            headers={"Retry-After": str(retry_after)}
+        )
     
     # Find user
-    user = db.query(User).filter(User.username == payload.username).first()
+    result = await db.execute(select(User.id, User.password_hash).where(User.username == payload.username))
+    user = result.first()
     if not user:
+        login_throttle.failed(payload.username)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid credentials"
         )
     
     # Verify password
-    if not verify_pwd(payload.password, user.password_hash):
+    try:
+        valid = await password_hasher.verify(payload.password, user.password_hash)
+    except PasswordHasherBusy:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many logins in progress, try again shortly",
+            headers={"Retry-After": "1"}
+        )
+    if not valid:
+        login_throttle.failed(payload.username)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid credentials"
         )
+    login_throttle.succeeded(payload.username)
     
     # Create tokens
     access_token = create_access_token(subject=user.id)
@@ -142,3 +167,18 @@ def get_current_user_info(current_user: User = Depends(get_current_user)):
     Get current authenticated user's information.
     """
     return current_user
+
+
+@route.get("/users/me/usage", response_model=dict)
+def get_current_user_usage(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Get the authenticated user's bandwidth usage for today and this month, in bytes.
+    """
+    return {
+        **usage_recorder.usage(db, current_user.id),
+        'daily_bandwidth_limit': current_user.daily_bandwidth_limit,
+        'monthly_bandwidth_limit': current_user.monthly_bandwidth_limit,
+    }
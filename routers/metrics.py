@@ -0,0 +1,27 @@
+import hmac
+from fastapi import APIRouter, HTTPException, Request, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse
+from utils.metrics import metrics
+from config import setting
+
+route = APIRouter(tags=["Metrics"])
+
+@route.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def get_metrics(request: Request):
+    """
+    Prometheus text exposition of API, ingest queue, downloader, encoder and
+    storage metrics. Requires `Authorization: Bearer <metrics_token>` when the
+    token is set.
+    """
+    if setting.metrics_token:
+        expected = f"Bearer {setting.metrics_token}"
+        if not hmac.compare_digest(request.headers.get("authorization", ""), expected):
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Invalid metrics token",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+    # Collectors may walk the storage tree, keep that off the event loop
+    body = await run_in_threadpool(metrics.render)
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4; charset=utf-8")
@@ -1,18 +1,144 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from collections import defaultdict
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Query
+from fastapi.responses import ORJSONResponse
 from sqlalchemy.orm import Session
-from sqlalchemy import func
-from db import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, select, insert, delete
+from db import get_db, get_async_db
 from models.users import User
-from models.videos import Playlist, PlaylistVideoMapping, Video
+from models.videos import Playlist, PlaylistVideoMapping, Video, record_data_change, POSITION_GAP
 from schemas.videos import (PlaylistCreate, PlaylistResponse, PlaylistVideoMappingCreate, 
-                            PlaylistVideoMappingResponse, PlaylistWithVideosResponse, VideoResponse)
-from utils.auth import get_current_user
-from typing import List
+                            PlaylistVideoMappingResponse, PlaylistWithVideosResponse, VideoResponse,
+                            PlaylistVideosPlacement, PlaylistVideosRemove, PlaylistOrder)
+from utils.auth import get_current_user, get_current_user_async
+from typing import List, Optional
+from utils.listing_cache import listing_version, cached_listing, store_listing
+from utils.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, keyset_page, split_page, set_next_page, parse_fields
+from utils.serialization import PLAYLIST_FIELDS, video_columns, video_dto, playlist_dto
+from utils.profiling import phase
 from config import setting
 
 route = APIRouter(prefix="/playlists", tags=["Playlists"])
 
 
+async def _playlist_videos(db: AsyncSession, playlist_ids: list) -> dict:
+    """Video DTOs of each playlist in position order: one query for any number of playlists."""
+    videos = defaultdict(list)
+    if not playlist_ids:
+        return videos
+    result = await db.execute(
+        select(PlaylistVideoMapping.playlist_id, *video_columns())
+        .join(Video, Video.id == PlaylistVideoMapping.video_id)
+        .where(PlaylistVideoMapping.playlist_id.in_(playlist_ids))
+        .order_by(PlaylistVideoMapping.playlist_id, PlaylistVideoMapping.position)
+    )
+    with phase("serialize"):
+        for row in result:
+            videos[row.playlist_id].append(video_dto(row))
+    return videos
+
+
+def _owned_playlist(db: Session, playlist_id: str, current_user: User) -> Playlist:
+    playlist = db.query(Playlist).filter(Playlist.id == playlist_id).first()
+    if not playlist:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Playlist not found"
+        )
+    if playlist.owner_id != current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="You don't have permission to modify this playlist"
+        )
+    return playlist
+
+
+def _require_unique(video_ids: list):
+    if len(set(video_ids)) != len(video_ids):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="video_ids contains duplicates"
+        )
+
+
+def _playlist_entries(db: Session, playlist_id: str) -> list:
+    """(video_id, position) of every video in the playlist, in order."""
+    return db.execute(
+        select(PlaylistVideoMapping.video_id, PlaylistVideoMapping.position)
+        .where(PlaylistVideoMapping.playlist_id == playlist_id)
+        .order_by(PlaylistVideoMapping.position)
+    ).all()
+
+
+def _renumber(db: Session, playlist_id: str, video_ids: list) -> list:
+    """
+    Rewrite the playlist as `video_ids` at evenly gapped positions. Deleting and
+    re-inserting in one transaction never trips uq_playlist_position midway.
+    """
+    db.execute(delete(PlaylistVideoMapping).where(PlaylistVideoMapping.playlist_id == playlist_id))
+    rows = [
+        {"playlist_id": playlist_id, "video_id": video_id, "position": (i + 1) * POSITION_GAP}
+        for i, video_id in enumerate(video_ids)
+    ]
+    if rows:
+        db.execute(insert(PlaylistVideoMapping), rows)
+    return rows
+
+
+def _place(db: Session, playlist_id: str, entries: list, video_ids: list,
+           after_video_id: str = None, before_video_id: str = None) -> list:
+    """
+    Insert `video_ids` next to an anchor video (at the end without one).
+    `entries` is the current order, not containing `video_ids`. Positions are
+    taken from the gap around the anchor, the playlist is only renumbered
+    when that gap is too small.
+    """
+    if after_video_id and before_video_id:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Give either after_video_id or before_video_id, not both"
+        )
+
+    order = [video_id for video_id, _ in entries]
+    anchor = after_video_id or before_video_id
+    if not anchor:
+        index = len(order)
+    elif anchor in video_ids:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="The anchor video can't be one of the videos being placed"
+        )
+    elif anchor not in order:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Video {anchor} is not in this playlist"
+        )
+    else:
+        index = order.index(anchor) + (1 if after_video_id else 0)
+
+    lower = entries[index - 1].position if index > 0 else None
+    upper = entries[index].position if index < len(entries) else None
+    count = len(video_ids)
+    if upper is None:
+        start, step = (lower or 0), POSITION_GAP
+    elif lower is None:
+        start, step = upper - POSITION_GAP * (count + 1), POSITION_GAP
+    else:
+        start, step = lower, (upper - lower) // (count + 1)
+
+    if step < 1:
+        rows = _renumber(db, playlist_id, order[:index] + video_ids + order[index:])
+        placed = set(video_ids)
+        return [row for row in rows if row["video_id"] in placed]
+
+    rows = [
+        {"playlist_id": playlist_id, "video_id": video_id, "position": start + step * (i + 1)}
+        for i, video_id in enumerate(video_ids)
+    ]
+    db.execute(insert(PlaylistVideoMapping), rows)
+    return rows
+
+
 @route.post("/", response_model=PlaylistResponse, status_code=status.HTTP_201_CREATED)
 def create_playlist(
     payload: PlaylistCreate,
@@ -42,53 +168,59 @@ def create_playlist(
 
 
 @route.get("/", response_model=List[PlaylistWithVideosResponse])
-def get_playlists(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+async def get_playlists(
+    request: Request,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    q: Optional[str] = Query(None, description="Case-insensitive title search"),
+    fields: Optional[str] = Query(None, description="Comma separated fields to return, e.g. id,title"),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
 ):
     """
-    Get all playlists for the authenticated user with their videos.
+    Get the authenticated user's playlists with their videos, newest first, one page at a time.
+    The next page is advertised in the `X-Next-Cursor` and `Link` headers,
+    and repeat requests are answered from the ETag / response cache like GET /videos/.
     """
-    playlists = db.query(Playlist).filter(Playlist.owner_id == current_user.id).all()
-    
-    result = []
-    for playlist in playlists:
-        # Get all videos in this playlist
-        mappings = db.query(PlaylistVideoMapping).filter(
-            PlaylistVideoMapping.playlist_id == playlist.id
-        ).order_by(PlaylistVideoMapping.position).all()
-        
-        videos = []
-        for mapping in mappings:
-            video = db.query(Video).filter(Video.id == mapping.video_id).first()
-            if video:
-                # Use protected routes via API
-                video.storage_path = f"{setting.api_base_url}/videos/{video.id}/play"
-                if video.thumbnail_url:
-                    video.thumbnail_url = f"{setting.api_base_url}/videos/{video.id}/thumbnail"
-                videos.append(video)
-        
-        result.append({
-            "id": playlist.id,
-            "title": playlist.title,
-            "owner_id": playlist.owner_id,
-            "created_at": playlist.created_at,
-            "videos": videos
-        })
-    
-    return result
+    field_set = parse_fields(fields, PlaylistWithVideosResponse)
+    version = await listing_version(db, current_user.id)
+    cached = cached_listing(request, current_user.id, version)
+    if cached:
+        return cached
+
+    query = select(*PLAYLIST_FIELDS.values()).where(Playlist.owner_id == current_user.id)
+    if q:
+        query = query.where(Playlist.title.icontains(q, autoescape=True))
+
+    result = await db.execute(keyset_page(query, Playlist.created_at, Playlist.id, cursor, limit))
+    playlists, next_cursor = split_page(result.all(), limit)
+
+    # Videos are only loaded when they are asked for
+    videos = {}
+    if field_set is None or "videos" in field_set:
+        videos = await _playlist_videos(db, [playlist.id for playlist in playlists])
+
+    with phase("serialize"):
+        response = ORJSONResponse([
+            playlist_dto(playlist, videos.get(playlist.id), field_set) for playlist in playlists
+        ])
+    set_next_page(request, response, next_cursor)
+    return store_listing(request, current_user.id, version, response)
 
 
 @route.get("/{playlist_id}", response_model=PlaylistWithVideosResponse)
-def get_playlist(
+async def get_playlist(
     playlist_id: str,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
 ):
     """
     Get a specific playlist by ID with its videos. Only the owner can access it.
     """
-    playlist = db.query(Playlist).filter(Playlist.id == playlist_id).first()
+    result = await db.execute(
+        select(*PLAYLIST_FIELDS.values()).where(Playlist.id == playlist_id)
+    )
+    playlist = result.first()
     
     if not playlist:
         raise HTTPException(
@@ -102,28 +234,9 @@ def get_playlist(
             detail="You don't have permission to access this playlist"
         )
     
-    # Get all videos in this playlist
-    mappings = db.query(PlaylistVideoMapping).filter(
-        PlaylistVideoMapping.playlist_id == playlist_id
-    ).order_by(PlaylistVideoMapping.position).all()
-    
-    videos = []
-    for mapping in mappings:
-        video = db.query(Video).filter(Video.id == mapping.video_id).first()
-        if video:
-            # Use protected routes via API
-            video.storage_path = f"{setting.api_base_url}/videos/{video.id}/play"
-            if video.thumbnail_url:
-                video.thumbnail_url = f"{setting.api_base_url}/videos/{video.id}/thumbnail"
-            videos.append(video)
-    
-    return {
-        "id": playlist.id,
-        "title": playlist.title,
-        "owner_id": playlist.owner_id,
-        "created_at": playlist.created_at,
-        "videos": videos
-    }
+    videos = await _playlist_videos(db, [playlist.id])
+    with phase("serialize"):
+        return ORJSONResponse(playlist_dto(playlist, videos.get(playlist.id)))
 
 
 @route.post("/{playlist_id}/videos", response_model=PlaylistVideoMappingResponse, status_code=status.HTTP_201_CREATED)
@@ -195,7 +308,7 @@ def add_video_to_playlist(
         max_position = db.query(func.max(PlaylistVideoMapping.position)).filter(
             PlaylistVideoMapping.playlist_id == playlist_id
         ).scalar()
-        position = int(max_position or 0) + 1
+        position = int(max_position or 0) + POSITION_GAP
     
     # Create the mapping
     new_mapping = PlaylistVideoMapping(
@@ -260,6 +373,144 @@ def remove_video_from_playlist(
     return None
 
 
+@route.post("/{playlist_id}/videos/bulk", response_model=List[PlaylistVideoMappingResponse], status_code=status.HTTP_201_CREATED)
+def add_videos_to_playlist(
+    playlist_id: str,
+    payload: PlaylistVideosPlacement,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Add many videos to a playlist in one transaction, in the given order, after or
+    before an anchor video or at the end. Nothing is added if any video is rejected.
+    """
+    _owned_playlist(db, playlist_id, current_user)
+    _require_unique(payload.video_ids)
+
+    owners = dict(db.execute(
+        select(Video.id, Video.owner_id).where(Video.id.in_(payload.video_ids))
+    ).all())
+    missing = [video_id for video_id in payload.video_ids if video_id not in owners]
+    if missing:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Videos not found: {', '.join(missing)}"
+        )
+    if any(owner_id != current_user.id for owner_id in owners.values()):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="You can only add your own videos to playlists"
+        )
+
+    entries = _playlist_entries(db, playlist_id)
+    present = {video_id for video_id, _ in entries}.intersection(payload.video_ids)
+    if present:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Already in this playlist: {', '.join(sorted(present))}"
+        )
+
+    rows = _place(db, playlist_id, entries, payload.video_ids, payload.after_video_id, payload.before_video_id)
+    record_data_change(db, {current_user.id})
+    db.commit()
+    return rows
+
+
+@route.post("/{playlist_id}/videos/remove", status_code=status.HTTP_204_NO_CONTENT)
+def remove_videos_from_playlist(
+    playlist_id: str,
+    payload: PlaylistVideosRemove,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Remove many videos from a playlist with a single DELETE. Nothing is removed
+    if any of them is not in the playlist.
+    """
+    _owned_playlist(db, playlist_id, current_user)
+    _require_unique(payload.video_ids)
+
+    result = db.execute(
+        delete(PlaylistVideoMapping).where(
+            PlaylistVideoMapping.playlist_id == playlist_id,
+            PlaylistVideoMapping.video_id.in_(payload.video_ids)
+        )
+    )
+    if result.rowcount != len(payload.video_ids):
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Some videos are not in this playlist"
+        )
+
+    record_data_change(db, {current_user.id})
+    db.commit()
+    return None
+
+
+@route.post("/{playlist_id}/videos/move", response_model=List[PlaylistVideoMappingResponse])
+def move_videos_in_playlist(
+    playlist_id: str,
+    payload: PlaylistVideosPlacement,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Move videos of a playlist, as a block in the given order, after or before an
+    anchor video or to the end. Only the moved rows get new positions.
+    """
+    _owned_playlist(db, playlist_id, current_user)
+    _require_unique(payload.video_ids)
+
+    entries = _playlist_entries(db, playlist_id)
+    moving = set(payload.video_ids)
+    missing = moving - {video_id for video_id, _ in entries}
+    if missing:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Not in this playlist: {', '.join(sorted(missing))}"
+        )
+
+    db.execute(
+        delete(PlaylistVideoMapping).where(
+            PlaylistVideoMapping.playlist_id == playlist_id,
+            PlaylistVideoMapping.video_id.in_(payload.video_ids)
+        )
+    )
+    remaining = [entry for entry in entries if entry.video_id not in moving]
+    rows = _place(db, playlist_id, remaining, payload.video_ids, payload.after_video_id, payload.before_video_id)
+    record_data_change(db, {current_user.id})
+    db.commit()
+    return rows
+
+
+@route.put("/{playlist_id}/videos/order", response_model=List[PlaylistVideoMappingResponse])
+def reorder_playlist(
+    playlist_id: str,
+    payload: PlaylistOrder,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Replace the order of the whole playlist. `video_ids` must list every video of
+    the playlist exactly once; positions are reset to evenly gapped values.
+    """
+    _owned_playlist(db, playlist_id, current_user)
+    _require_unique(payload.video_ids)
+
+    current = {video_id for video_id, _ in _playlist_entries(db, playlist_id)}
+    if current != set(payload.video_ids):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="video_ids must list every video of the playlist exactly once"
+        )
+
+    rows = _renumber(db, playlist_id, payload.video_ids)
+    record_data_change(db, {current_user.id})
+    db.commit()
+    return rows
+
+
 @route.delete("/{playlist_id}", status_code=status.HTTP_204_NO_CONTENT)
 def delete_playlist(
     playlist_id: str,
@@ -0,0 +1,62 @@
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Query
+from fastapi.responses import ORJSONResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from db import get_async_db
+from models.users import User
+from schemas.videos import VideoResponse, PlaylistResponse
+from utils.auth import get_current_user_async
+from typing import List, Literal, Optional, Union
+from utils.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, encode_offset_cursor, decode_offset_cursor, set_next_page, parse_fields
+from utils.serialization import PLAYLIST_FIELDS, video_columns, video_dto, playlist_dto
+from utils.search import SEARCH_TARGETS, search_terms, title_search
+from utils.profiling import phase
+
+route = APIRouter(prefix="/search", tags=["Search"])
+
+
+@route.get("/", response_model=List[Union[VideoResponse, PlaylistResponse]])
+async def search(
+    request: Request,
+    q: str = Query(..., min_length=1, max_length=200, description="Words to find in titles, the last one may be partial"),
+    target: Literal["videos", "playlists"] = Query("videos", alias="type"),
+    cursor: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE),
+    fields: Optional[str] = Query(None, description="Comma separated fields to return, e.g. id,title"),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
+):
+    """
+    The user's videos (or playlists with `type=playlists`) whose title
+    contains every word of `q` as a word prefix, best match first. Uses the
+    full-text index of the database; the next page is advertised in the
+    `X-Next-Cursor` and `Link` headers like the listings.
+    """
+    terms = search_terms(q)
+    if not terms:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Search query has no words"
+        )
+    offset = decode_offset_cursor(cursor) if cursor else 0
+
+    model = SEARCH_TARGETS[target]
+    if target == "videos":
+        field_set = parse_fields(fields, VideoResponse)
+        columns = video_columns(field_set)
+    else:
+        field_set = parse_fields(fields, PlaylistResponse) or set(PLAYLIST_FIELDS)
+        columns = list(PLAYLIST_FIELDS.values())
+
+    query = title_search(db.bind.dialect.name, model, columns, current_user.id, terms)
+    # One extra row tells whether there is a next page
+    result = await db.execute(query.offset(offset).limit(limit + 1))
+    rows = result.all()
+
+    with phase("serialize"):
+        if target == "videos":
+            body = [video_dto(row, field_set) for row in rows[:limit]]
+        else:
+            body = [playlist_dto(row, fields=field_set) for row in rows[:limit]]
+        response = ORJSONResponse(body)
+    set_next_page(request, response, encode_offset_cursor(offset + limit) if len(rows) > limit else None)
+    return response
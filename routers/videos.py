@@ -1,15 +1,32 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Response
+from fastapi import APIRouter, Depends, HTTPException, status, Response, Request, Query
+from fastapi.responses import StreamingResponse, ORJSONResponse
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select
 from sqlalchemy.orm import Session
-from db import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from db import get_db, get_async_db
 from models.users import User
 from models.videos import Video, VideoStatus, PlaylistVideoMapping
-from schemas.videos import VideoResponse, TorrentRequest, VideoUpdate
-from utils.auth import get_current_user
-from typing import List
-from index import torrent_queue
+from schemas.videos import VideoResponse, TorrentRequest, VideoUpdate, JobPriorityUpdate
+from utils.auth import get_current_user, get_current_user_async, get_video_access_async
+from typing import List, Optional
+from utils.ingest import ingest
+from utils.jobs import FINAL_STAGES
+from utils.hls import content_type_for, safe_relative_path, signed_master, render_master, variant_height, variant_allowed, with_session_data
+from utils.prefetch import next_playlist_item, upcoming, schedule_prewarm, segment_requested
+from utils.file_serving import serve_file
+from utils.usage import usage_recorder
+from utils.shaping import user_rate
+from utils.listing_cache import listing_version, cached_listing, store_listing
+from utils.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, keyset_page, split_page, set_next_page, parse_fields
+from utils.serialization import video_columns, video_dto, play_url
+from utils.profiling import phase
 from config import setting
+import asyncio
+import json
 import os
 import shutil
+from urllib.parse import quote
 
 route = APIRouter(prefix="/videos", tags=["Videos"])
 
@@ -25,42 +42,166 @@ def add_torrent(
     if "guest" in current_user.username.lower():
         return Response({"body":"Sorry Can't Allow That You will fill my server"}, status_code=400)
 
-    task = {
-        'magnet_link': request.magnet_link,
-        'owner_id': current_user.id,
-        'torrent_name': request.torrent_name
-    }
-    
-    torrent_queue.put(task)
+    job_id = ingest.submit(current_user.id, request.magnet_link, request.torrent_name)
     
     return {
         'status': 'queued',
         'message': 'Torrent added to processing queue',
-        'queue_size': torrent_queue.qsize()
+        'job_id': job_id,
+        'queue_size': ingest.qsize()
     }
 
-@route.get("/", response_model=List[VideoResponse])
-def get_videos(
-    db: Session = Depends(get_db),
+@route.get("/jobs", response_model=List[dict])
+def get_jobs(current_user: User = Depends(get_current_user)):
+    """
+    Get the current state of the authenticated user's ingest jobs.
+    """
+    return ingest.list_for_owner(current_user.id)
+
+@route.get("/jobs/events")
+async def stream_jobs(
+    request: Request,
+    job_id: str = None,
     current_user: User = Depends(get_current_user)
 ):
-    videos = (
-        db.query(Video)
-        .filter(Video.owner_id == current_user.id)
-        .all()
+    """
+    Server-sent events stream of ingest job state changes for the authenticated user.
+    Sends the current state of every job on connect, then each change as it happens
+    (download percent, transcode fps/ETA and the final status).
+    """
+    owner_id = current_user.id
+    queue = ingest.subscribe(owner_id)
+
+    def format_event(job):
+        return f"id: {job['updated_at']}\nevent: job\ndata: {json.dumps(job)}\n\n"
+
+    async def events():
+        try:
+            for job in await run_in_threadpool(ingest.list_for_owner, owner_id):
+                if job_id is None or job['id'] == job_id:
+                    yield format_event(job)
+                    if job_id is not None and job['stage'] in FINAL_STAGES:
+                        return
+
+            while not await request.is_disconnected():
+                try:
+                    job = await asyncio.wait_for(queue.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    # Comment line keeps proxies from closing an idle stream
+                    yield ": keep-alive\n\n"
+                    continue
+
+                if job_id is not None and job['id'] != job_id:
+                    continue
+                yield format_event(job)
+
+                if job_id is not None and job['stage'] in FINAL_STAGES:
+                    break
+        finally:
+            ingest.unsubscribe(owner_id, queue)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+        }
     )
 
-    for video in videos:
-        video.storage_path = (
-            f"{setting.api_base_url}/videos/{video.id}/play"
+@route.get("/jobs/stats", response_model=dict)
+def get_jobs_stats(current_user: User = Depends(get_current_user)):
+    """
+    Scheduler policy, queue depth and mean/p95 time-to-playable of recent jobs.
+    """
+    return ingest.report()
+
+@route.get("/jobs/{job_id}", response_model=dict)
+def get_job(
+    job_id: str,
+    current_user: User = Depends(get_current_user)
+):
+    job = ingest.get(job_id)
+
+    if not job or job['owner_id'] != current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Job not found"
         )
 
-        if video.thumbnail_url:
-            video.thumbnail_url = (
-                f"{setting.api_base_url}/videos/{video.id}/thumbnail"
-            )
+    return job
+
+@route.post("/jobs/{job_id}/priority", response_model=dict)
+def set_job_priority(
+    job_id: str,
+    payload: JobPriorityUpdate,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Boost (or lower) a queued job. With the fair policy this only reorders the user's own jobs.
+    """
+    if "guest" in current_user.username.lower():
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Guests can't reprioritize jobs"
+        )
 
-    return videos
+    job = ingest.get(job_id)
+
+    if not job or job['owner_id'] != current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Job not found"
+        )
+
+    if not ingest.boost(job_id, payload.priority):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Job is no longer queued"
+        )
+
+    return {
+        'job_id': job_id,
+        'priority': payload.priority
+    }
+
+@route.get("/", response_model=List[VideoResponse])
+async def get_videos(
+    request: Request,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    status_filter: Optional[VideoStatus] = Query(None, alias="status"),
+    q: Optional[str] = Query(None, description="Case-insensitive title search"),
+    fields: Optional[str] = Query(None, description="Comma separated fields to return, e.g. id,title"),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
+):
+    """
+    The user's videos, newest first, one page at a time.
+    The next page is advertised in the `X-Next-Cursor` and `Link` headers.
+    Responses carry an ETag tied to the user's data version; repeat requests
+    are answered with 304 or from memory until the user's data changes.
+    """
+    field_set = parse_fields(fields, VideoResponse)
+    version = await listing_version(db, current_user.id)
+    cached = cached_listing(request, current_user.id, version)
+    if cached:
+        return cached
+
+    # Only the requested columns, straight into dicts: no ORM instances, no model validation
+    query = select(*video_columns(field_set)).where(Video.owner_id == current_user.id)
+    if status_filter:
+        query = query.where(Video.status == status_filter)
+    if q:
+        query = query.where(Video.title.icontains(q, autoescape=True))
+
+    result = await db.execute(keyset_page(query, Video.created_at, Video.id, cursor, limit))
+    rows, next_cursor = split_page(result.all(), limit)
+
+    with phase("serialize"):
+        response = ORJSONResponse([video_dto(row, field_set) for row in rows])
+    set_next_page(request, response, next_cursor)
+    return store_listing(request, current_user.id, version, response)
 
 @route.get("/{video_id}", response_model=VideoResponse)
 def get_video(
@@ -68,7 +209,7 @@ def get_video(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    video = db.query(Video).filter(Video.id == video_id).first()
+    video = db.execute(select(*video_columns()).where(Video.id == video_id)).first()
 
     if not video:
         raise HTTPException(
@@ -82,16 +223,8 @@ def get_video(
             detail="You don't have permission to access this video"
         )
 
-    video.storage_path = (
-        f"{setting.api_base_url}/videos/{video.id}/play"
-    )
-
-    if video.thumbnail_url:
-        video.thumbnail_url = (
-            f"{setting.api_base_url}/videos/{video.id}/thumbnail"
-        )
-
-    return video
+    with phase("serialize"):
+        return ORJSONResponse(video_dto(video))
 
 @route.patch("/{video_id}", response_model=VideoResponse)
 def update_video(
@@ -174,53 +307,142 @@ def delete_video(
 
 # FILE PROTECTION USER WISE FILES ACCESS
 @route.get("/{video_id}/play/{file_path:path}")
-def play_video(
+async def play_video(
+    request: Request,
     video_id: str,
     file_path: str = "",  # Default to empty for master.m3u8
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    playlist_id: Optional[str] = Query(None, description="Playlist being played: the master names its next item"),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async),
 ):
-    video = db.query(Video).filter(Video.id == video_id).first()
+    access = await get_video_access_async(db, video_id)
 
-    if not video:
+    if not access:
         raise HTTPException(status_code=404, detail="Video not found")
 
-    if video.owner_id != current_user.id:
+    owner_id, storage_path = access
+    if owner_id != current_user.id:
         raise HTTPException(status_code=403, detail="Forbidden")
 
+    over_quota = await usage_recorder.over_quota_async(db, current_user)
+    if over_quota:
+        raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail=over_quota)
+
     # Default to master.m3u8 if no path specified
     if not file_path:
         file_path = "master.m3u8"
-    
-    # Determine content type
-    if file_path.endswith('.m3u8'):
-        content_type = "application/vnd.apple.mpegurl"
-    elif file_path.endswith('.ts'):
-        content_type = "video/mp2t"
-    else:
-        content_type = "application/octet-stream"
-
-    return Response(
-        headers={
-            "X-Accel-Redirect": f"/_protected_hls/{video.storage_path}/{file_path}",
-            "Content-Type": content_type,
-        }
+
+    try:
+        file_path = safe_relative_path(file_path)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid file path")
+
+    content_type = content_type_for(file_path)
+    max_quality = current_user.max_quality
+
+    # Renditions the user's quality cap doesn't allow are off limits, not just hidden; same rule
+    # as the filtered master, which keeps the lowest rendition when all are above the cap
+    height = variant_height(file_path)
+    if max_quality is not None and height is not None and height > max_quality:
+        try:
+            allowed = await run_in_threadpool(variant_allowed, storage_path, height, max_quality)
+        except FileNotFoundError:
+            raise HTTPException(status_code=404, detail="Video not found")
+        if not allowed:
+            raise HTTPException(status_code=403, detail="Quality not allowed for this user")
+
+    following = None
+    if file_path == "master.m3u8" and playlist_id:
+        following = await next_playlist_item(db, playlist_id, video_id, current_user.id)
+        if following:
+            # Late segment requests of this video read the next one ahead
+            upcoming.set((current_user.id, video_id), (following.id, following.storage_path, max_quality))
+            if setting.hls_signed_urls:
+                # Segments go straight to nginx, the API never sees playback near the end
+                schedule_prewarm(following.storage_path, max_quality)
+
+    # Signed mode: authorize once here, variants and segments go straight to nginx.
+    # A capped user gets a master filtered to the variants they may play.
+    if file_path == "master.m3u8" and (setting.hls_signed_urls or max_quality is not None or following):
+        try:
+            # File reads on a manifest cache miss stay off the event loop
+            with phase("manifest"):
+                if setting.hls_signed_urls:
+                    master = await run_in_threadpool(signed_master, storage_path, max_quality)
+                else:
+                    master = await run_in_threadpool(render_master, storage_path, max_quality)
+        except FileNotFoundError:
+            raise HTTPException(status_code=404, detail="Video not found")
+        if following:
+            master = with_session_data(master, {
+                "com.streamer.next-video": following.id,
+                "com.streamer.next-master": f"{play_url(following.id)}/master.m3u8?playlist_id={quote(playlist_id)}",
+            })
+        return Response(
+            content=master,
+            media_type=content_type,
+            headers={"Cache-Control": "private, no-store"}
+        )
+
+    if content_type == "video/mp2t":
+        segment_requested(current_user.id, video_id, storage_path, file_path)
+
+    return serve_file(
+        request,
+        storage_path,
+        file_path,
+        content_type,
+        (current_user.id, video_id),
+        user_rate(current_user)
     )
 
+@route.post("/{video_id}/prefetch", response_model=dict)
+async def prefetch_next(
+    video_id: str,
+    playlist_id: str,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async),
+):
+    """
+    Hint that playback of the video in the playlist is nearing its end: the
+    next item's playlists and first segments are read into the page cache.
+    Players on signed URLs can call it explicitly, since their segment
+    requests never reach the API.
+    """
+    access = await get_video_access_async(db, video_id)
+
+    if not access:
+        raise HTTPException(status_code=404, detail="Video not found")
+    if access[0] != current_user.id:
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+    following = await next_playlist_item(db, playlist_id, video_id, current_user.id)
+    if not following:
+        return {'next_video_id': None, 'prefetched': False}
+
+    return {
+        'next_video_id': following.id,
+        'master_url': f"{play_url(following.id)}/master.m3u8?playlist_id={quote(playlist_id)}",
+        'prefetched': schedule_prewarm(following.storage_path, current_user.max_quality)
+    }
+
 @route.get("/{video_id}/thumbnail")
-def get_thumbnail(
+async def get_thumbnail(
+    request: Request,
     video_id: str,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async),
 ):
-    video = db.query(Video).filter(Video.id == video_id).first()
+    access = await get_video_access_async(db, video_id)
 
-    if not video or video.owner_id != current_user.id:
+    if not access or access[0] != current_user.id:
         raise HTTPException(status_code=403, detail="Forbidden")
 
-    return Response(
-        headers={
-            "X-Accel-Redirect": f"/_protected_hls/{video.storage_path}/thumbnail.jpg",
-            "Content-Type": "image/jpeg",
-        }
+    return serve_file(
+        request,
+        access[1],
+        "thumbnail.jpg",
+        "image/jpeg",
+        (current_user.id, video_id),
+        user_rate(current_user)
     )
@@ -8,6 +8,8 @@ class UserCreate(BaseModel):
     password: str
     daily_bandwidth_limit: Optional[int] = None
     monthly_bandwidth_limit: Optional[int] = None
+    max_quality: Optional[int] = None
+    rate_limit: Optional[int] = None
 
 
 class UserLogin(BaseModel):
@@ -22,6 +24,8 @@ class UserResponse(BaseModel):
     username: str
     daily_bandwidth_limit: Optional[int]
     monthly_bandwidth_limit: Optional[int]
+    max_quality: Optional[int] = None
+    rate_limit: Optional[int] = None
     created_at: datetime
 
     class Config:
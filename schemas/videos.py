@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional, List
 from datetime import datetime
 from models.videos import VideoStatus
@@ -9,6 +9,10 @@ class TorrentRequest(BaseModel):
     torrent_name: Optional[str] = None
 
 
+class JobPriorityUpdate(BaseModel):
+    priority: int
+
+
 class VideoCreate(BaseModel):
     title: str
     owner_id: str
@@ -72,6 +76,22 @@ class PlaylistVideoMappingCreate(BaseModel):
     position: Optional[int] = None
 
 
+class PlaylistVideosPlacement(BaseModel):
+    video_ids: List[str] = Field(min_length=1)
+    # Where to place the videos, at the end of the playlist when neither is given
+    after_video_id: Optional[str] = None
+    before_video_id: Optional[str] = None
+
+
+class PlaylistVideosRemove(BaseModel):
+    video_ids: List[str] = Field(min_length=1)
+
+
+class PlaylistOrder(BaseModel):
+    # Every video of the playlist, in the new order
+    video_ids: List[str]
+
+
 class PlaylistVideoMappingResponse(BaseModel):
     playlist_id: str
     video_id: str
@@ -0,0 +1,67 @@
+"""
+Shared fixtures. Every test session runs against a fresh SQLite database and
+storage folders in a temporary directory, whatever .env or the environment
+point at, so the suite never touches real data:
+
+    python -m pytest tests
+"""
+
+import os
+import tempfile
+
+_ROOT = tempfile.mkdtemp(prefix="streamer_tests_")
+os.environ["db_url"] = f"sqlite:///{os.path.join(_ROOT, 'test.db')}"
+os.environ["base_storage_path"] = os.path.join(_ROOT, "storage")
+os.environ["tmp_downloading_path"] = os.path.join(_ROOT, "downloads")
+for _name, _value in {
+    "secret_key": "test-secret",
+    "refresh_secret_key": "test-refresh-secret",
+    "algorithm": "HS256",
+    "timeout": "600",
+    "ACCESS_TOKEN_EXPIRE_MINUTES": "30",
+    "REFRESH_TOKEN_EXPIRE_MINUTES": "600",
+    "api_base_url": "http://testserver",
+}.items():
+    os.environ.setdefault(_name, _value)
+
+import uuid
+import pytest
+from fastapi.testclient import TestClient
+
+
+@pytest.fixture(scope="session")
+def app():
+    # Imported here so the settings above are in place first
+    import main
+    from utils.migrations import upgrade_database
+    upgrade_database()
+    return main.app
+
+
+@pytest.fixture(scope="session")
+def client(app):
+    # No lifespan: the tests don't need the ingest worker or the usage flusher
+    return TestClient(app)
+
+
+@pytest.fixture
+def db(app):
+    from db import SessionLocal
+    session = SessionLocal()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def make_user(db):
+    """Create a user with a unique name; returns (user, auth headers)."""
+    from models.users import User
+    from utils.auth import create_access_token
+
+    def make(**fields):
+        user = User(username=f"user_{uuid.uuid4().hex[:12]}", password_hash="x", **fields)
+        db.add(user)
+        db.commit()
+        return user, {"Authorization": f"Bearer {create_access_token(user.id)}"}
+
+    return make
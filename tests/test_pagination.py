@@ -0,0 +1,39 @@
+"""
+Walking the keyset pages of a list must return every row exactly once, in
+order, also when many rows share a created_at second (SQLite stores
+server_default now() without fractional seconds).
+"""
+
+import pytest
+from models.videos import Video, VideoStatus, Playlist
+
+TOTAL = 25
+
+
+def walk(client, path: str, headers: dict, limit: int) -> list:
+    ids, cursor = [], None
+    for _ in range(TOTAL + 1):
+        params = {"limit": limit, **({"cursor": cursor} if cursor else {})}
+        response = client.get(path, params=params, headers=headers)
+        assert response.status_code == 200, response.text
+        ids += [item["id"] for item in response.json()]
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            return ids
+    pytest.fail(f"GET {path} did not run out of pages")
+
+
+@pytest.mark.parametrize("limit", [1, 2, 7, TOTAL])
+@pytest.mark.parametrize("path, model", [("/videos/", Video), ("/playlists/", Playlist)])
+def test_pages_have_no_duplicates_or_gaps(client, db, make_user, path, model, limit):
+    user, headers = make_user()
+    for i in range(TOTAL):
+        if model is Video:
+            db.add(Video(title=f"Video {i}", owner_id=user.id, storage_path=f"v{i}", status=VideoStatus.PROCESSED))
+        else:
+            db.add(Playlist(title=f"Playlist {i}", owner_id=user.id))
+    db.commit()
+    expected = [row.id for row in db.query(model).filter(model.owner_id == user.id)
+                .order_by(model.created_at.desc(), model.id.desc())]
+
+    assert walk(client, path, headers, limit) == expected
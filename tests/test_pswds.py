@@ -0,0 +1,26 @@
+"""The password hasher survives its process pool breaking."""
+
+import asyncio
+from config import setting
+from utils.pswds import PasswordHasher
+
+
+def test_broken_process_pool_is_replaced(monkeypatch):
+    monkeypatch.setattr(setting, "password_hash_executor", "process")
+    monkeypatch.setattr(setting, "password_hash_workers", 1)
+    hasher = PasswordHasher()
+
+    async def scenario():
+        hashed = await hasher.hash("secret")
+        broken = hasher.executor
+        # A worker killed from outside (OOM killer) breaks the whole pool
+        for process in list(broken._processes.values()):
+            process.kill()
+            process.join()
+        assert await hasher.verify("secret", hashed)
+        assert hasher.executor is not broken
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        hasher.shutdown()
@@ -0,0 +1,66 @@
+"""
+A user's quality cap applies the same rule to the master playlist, variant
+requests and signed URLs: variants up to the cap, or the lowest one when every
+variant is above it.
+"""
+
+import os
+import uuid
+import pytest
+from config import setting
+from models.videos import Video, VideoStatus
+
+MASTER = "\n".join([
+    "#EXTM3U",
+    "#EXT-X-STREAM-INF:BANDWIDTH=800000,RESOLUTION=640x360",
+    "360p/index.m3u8",
+    "#EXT-X-STREAM-INF:BANDWIDTH=2500000,RESOLUTION=1280x720",
+    "720p/index.m3u8",
+])
+
+
+@pytest.fixture
+def video(db, make_user):
+    def make(max_quality):
+        user, headers = make_user(max_quality=max_quality)
+        video = Video(title="capped", owner_id=user.id, status=VideoStatus.PROCESSED,
+                      storage_path=f"users/{user.id}/videos/{uuid.uuid4().hex}")
+        db.add(video)
+        db.commit()
+        folder = os.path.join(setting.base_storage_path, video.storage_path)
+        for variant in ("360p", "720p"):
+            os.makedirs(os.path.join(folder, variant))
+            with open(os.path.join(folder, variant, "index.m3u8"), "w") as f:
+                f.write("#EXTM3U\n")
+        with open(os.path.join(folder, "master.m3u8"), "w") as f:
+            f.write(MASTER)
+        return video, headers
+
+    return make
+
+
+@pytest.mark.parametrize("max_quality, listed, forbidden", [
+    (720, ["360p", "720p"], []),
+    (480, ["360p"], ["720p"]),
+    # Every variant above the cap: the lowest one stays playable
+    (240, ["360p"], ["720p"]),
+])
+def test_variants_follow_the_master(client, video, max_quality, listed, forbidden):
+    video, headers = video(max_quality)
+    master = client.get(f"/videos/{video.id}/play/master.m3u8", headers=headers)
+    assert master.status_code == 200
+    assert [line.split("/")[0] for line in master.text.splitlines() if line.endswith(".m3u8")] == listed
+
+    for variant in listed:
+        assert client.get(f"/videos/{video.id}/play/{variant}/index.m3u8", headers=headers).status_code == 200
+    for variant in forbidden:
+        assert client.get(f"/videos/{video.id}/play/{variant}/index.m3u8", headers=headers).status_code == 403
+
+
+def test_signed_master_signs_only_allowed_variants(client, video, monkeypatch):
+    monkeypatch.setattr(setting, "hls_signed_urls", True)
+    video, headers = video(240)
+    master = client.get(f"/videos/{video.id}/play/master.m3u8", headers=headers)
+    assert master.status_code == 200
+    uris = [line for line in master.text.splitlines() if line.endswith(".m3u8")]
+    assert len(uris) == 1 and f"{video.storage_path}/360p/" in uris[0]
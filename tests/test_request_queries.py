@@ -0,0 +1,81 @@
+"""
+Database queries per request must not grow with the data (no N+1) and must
+stay within budget. Counts come from the http_request_db_queries metric the
+request middleware records.
+"""
+
+import uuid
+import pytest
+from models.videos import Video, VideoStatus, Playlist, PlaylistVideoMapping, POSITION_GAP
+
+# (playlists, videos per playlist)
+SIZES = [(1, 1), (5, 10), (20, 40)]
+
+# (route template, query budget). The first request of a user also looks the user up,
+# later ones find it in the auth cache
+BUDGETS = {
+    "/playlists/": 4,
+    "/playlists/{playlist_id}": 3,
+    "/videos/": 3,
+}
+
+
+def seed(db, user, playlists: int, videos_per_playlist: int) -> str:
+    first_playlist = None
+    for p in range(playlists):
+        playlist = Playlist(title=f"Playlist {p}", owner_id=user.id)
+        db.add(playlist)
+        db.flush()
+        first_playlist = first_playlist or playlist.id
+        for v in range(videos_per_playlist):
+            video = Video(
+                title=f"Video {p}.{v}",
+                owner_id=user.id,
+                storage_path=f"users/{user.id}/videos/{p}-{v}",
+                status=VideoStatus.PROCESSED,
+            )
+            db.add(video)
+            db.flush()
+            db.add(PlaylistVideoMapping(playlist_id=playlist.id, video_id=video.id, position=(v + 1) * POSITION_GAP))
+    db.commit()
+    return first_playlist
+
+
+def queries_of(client, route: str, path: str, headers: dict) -> int:
+    from utils.metrics import request_db_queries
+
+    series = request_db_queries.series.get(("GET", route))
+    before = series[1] if series else 0
+    response = client.get(path, headers=headers)
+    assert response.status_code == 200, response.text
+    return int(request_db_queries.series[("GET", route)][1] - before)
+
+
+@pytest.fixture(scope="module")
+def counts(client):
+    """Queries per route at every size, each size a fresh user so caches start cold."""
+    from db import SessionLocal
+    from models.users import User
+    from utils.auth import create_access_token
+
+    counts = {route: [] for route in BUDGETS}
+    with SessionLocal() as db:
+        for playlists, videos_per_playlist in SIZES:
+            user = User(username=f"queries_{uuid.uuid4().hex[:8]}", password_hash="x")
+            db.add(user)
+            db.commit()
+            playlist_id = seed(db, user, playlists, videos_per_playlist)
+            headers = {"Authorization": f"Bearer {create_access_token(user.id)}"}
+            for route in BUDGETS:
+                counts[route].append(queries_of(client, route, route.format(playlist_id=playlist_id), headers))
+    return counts
+
+
+@pytest.mark.parametrize("route", list(BUDGETS))
+def test_query_count_independent_of_data_size(counts, route):
+    assert len(set(counts[route])) == 1, f"GET {route} queries per size {dict(zip(SIZES, counts[route]))}"
+
+
+@pytest.mark.parametrize("route", list(BUDGETS))
+def test_query_count_within_budget(counts, route):
+    assert max(counts[route]) <= BUDGETS[route]
@@ -0,0 +1,207 @@
+import os
+import time
+import shutil
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+from sqlalchemy import select, func
+from db import SessionLocal
+from models.jobs import ApiLatencyReport
+from config import setting
+
+logger = logging.getLogger(__name__)
+
+# Audio rendition bitrate used by DownloadedVideoProcessor.generate_hls
+AUDIO_BITRATE = 128_000
+
+
+class AdmissionDeferred(Exception):
+    """Raised when a job doesn't fit right now and should be retried later."""
+
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class LatencyWindow:
+    """Sliding window of recent API request latencies (milliseconds)."""
+
+    def __init__(self, window_seconds: float = 60, max_samples: int = 5000):
+        self.window_seconds = window_seconds
+        self.samples = deque(maxlen=max_samples)
+        self.lock = threading.Lock()
+
+    def record(self, latency_ms: float):
+        with self.lock:
+            self.samples.append((time.monotonic(), latency_ms))
+
+    def percentile(self, pct: float) -> float:
+        cutoff = time.monotonic() - self.window_seconds
+        with self.lock:
+            values = sorted(ms for ts, ms in self.samples if ts >= cutoff)
+        if not values:
+            return 0.0
+        index = min(len(values) - 1, int(len(values) * pct / 100))
+        return values[index]
+
+
+class AdmissionController:
+    """
+    Gatekeeper for the ingest pipeline.
+
+    Downloads are admitted only if the torrent fits on the download disk and
+    encodes only if the estimated renditions fit on the storage disk, keeping
+    `min_free_disk_bytes` free for streaming. Encodes are additionally held back
+    while the load average or the API p99 latency is over budget.
+    """
+
+    def __init__(self, download_path: str, storage_path: str):
+        self.download_path = download_path
+        self.storage_path = storage_path
+        self.latency = LatencyWindow()
+        # (monotonic time read, value) of the p99 reported by API processes
+        self.shared_p99 = (0.0, 0.0)
+        self.reserved = {}
+        self.active_encodes = 0
+        self.condition = threading.Condition()
+
+    # Space estimation
+
+    @staticmethod
+    def estimate_encode_bytes(duration: float, bitrates: list) -> int:
+        """Estimated size of the HLS renditions: ladder bitrates times duration."""
+        total_bps = sum(bitrate + AUDIO_BITRATE for bitrate in bitrates)
+        return int(total_bps * duration / 8 * setting.hls_output_overhead)
+
+    @staticmethod
+    def _free_bytes(path: str) -> int:
+        # The target folder may not exist yet, check the closest existing parent
+        path = os.path.abspath(path)
+        while not os.path.exists(path):
+            path = os.path.dirname(path)
+        return shutil.disk_usage(path).free
+
+    @staticmethod
+    def _device(path: str) -> int:
+        path = os.path.abspath(path)
+        while not os.path.exists(path):
+            path = os.path.dirname(path)
+        return os.stat(path).st_dev
+
+    def _fits(self, path: str, required: int) -> bool:
+        device = self._device(path)
+        reserved = sum(size for (dev, _), size in self.reserved.items() if dev == device)
+        available = self._free_bytes(path) - reserved - setting.min_free_disk_bytes
+        return required <= available
+
+    def encode_can_fit(self, required_bytes: int) -> bool:
+        """False if the renditions can't fit even on an empty storage disk, so waiting is pointless."""
+        path = os.path.abspath(self.storage_path)
+        while not os.path.exists(path):
+            path = os.path.dirname(path)
+        return required_bytes <= shutil.disk_usage(path).total - setting.min_free_disk_bytes
+
+    def _reserve(self, path: str, required: int) -> tuple:
+        key = (self._device(path), object())
+        self.reserved[key] = required
+        return key
+
+    def release(self, key: tuple):
+        """Give back a reservation made by reserve_download."""
+        with self.condition:
+            self.reserved.pop(key, None)
+            self.condition.notify_all()
+
+    # Admission
+
+    def reserve_download(self, total_size: int) -> tuple:
+        """
+        Reserve space for a torrent download, or raise AdmissionDeferred
+        so the worker can requeue the job and move on.
+        """
+        with self.condition:
+            if not self._fits(self.download_path, total_size):
+                raise AdmissionDeferred(
+                    f"Not enough free disk space to download {total_size / (1024**3):.2f} GB",
+                    setting.admission_retry_seconds
+                )
+            return self._reserve(self.download_path, total_size)
+
+    def api_p99(self) -> float:
+        """
+        p99 API latency of the last minute. A worker process serves no requests, so
+        it takes the worst p99 reported by the API processes (ApiLatencyReport).
+        """
+        if setting.process_role != "worker":
+            return self.latency.percentile(99)
+        read_at, p99 = self.shared_p99
+        now = time.monotonic()
+        if now - read_at >= setting.latency_report_seconds:
+            fresh_since = time.time() - 3 * setting.latency_report_seconds
+            with SessionLocal() as db:
+                p99 = db.scalar(
+                    select(func.max(ApiLatencyReport.p99_ms)).where(ApiLatencyReport.updated_at >= fresh_since)
+                ) or 0.0
+            self.shared_p99 = (now, p99)
+        return p99
+
+    def _overloaded(self) -> str:
+        load_per_cpu = os.getloadavg()[0] / (os.cpu_count() or 1)
+        if load_per_cpu > setting.max_load_per_cpu:
+            return f"load average {load_per_cpu:.2f} per CPU"
+        p99 = self.api_p99()
+        if p99 > setting.api_p99_budget_ms:
+            return f"API p99 latency {p99:.0f} ms"
+        return ""
+
+    @contextmanager
+    def encode_slot(self, required_bytes: int, max_wait: float = None):
+        """
+        Block until the renditions fit on disk and the host has capacity for
+        another encode. The load and API p99 checks hold back the first encode
+        too, but only for admission_overload_max_wait_seconds: after that a lone
+        encode starts anyway, so a busy host slows ingest down rather than
+        stopping it. Raises AdmissionDeferred after `max_wait` seconds
+        (admission_max_wait_seconds by default).
+        """
+        started = time.monotonic()
+        deadline = started + (setting.admission_max_wait_seconds if max_wait is None else max_wait)
+        last_reason = None
+
+        with self.condition:
+            while True:
+                overloaded = self._overloaded()
+                if overloaded and not self.active_encodes and \
+                        time.monotonic() - started >= setting.admission_overload_max_wait_seconds:
+                    overloaded = ""
+                if not self._fits(self.storage_path, required_bytes):
+                    reason = f"waiting for {required_bytes / (1024**3):.2f} GB of free disk space"
+                elif self.active_encodes >= setting.max_concurrent_encodes:
+                    reason = "waiting for a free encode slot"
+                elif overloaded:
+                    reason = f"throttled by {overloaded}"
+                else:
+                    break
+
+                if reason != last_reason:
+                    logger.info(f"Encode {reason}")
+                    last_reason = reason
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise AdmissionDeferred(f"Encode not admitted: {reason}", setting.admission_retry_seconds)
+                self.condition.wait(timeout=min(remaining, 5))
+
+            self.active_encodes += 1
+            key = self._reserve(self.storage_path, required_bytes)
+
+        try:
+            yield
+        finally:
+            with self.condition:
+                self.active_encodes -= 1
+            self.release(key)
+
+
+admission = AdmissionController(setting.tmp_downloading_path, setting.base_storage_path)
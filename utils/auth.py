@@ -1,14 +1,25 @@
 #utils/auth.py
 from models.users import User
+from models.videos import Video, VideoStatus
 from schemas.users import UserResponse
 from fastapi import HTTPException, Request, Depends, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from sqlalchemy import event, select
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from config import setting
-from db import get_db
+from db import get_db, get_async_db
 from datetime import datetime, timedelta
 from typing import Union, Any, Optional
 from jose import jwt, JWTError
+from utils.cache import TTLCache
+from utils.profiling import phase
+import time
+
+# Verified token payloads, user rows and video ownership, shared by all requests
+token_cache = TTLCache(setting.auth_cache_max_entries, setting.auth_cache_ttl_seconds)
+user_cache = TTLCache(setting.auth_cache_max_entries, setting.auth_cache_ttl_seconds)
+video_access_cache = TTLCache(setting.auth_cache_max_entries, setting.auth_cache_ttl_seconds)
 
 def create_access_token(subject: Union[str, Any], expires_delta: int = None) -> str:
     if expires_delta is not None:
@@ -32,9 +43,9 @@ def create_refresh_token(subject: Union[str, Any], expires_delta: int = None) ->
 
 def decodeJWT(jwtoken: str):
     try:
-        payload = jwt.decode(jwtoken,setting.secret_key, setting.algorithm)
+        payload = jwt.decode(jwtoken, setting.secret_key, algorithms=[setting.algorithm])
         return payload
-    except:
+    except JWTError:
         return None
 
 
@@ -48,48 +59,130 @@ class JWTBearer(HTTPBearer):
             if not credentials.scheme == "Bearer":
                 raise HTTPException(status_code=403, detail="Invalid authentication scheme.")
             token = credentials.credentials
-            if not self.verify_jwt(token):
-                raise HTTPException(status_code=403, detail="Invalid token or expired token.")
+            with phase("jwt"):
+                payload = self.verify_jwt(token)
+            if not payload:
+                # Same response clients got before for expired tokens, so their refresh flow still triggers
+                raise HTTPException(
+                    status_code=status.HTTP_401_UNAUTHORIZED,
+                    detail="Invalid token or expired token.",
+                    headers={"WWW-Authenticate": "Bearer"},
+                )
+            # Decoded once here, get_current_user picks it up from the request
+            request.state.token_payload = payload
             return token
         else:
             raise HTTPException(status_code=403, detail="Invalid authorization code.")
 
-    def verify_jwt(self, jwtoken: str) -> bool:
-        try:
-            payload = decodeJWT(jwtoken)
-            return True
-        except jwt.ExpiredSignatureError:
-            return False
-        except jwt.JWTError:
-            return False
+    def verify_jwt(self, jwtoken: str) -> Optional[dict]:
+        """Return the token payload, decoding and verifying it only on a cache miss."""
+        payload = token_cache.get(jwtoken)
+        if payload is not None and payload.get("exp", 0) > time.time():
+            return payload
+
+        payload = decodeJWT(jwtoken)
+        if payload is None:
+            return None
+
+        # Never cache a token past its own expiry
+        token_cache.set(jwtoken, payload, ttl=payload.get("exp", 0) - time.time())
+        return payload
 
 jwt_bearer = JWTBearer()
 
-def get_current_user(
-    token: str = Depends(jwt_bearer),
-    db: Session = Depends(get_db)
-) -> User:
-    try:
-        payload = jwt.decode(token, setting.secret_key, algorithms=[setting.algorithm])
-        user_id: str = payload.get("sub")
-        if user_id is None:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Could not validate credentials",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
-    except JWTError:
+def _token_user_id(request: Request, token: str) -> str:
+    payload = getattr(request.state, "token_payload", None) or jwt_bearer.verify_jwt(token)
+    user_id: str = payload.get("sub") if payload else None
+    if user_id is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Could not validate credentials",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    
-    user = db.query(User).filter(User.id == user_id).first()
+    return user_id
+
+def _cache_user(db, user_id: str, user: Optional[User]) -> User:
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found"
         )
     
-    return user
\ No newline at end of file
+    # Detach so the cached row is shared read-only and isn't expired by other sessions' commits
+    db.expunge(user)
+    user_cache.set(user_id, user)
+    return user
+
+def get_current_user(
+    request: Request,
+    token: str = Depends(jwt_bearer),
+    db: Session = Depends(get_db)
+) -> User:
+    with phase("auth"):
+        user_id = _token_user_id(request, token)
+        user = user_cache.get(user_id)
+        if user is not None:
+            return user
+
+        user = db.query(User).filter(User.id == user_id).first()
+        return _cache_user(db, user_id, user)
+
+async def get_current_user_async(
+    request: Request,
+    token: str = Depends(jwt_bearer),
+    db: AsyncSession = Depends(get_async_db)
+) -> User:
+    """Same as get_current_user for async routes, so auth never needs a threadpool slot."""
+    with phase("auth"):
+        user_id = _token_user_id(request, token)
+        user = user_cache.get(user_id)
+        if user is not None:
+            return user
+
+        result = await db.execute(select(User).where(User.id == user_id))
+        return _cache_user(db, user_id, result.scalar_one_or_none())
+
+
+def _video_access_query(video_id: str):
+    return select(Video.owner_id, Video.storage_path, Video.status).where(Video.id == video_id)
+
+def _cache_video_access(video_id: str, row) -> Optional[tuple]:
+    if row is None:
+        return None
+
+    access = (row.owner_id, row.storage_path)
+    if row.status == VideoStatus.PROCESSED:
+        video_access_cache.set(video_id, access)
+    return access
+
+def get_video_access(db: Session, video_id: str) -> Optional[tuple]:
+    """
+    Return (owner_id, storage_path) for a video, cached for processed videos
+    since those are what the segment routes ask for over and over.
+    """
+    access = video_access_cache.get(video_id)
+    if access is not None:
+        return access
+
+    row = db.execute(_video_access_query(video_id)).first()
+    return _cache_video_access(video_id, row)
+
+async def get_video_access_async(db: AsyncSession, video_id: str) -> Optional[tuple]:
+    access = video_access_cache.get(video_id)
+    if access is not None:
+        return access
+
+    row = (await db.execute(_video_access_query(video_id))).first()
+    return _cache_video_access(video_id, row)
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_user(mapper, connection, target):
+    user_cache.pop(target.id)
+
+
+@event.listens_for(Video, "after_update")
+@event.listens_for(Video, "after_delete")
+def _invalidate_video_access(mapper, connection, target):
+    video_access_cache.pop(target.id)
@@ -1,14 +1,17 @@
 import os
 import time
+import logging
 import libtorrent as lt
 
+logger = logging.getLogger(__name__)
+
 class TorrentVideosDownloader:
     def __init__(self, base_download_path: str):
         self.base_download_path = base_download_path
         self.session = lt.session()
         self.session.listen_on(6881, 6891)
 
-    def download(self, magnet_link: str, folder_path: str) -> str:
+    def download(self, magnet_link: str, folder_path: str, progress_callback=None) -> str:
         download_path = os.path.join(self.base_download_path, folder_path)
 
         if os.path.exists(download_path):
@@ -26,26 +29,37 @@ class TorrentVideosDownloader:
 
         while not handle.is_seed():
             status = handle.status()
-            print(
+            logger.debug(
                 f"{status.progress * 100:.2f}% | "
                 f"↓ {status.download_rate / 1024:.1f} KB/s | "
                 f"Peers: {status.num_peers}"
             )
+            if progress_callback:
+                progress_callback({
+                    "percent": round(status.progress * 100, 2),
+                    "download_rate": status.download_rate,
+                    "peers": status.num_peers,
+                })
             time.sleep(1)
 
         handle.pause()
         return download_path
 
-    def get_info(self, magnet_link: str) -> dict:
+    def get_info(self, magnet_link: str, timeout: float = None) -> dict:
         """
         Fetch torrent metadata only (no download).
+        Raises TimeoutError if the metadata doesn't arrive within `timeout` seconds.
         """
         params = lt.parse_magnet_uri(magnet_link)
         params.save_path = self.base_download_path
 
         handle = self.session.add_torrent(params)
 
+        started = time.monotonic()
         while not handle.has_metadata():
+            if timeout is not None and time.monotonic() - started > timeout:
+                self.session.remove_torrent(handle)
+                raise TimeoutError("Timed out fetching torrent metadata")
             time.sleep(1)
 
         info = handle.get_torrent_info()
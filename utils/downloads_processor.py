@@ -1,5 +1,15 @@
 import os
+import time
+import threading
+from collections import deque
 import ffmpeg
+from utils.metrics import encode_realtime_factor, encodes_total
+
+VIDEO_EXTENSIONS = {
+    ".mp4", ".mkv", ".avi", ".mov", ".wmv", ".flv",
+    ".webm", ".mpeg", ".mpg", ".m4v", ".3gp",
+    ".3g2", ".ts", ".vob", ".ogv"
+}
 
 class DownloadedVideoProcessor:
     def __init__(self, base_storage_path, tmp_downloaded_path):
@@ -12,12 +22,6 @@ class DownloadedVideoProcessor:
         }
 
     def find_all_videos(self, folder_path):
-        VIDEO_EXTENSIONS = {
-            ".mp4", ".mkv", ".avi", ".mov", ".wmv", ".flv",
-            ".webm", ".mpeg", ".mpg", ".m4v", ".3gp",
-            ".3g2", ".ts", ".vob", ".ogv"
-        }
-
         base_path = os.path.join(self.tmp_downloaded_path, folder_path)
 
         if not os.path.isdir(base_path):
@@ -64,10 +68,10 @@ class DownloadedVideoProcessor:
                 variants.append(name)
         return variants
 
-    def generate_hls(self, input_path, output_dir, variants):
+    def generate_hls(self, input_path, output_dir, variants, duration=None, progress_callback=None):
         os.makedirs(output_dir, exist_ok=True)
 
-        for variant in variants:
+        for index, variant in enumerate(variants):
             w, h, bitrate = self.presets[variant]
 
             variant_dir = os.path.join(output_dir, variant)
@@ -103,7 +107,76 @@ class DownloadedVideoProcessor:
             )
 
             stream = ffmpeg.overwrite_output(stream)
-            ffmpeg.run(stream, quiet=True)
+
+            def report(progress, variant=variant, index=index):
+                if progress_callback:
+                    progress_callback({
+                        "variant": variant,
+                        "variant_index": index + 1,
+                        "variant_count": len(variants),
+                        **progress,
+                    })
+
+            started = time.monotonic()
+            try:
+                self._run_with_progress(stream, duration, report)
+            except Exception:
+                encodes_total.inc((variant, "failed"))
+                raise
+            encodes_total.inc((variant, "ok"))
+            elapsed = time.monotonic() - started
+            if duration and elapsed > 0:
+                encode_realtime_factor.observe((variant,), duration / elapsed)
+
+    def _run_with_progress(self, stream, duration, progress_callback):
+        """
+        Run ffmpeg with `-progress` on stdout and report fps, speed and ETA
+        each time ffmpeg flushes a progress block. stderr is drained on a
+        thread so a noisy decode can't fill its pipe and stall ffmpeg.
+        """
+        stream = stream.global_args("-progress", "pipe:1", "-nostats", "-loglevel", "error")
+        process = ffmpeg.run_async(stream, pipe_stdout=True, pipe_stderr=True)
+        # Last lines of stderr, for the error raised on failure
+        stderr_tail = deque(maxlen=200)
+        drain = threading.Thread(target=lambda: stderr_tail.extend(process.stderr), daemon=True, name="ffmpeg-stderr")
+        drain.start()
+
+        try:
+            started = time.monotonic()
+            block = {}
+            for raw_line in process.stdout:
+                line = raw_line.decode(errors="ignore").strip()
+                if "=" not in line:
+                    continue
+                key, value = line.split("=", 1)
+                block[key] = value
+                if key != "progress":
+                    continue
+
+                # ffmpeg reports N/A until the first frame is out, and for some inputs
+                out_time = (_number(block.get("out_time_us")) or _number(block.get("out_time_ms"))) / 1_000_000
+                elapsed = time.monotonic() - started
+                progress = {
+                    "fps": _number(block.get("fps")),
+                    "speed": round(out_time / elapsed, 2) if elapsed > 0 else 0,
+                    "out_time": round(out_time, 1),
+                }
+                if duration:
+                    progress["percent"] = round(min(out_time / duration, 1) * 100, 2)
+                    if out_time > 0:
+                        progress["eta_seconds"] = round((duration - out_time) * elapsed / out_time, 1)
+                progress_callback(progress)
+                block = {}
+
+            process.wait()
+        finally:
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+            drain.join(timeout=5)
+
+        if process.returncode != 0:
+            raise ffmpeg.Error("ffmpeg", None, b"".join(stderr_tail))
 
 
     def generate_adaptive_master_streamer(self, output_dir, variants):
@@ -135,11 +208,13 @@ class DownloadedVideoProcessor:
             .run(quiet=True)
         )
 
-    def process_video(self, input_path, output_dir):
-        meta = self.probe_video(input_path)
+    def process_video(self, input_path, output_dir, progress_callback=None, meta=None):
+        """Encode the HLS ladder, master playlist and thumbnail. `meta` skips probing when the caller already did."""
+        if meta is None:
+            meta = self.probe_video(input_path)
         variants = self.select_variants(meta["width"], meta["height"])
 
-        self.generate_hls(input_path, output_dir, variants)
+        self.generate_hls(input_path, output_dir, variants, meta["duration"], progress_callback)
         self.generate_adaptive_master_streamer(output_dir, variants)
         self.generate_thumbnail(input_path, output_dir, meta["duration"])
 
@@ -149,4 +224,12 @@ class DownloadedVideoProcessor:
             "width": meta["width"],
             "height": meta["height"],
             "size_bytes": meta["size_bytes"],
-        }
\ No newline at end of file
+        }
+
+
+def _number(value) -> float:
+    """Numeric value of an ffmpeg progress field, 0 for missing or N/A."""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
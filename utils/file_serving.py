@@ -0,0 +1,147 @@
+import os
+from email.utils import formatdate, parsedate_to_datetime
+from fastapi import HTTPException, Request, Response
+from fastapi.responses import FileResponse, StreamingResponse
+from starlette.background import BackgroundTask
+from config import setting
+from utils.usage import usage_recorder
+from utils.shaping import bucket_for, shaped_file_chunks
+
+
+def _etag(stat: os.stat_result) -> str:
+    return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+
+def _not_modified(request: Request, etag: str, stat: os.stat_result) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return etag in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")] or if_none_match.strip() == "*"
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return int(stat.st_mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def _parse_range(request: Request, size: int):
+    """
+    (start, end) of a single `bytes=` range, None to send the whole file.
+    Raises HTTPException 416 for a range outside the file.
+    """
+    range_header = request.headers.get("range", "")
+    if not range_header.startswith("bytes=") or "," in range_header:
+        return None
+    start, _, end = range_header[6:].strip().partition("-")
+    try:
+        if not start:
+            start, end = max(size - int(end), 0), size - 1
+        else:
+            start = int(start)
+            end = min(int(end), size - 1) if end else size - 1
+    except ValueError:
+        return None
+    if start > end or start >= size:
+        raise HTTPException(
+            status_code=416,
+            detail="Range not satisfiable",
+            headers={"Content-Range": f"bytes */{size}"}
+        )
+    return start, end
+
+
+def _bytes_to_send(request: Request, size: int) -> int:
+    """Body size of the response, used for bandwidth accounting."""
+    byte_range = _parse_range(request, size)
+    return size if byte_range is None else byte_range[1] - byte_range[0] + 1
+
+
+def _shaped_file_response(request: Request, path: str, stat: os.stat_result, content_type: str,
+                          headers: dict, rate: int, user_id: str, background) -> Response:
+    """Stream a file through the user's token bucket (no sendfile, the pacing needs every chunk)."""
+    byte_range = _parse_range(request, stat.st_size)
+    if byte_range is None:
+        start, length, status_code = 0, stat.st_size, 200
+    else:
+        start, length, status_code = byte_range[0], byte_range[1] - byte_range[0] + 1, 206
+        headers["Content-Range"] = f"bytes {byte_range[0]}-{byte_range[1]}/{stat.st_size}"
+    headers["Content-Length"] = str(length)
+
+    if request.method == "HEAD":
+        return Response(status_code=status_code, headers=headers, media_type=content_type)
+
+    return StreamingResponse(
+        shaped_file_chunks(path, start, length, bucket_for(user_id, rate)),
+        status_code=status_code,
+        headers=headers,
+        media_type=content_type,
+        background=background,
+    )
+
+
+def native_file_response(request: Request, path: str, content_type: str, usage_key: tuple = None,
+                         rate: int = None) -> Response:
+    """
+    Serve a file from this process.
+
+    FileResponse handles Range requests; conditional requests are answered
+    here with a 304 before the file is opened. The body is only sent with
+    sendfile by servers implementing the ASGI pathsend extension: uvicorn
+    (requirements.txt) doesn't, so it is read and written in chunks by Python.
+    Use file_serving_mode "accel" where zero-copy matters. With a `rate`
+    (bytes/s) the body is paced by the user's token bucket instead.
+    """
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="File not found")
+
+    etag = _etag(stat)
+    headers = {
+        "ETag": etag,
+        "Last-Modified": formatdate(stat.st_mtime, usegmt=True),
+        "Cache-Control": f"private, max-age={setting.native_cache_max_age}",
+        "Accept-Ranges": "bytes",
+    }
+
+    if _not_modified(request, etag, stat):
+        return Response(status_code=304, headers=headers)
+
+    background = None
+    if usage_key and request.method != "HEAD":
+        background = BackgroundTask(usage_recorder.record, *usage_key, _bytes_to_send(request, stat.st_size))
+
+    if rate and usage_key:
+        return _shaped_file_response(request, path, stat, content_type, headers, rate, usage_key[0], background)
+
+    return FileResponse(
+        path,
+        media_type=content_type,
+        headers=headers,
+        stat_result=stat,
+        method=request.method,
+        background=background,
+    )
+
+
+def serve_file(request: Request, storage_path: str, file_path: str, content_type: str,
+               usage_key: tuple = None, rate: int = None) -> Response:
+    """
+    Hand a file under base_storage_path to nginx, or serve it natively, depending on file_serving_mode.
+    Natively served bytes are recorded against `usage_key` (user_id, video_id); with nginx
+    the usage log tailer does that. `rate` (bytes/s) shapes the transfer in both modes.
+    """
+    if setting.file_serving_mode == "native":
+        path = os.path.join(setting.base_storage_path, storage_path, file_path)
+        return native_file_response(request, path, content_type, usage_key, rate)
+
+    headers = {
+        "X-Accel-Redirect": f"/_protected_hls/{storage_path}/{file_path}",
+        "Content-Type": content_type,
+    }
+    if rate:
+        # nginx applies this per connection
+        headers["X-Accel-Limit-Rate"] = str(rate)
+    return Response(headers=headers)
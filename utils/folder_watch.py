@@ -0,0 +1,171 @@
+import os
+import time
+import errno
+import select
+import struct
+import ctypes
+import ctypes.util
+import logging
+
+logger = logging.getLogger(__name__)
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+EVENT_HEADER = struct.Struct("iIII")
+
+
+class InotifyWatcher:
+    """
+    Recursive inotify watch over `roots` through libc (ctypes), reporting the
+    paths of files that were created, written or moved in. Directories
+    created later are watched as they appear.
+    """
+
+    def __init__(self, roots: list):
+        libc_name = ctypes.util.find_library("c")
+        if libc_name is None:
+            raise OSError("libc not found")
+        self.libc = ctypes.CDLL(libc_name, use_errno=True)
+        self.fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.roots = roots
+        self.dirs = {}
+        self.overflowed = False
+        for root in roots:
+            self._watch_tree(root)
+
+    def _watch_tree(self, root: str):
+        for folder, dirs, _ in os.walk(root):
+            dirs[:] = [d for d in dirs if not d.startswith(".")]
+            wd = self.libc.inotify_add_watch(self.fd, os.fsencode(folder), WATCH_MASK)
+            if wd < 0:
+                error = ctypes.get_errno()
+                if error == errno.ENOSPC:
+                    raise OSError(error, "inotify watch limit reached (fs.inotify.max_user_watches)")
+                # Removed between walk and watch
+                continue
+            self.dirs[wd] = folder
+
+    def poll(self, timeout: float) -> set:
+        """Paths changed within `timeout` seconds. Sets `overflowed` when events were lost."""
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return set()
+        changed = set()
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return changed
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b"\0")
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                self.overflowed = True
+                continue
+            folder = self.dirs.get(wd)
+            if folder is None or not name or name.startswith(b"."):
+                continue
+            path = os.path.join(folder, os.fsdecode(name))
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    # Files already inside a moved-in or quickly filled folder produce no events of their own
+                    self._watch_tree(path)
+                    changed.update(_walk_files(path))
+            else:
+                changed.add(path)
+        return changed
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollingWatcher:
+    """Fallback for systems without inotify: rescans `roots` every `interval` seconds."""
+
+    def __init__(self, roots: list, interval: float):
+        self.roots = roots
+        self.interval = interval
+        self.overflowed = False
+        self.seen = self._stat_all()
+
+    def _stat_all(self) -> dict:
+        stats = {}
+        for root in self.roots:
+            for path in _walk_files(root):
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                stats[path] = (stat.st_size, stat.st_mtime)
+        return stats
+
+    def poll(self, timeout: float) -> set:
+        time.sleep(min(timeout, self.interval))
+        current = self._stat_all()
+        changed = {path for path, stat in current.items() if self.seen.get(path) != stat}
+        self.seen = current
+        return changed
+
+    def close(self):
+        pass
+
+
+def create_watcher(roots: list, poll_interval: float):
+    try:
+        return InotifyWatcher(roots)
+    except (OSError, AttributeError) as e:
+        logger.warning(f"inotify unavailable ({str(e)}), polling every {poll_interval}s instead")
+        return PollingWatcher(roots, poll_interval)
+
+
+class SettleTracker:
+    """
+    Files count as settled once their size and mtime stayed the same for
+    `settle_seconds`, so copies still being written aren't picked up.
+    """
+
+    def __init__(self, settle_seconds: float):
+        self.settle_seconds = settle_seconds
+        self.pending = {}
+
+    def add(self, paths):
+        now = time.monotonic()
+        for path in paths:
+            # Any new event restarts the wait
+            self.pending[path] = (None, now)
+
+    def settled(self) -> list:
+        now = time.monotonic()
+        ready = []
+        for path, (stat, since) in list(self.pending.items()):
+            try:
+                current = os.stat(path)
+            except FileNotFoundError:
+                del self.pending[path]
+                continue
+            current = (current.st_size, current.st_mtime)
+            if current != stat:
+                self.pending[path] = (current, now)
+            elif now - since >= self.settle_seconds:
+                del self.pending[path]
+                ready.append(path)
+        return ready
+
+
+def _walk_files(root: str):
+    for folder, dirs, files in os.walk(root):
+        dirs[:] = [d for d in dirs if not d.startswith(".")]
+        for name in files:
+            if not name.startswith("."):
+                yield os.path.join(folder, name)
@@ -0,0 +1,165 @@
+import os
+import re
+import time
+import base64
+import hashlib
+import posixpath
+from config import setting
+from utils.cache import TTLCache
+
+CONTENT_TYPES = {
+    ".m3u8": "application/vnd.apple.mpegurl",
+    ".ts": "video/mp2t",
+    ".jpg": "image/jpeg",
+}
+
+
+def content_type_for(file_path: str) -> str:
+    return CONTENT_TYPES.get(os.path.splitext(file_path)[1].lower(), "application/octet-stream")
+
+
+def safe_relative_path(file_path: str) -> str:
+    """
+    Normalize a client supplied path inside a video folder.
+    Raises ValueError for anything that would escape the folder.
+    """
+    normalized = posixpath.normpath("/" + file_path).lstrip("/")
+    if not normalized or normalized == "." or ".." in normalized.split("/"):
+        raise ValueError(f"Invalid file path '{file_path}'")
+    return normalized
+
+
+VARIANT_DIR = re.compile(r"^(\d+)p$")
+RESOLUTION = re.compile(r"RESOLUTION=\d+x(\d+)")
+
+# Filtered master playlists keyed by (storage_path, cap); entries carry the file mtime
+manifest_cache = TTLCache(setting.manifest_cache_max_entries, ttl=24 * 60 * 60)
+
+
+def variant_height(file_path: str):
+    """Height of the rendition a path belongs to ("720p/seg_001.ts" -> 720), None for shared files."""
+    match = VARIANT_DIR.match(file_path.split("/", 1)[0])
+    return int(match.group(1)) if match else None
+
+
+def _split_master(master: str) -> tuple:
+    """(other lines, [(height, #EXT-X-STREAM-INF line, uri)]) of a master playlist."""
+    lines = master.splitlines()
+    header, variants = [], []
+    i = 0
+    while i < len(lines):
+        line = lines[i]
+        if line.startswith("#EXT-X-STREAM-INF") and i + 1 < len(lines):
+            match = RESOLUTION.search(line)
+            height = int(match.group(1)) if match else 0
+            variants.append((height, line, lines[i + 1]))
+            i += 2
+            continue
+        header.append(line)
+        i += 1
+    return header, variants
+
+
+def allowed_variants(variants: list, max_height: int) -> list:
+    """
+    The quality cap rule, for masters, variant requests and signed URLs alike:
+    variants up to `max_height`, or only the lowest one when every variant is
+    above the cap, so a capped user can still play.
+    """
+    allowed = [v for v in variants if v[0] <= max_height]
+    if not allowed and variants:
+        allowed = [min(variants, key=lambda v: v[0])]
+    return allowed
+
+
+def filter_master(master: str, max_height: int) -> str:
+    """Drop the variants a `max_height` cap doesn't allow from a master playlist."""
+    header, variants = _split_master(master)
+    for _, inf, uri in allowed_variants(variants, max_height):
+        header += [inf, uri]
+    return "\n".join(header)
+
+
+def variant_allowed(storage_path: str, height: int, max_height: int) -> bool:
+    """Whether a user capped at `max_height` may fetch the `height` rendition of a video."""
+    if max_height is None or height is None or height <= max_height:
+        return True
+    _, variants = _split_master(render_master(storage_path))
+    return height in {variant_height(uri) for _, _, uri in allowed_variants(variants, max_height)}
+
+
+def render_master(storage_path: str, max_height: int = None) -> str:
+    """
+    Master playlist for a user's quality cap, served from memory and
+    re-rendered only when master.m3u8 changes on disk.
+    """
+    path = os.path.join(setting.base_storage_path, storage_path, "master.m3u8")
+    mtime = os.stat(path).st_mtime_ns
+    key = (storage_path, max_height)
+
+    cached = manifest_cache.get(key)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+
+    master = read_playlist(storage_path, "master.m3u8")
+    if max_height is not None:
+        master = filter_master(master, max_height)
+    manifest_cache.set(key, (mtime, master))
+    return master
+
+
+def with_session_data(master: str, data: dict) -> str:
+    """Add an #EXT-X-SESSION-DATA tag per DATA-ID -> VALUE of `data` below #EXTM3U."""
+    lines = master.splitlines()
+    tags = [f'#EXT-X-SESSION-DATA:DATA-ID="{data_id}",VALUE="{value}"' for data_id, value in data.items()]
+    return "\n".join(lines[:1] + tags + lines[1:])
+
+
+def read_playlist(storage_path: str, file_path: str) -> str:
+    path = os.path.join(setting.base_storage_path, storage_path, file_path)
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def rewrite_uris(playlist: str, rewrite) -> str:
+    """Apply `rewrite` to every URI line of an m3u8 playlist (non-empty, non-tag lines)."""
+    lines = []
+    for line in playlist.splitlines():
+        if line and not line.startswith("#"):
+            line = rewrite(line)
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def signed_prefix(folder: str, expires: int = None) -> str:
+    """
+    URL prefix that lets nginx serve a whole folder without calling the API.
+
+    The token is placed in the path (/hls/<md5>/<expires>/<folder>/...) so
+    relative segment URIs in the variant playlists inherit it. It matches nginx
+    secure_link with `secure_link_md5 "$expires/$hls_dir <secret>"`, see docs/Nginx.md.
+    """
+    if expires is None:
+        expires = int(time.time()) + setting.hls_signed_url_ttl_seconds
+    secret = setting.hls_signing_secret or setting.secret_key
+    digest = hashlib.md5(f"{expires}/{folder} {secret}".encode()).digest()
+    token = base64.urlsafe_b64encode(digest).decode().rstrip("=")
+    return f"{setting.hls_signed_base_url}{setting.hls_signed_prefix}/{token}/{expires}/{folder}/"
+
+
+def signed_master(storage_path: str, max_height: int = None) -> str:
+    """
+    Master playlist with every variant pointing at its signed nginx URL.
+    Each variant folder gets its own token, so a quality cap can't be
+    bypassed by swapping the variant name in a signed URL.
+    """
+    expires = int(time.time()) + setting.hls_signed_url_ttl_seconds
+
+    def sign(uri):
+        variant_dir, file_name = uri.split("/", 1)
+        # render_master already filtered by the cap; never hand out a token the cap rule doesn't allow
+        if not variant_allowed(storage_path, variant_height(uri), max_height):
+            raise PermissionError(f"Variant {variant_dir} not allowed under a {max_height}p cap")
+        return signed_prefix(f"{storage_path}/{variant_dir}", expires) + file_name
+
+    return rewrite_uris(render_master(storage_path, max_height), sign)
@@ -0,0 +1,379 @@
+import os
+import json
+import time
+import uuid
+import socket
+import asyncio
+import logging
+import threading
+from sqlalchemy import select, update, delete, func
+from config import setting
+from db import SessionLocal
+from models.jobs import IngestJob, ApiLatencyReport
+from utils.admission import admission
+from utils.jobs import job_tracker, JobStage, FINAL_STAGES, playable_stats
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+ROLES = ("api", "worker", "all")
+
+
+class LocalIngest:
+    """
+    process_role "all": jobs go to the scheduler of this process and progress
+    is pushed from the in-memory job tracker. index (libtorrent, ffmpeg) is
+    only imported when the ingest side starts.
+    """
+
+    @staticmethod
+    def _runtime():
+        import index
+        return index
+
+    def start(self):
+        self._runtime().start()
+
+    def stop(self):
+        self._runtime().stop()
+
+    def submit(self, owner_id: str, magnet_link: str, torrent_name: str = None) -> str:
+        job_id = job_tracker.create(owner_id, magnet_link, torrent_name)
+        self._runtime().enqueue_torrent({
+            'magnet_link': magnet_link,
+            'owner_id': owner_id,
+            'torrent_name': torrent_name,
+            'job_id': job_id
+        })
+        return job_id
+
+    def qsize(self) -> int:
+        return self._runtime().torrent_queue.qsize()
+
+    def get(self, job_id: str) -> dict:
+        return job_tracker.get(job_id)
+
+    def list_for_owner(self, owner_id: str) -> list:
+        return job_tracker.list_for_owner(owner_id)
+
+    def subscribe(self, owner_id: str) -> asyncio.Queue:
+        return job_tracker.subscribe(owner_id)
+
+    def unsubscribe(self, owner_id: str, queue: asyncio.Queue):
+        job_tracker.unsubscribe(owner_id, queue)
+
+    def boost(self, job_id: str, priority: int) -> bool:
+        return self._runtime().torrent_queue.boost(job_id, priority)
+
+    def report(self) -> dict:
+        return self._runtime().torrent_queue.report()
+
+
+def job_snapshot(job: IngestJob) -> dict:
+    """Same shape as a job tracker snapshot."""
+    snapshot = {
+        "id": job.id,
+        "owner_id": job.owner_id,
+        "torrent_name": job.torrent_name,
+        "stage": job.stage,
+        "progress": json.loads(job.progress) if job.progress else {},
+        "created_at": job.created_at,
+        "updated_at": job.updated_at,
+    }
+    if job.playable_at:
+        snapshot["playable_at"] = job.playable_at
+    return snapshot
+
+
+class DatabaseIngest:
+    """
+    process_role "api": jobs are inserted into ingest_jobs for a worker
+    process (worker.py) to claim, and job state is read back from there.
+    Event streams poll the table every ingest_poll_seconds. The process's API
+    p99 is published to api_latency_reports for the workers' encode throttling.
+    """
+
+    def __init__(self):
+        self.reporter = f"{socket.gethostname()}:{os.getpid()}"
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        metrics.register_collector(self.collect_metrics)
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._report_latency_loop, daemon=True, name="latency-report")
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout=5)
+        with SessionLocal() as db:
+            db.execute(delete(ApiLatencyReport).where(ApiLatencyReport.reporter == self.reporter))
+            db.commit()
+
+    def report_latency(self):
+        now = time.time()
+        with SessionLocal() as db:
+            db.merge(ApiLatencyReport(reporter=self.reporter, p99_ms=admission.latency.percentile(99), updated_at=now))
+            # Reports of processes that stopped without removing theirs
+            db.execute(delete(ApiLatencyReport).where(ApiLatencyReport.updated_at < now - 60 * 60))
+            db.commit()
+
+    def _report_latency_loop(self):
+        while not self.stop_event.wait(setting.latency_report_seconds):
+            try:
+                self.report_latency()
+            except Exception as e:
+                logger.warning(f"Publishing API latency failed: {str(e)}")
+
+    def submit(self, owner_id: str, magnet_link: str, torrent_name: str = None) -> str:
+        now = time.time()
+        job = IngestJob(
+            id=uuid.uuid4().hex,
+            owner_id=owner_id,
+            magnet_link=magnet_link,
+            torrent_name=torrent_name,
+            stage=JobStage.QUEUED,
+            priority=0,
+            created_at=now,
+            updated_at=now,
+        )
+        with SessionLocal() as db:
+            db.add(job)
+            db.commit()
+            return job.id
+
+    def qsize(self) -> int:
+        with SessionLocal() as db:
+            return db.scalar(select(func.count()).select_from(IngestJob).where(IngestJob.stage == JobStage.QUEUED))
+
+    def get(self, job_id: str) -> dict:
+        with SessionLocal() as db:
+            job = db.get(IngestJob, job_id)
+            return job_snapshot(job) if job else None
+
+    def list_for_owner(self, owner_id: str, since: float = None) -> list:
+        query = select(IngestJob).where(IngestJob.owner_id == owner_id)
+        if since is not None:
+            query = query.where(IngestJob.updated_at > since)
+        with SessionLocal() as db:
+            return [job_snapshot(job) for job in db.scalars(query.order_by(IngestJob.updated_at))]
+
+    def subscribe(self, owner_id: str) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=1000)
+        queue.poller = asyncio.get_running_loop().create_task(self._poll(owner_id, queue))
+        return queue
+
+    def unsubscribe(self, owner_id: str, queue: asyncio.Queue):
+        queue.poller.cancel()
+
+    async def _poll(self, owner_id: str, queue: asyncio.Queue):
+        since = time.time()
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(setting.ingest_poll_seconds)
+            for job in await loop.run_in_executor(None, self.list_for_owner, owner_id, since):
+                since = max(since, job["updated_at"])
+                if queue.full():
+                    queue.get_nowait()
+                queue.put_nowait(job)
+
+    def boost(self, job_id: str, priority: int) -> bool:
+        # The claiming worker applies it to its scheduler on its next poll
+        with SessionLocal() as db:
+            result = db.execute(
+                update(IngestJob)
+                .where(IngestJob.id == job_id, IngestJob.stage == JobStage.QUEUED)
+                .values(priority=priority)
+            )
+            db.commit()
+            return result.rowcount > 0
+
+    def report(self) -> dict:
+        with SessionLocal() as db:
+            rows = db.execute(
+                select(IngestJob.playable_at - IngestJob.created_at)
+                .where(IngestJob.playable_at.isnot(None))
+                .order_by(IngestJob.playable_at.desc())
+                .limit(1000)
+            ).scalars().all()
+        return {
+            "policy": setting.scheduler_policy,
+            "queued": self.qsize(),
+            **playable_stats(rows),
+        }
+
+    def collect_metrics(self) -> list:
+        now = time.time()
+        with SessionLocal() as db:
+            rows = db.execute(
+                select(IngestJob.stage, func.count(), func.min(IngestJob.created_at))
+                .where(IngestJob.stage.notin_(FINAL_STAGES))
+                .group_by(IngestJob.stage)
+            ).all()
+        return [
+            ("ingest_queue_depth", "gauge", "Ingest jobs waiting to be run.",
+             [({}, sum(count for stage, count, _ in rows if stage == JobStage.QUEUED))]),
+            ("ingest_jobs", "gauge", "Unfinished ingest jobs per stage.",
+             [({"stage": stage}, count) for stage, count, _ in rows]),
+            ("ingest_oldest_job_age_seconds", "gauge", "Age of the oldest unfinished ingest job per stage.",
+             [({"stage": stage}, round(now - oldest, 3)) for stage, _, oldest in rows]),
+        ]
+
+
+class JobTableBridge:
+    """
+    Worker side of DatabaseIngest. Every ingest_poll_seconds it claims queued
+    ingest_jobs rows into the local scheduler, applies priority changes made
+    through the API, and writes the job tracker's latest state of each of its
+    jobs back to the table (at most one write per job per poll).
+    """
+
+    def __init__(self):
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self.pending = {}
+        self.priorities = {}
+        # Claimed jobs that haven't finished yet, against ingest_worker_slots
+        self.active = set()
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self._release_orphans()
+        job_tracker.add_listener(self._job_changed)
+        self.thread = threading.Thread(target=self._run, daemon=True, name="ingest-bridge")
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+        self._flush()
+
+    def _job_changed(self, job: dict):
+        with self.lock:
+            self.pending[job["id"]] = job
+            if job["stage"] in FINAL_STAGES:
+                self.active.discard(job["id"])
+
+    def _release_orphans(self):
+        """Fail the unfinished jobs of workers on this host that are no longer running."""
+        host = socket.gethostname()
+        with SessionLocal() as db:
+            claimed = db.execute(
+                select(IngestJob.id, IngestJob.claimed_by)
+                .where(IngestJob.claimed_by.like(f"{host}:%"), IngestJob.stage.notin_(FINAL_STAGES))
+            ).all()
+            orphans = [job_id for job_id, worker_id in claimed if not _process_alive(int(worker_id.rsplit(":", 1)[1]))]
+            if orphans:
+                logger.warning(f"Failing {len(orphans)} ingest job(s) left behind by stopped workers")
+                db.execute(
+                    update(IngestJob)
+                    .where(IngestJob.id.in_(orphans))
+                    .values(stage=JobStage.FAILED, progress=json.dumps({"error": "Worker stopped"}), updated_at=time.time())
+                )
+                db.commit()
+
+    def _run(self):
+        while not self.stop_event.wait(setting.ingest_poll_seconds):
+            try:
+                self._claim()
+                self._sync_priorities()
+                self._flush()
+            except Exception as e:
+                logger.exception(f"Ingest job table sync failed: {str(e)}")
+
+    def _claim(self):
+        from index import enqueue_torrent
+
+        with self.lock:
+            free = setting.ingest_worker_slots - len(self.active)
+        if free <= 0:
+            # Leave the queued jobs to workers with free slots
+            return
+        with SessionLocal() as db:
+            candidates = db.execute(
+                select(IngestJob.id, IngestJob.owner_id, IngestJob.magnet_link, IngestJob.torrent_name,
+                       IngestJob.priority, IngestJob.created_at)
+                .where(IngestJob.stage == JobStage.QUEUED, IngestJob.claimed_by.is_(None))
+                .order_by(IngestJob.created_at)
+                .limit(free)
+            ).all()
+            for job in candidates:
+                # Conditional update: only one worker wins a row
+                claimed = db.execute(
+                    update(IngestJob)
+                    .where(IngestJob.id == job.id, IngestJob.claimed_by.is_(None))
+                    .values(claimed_by=self.worker_id)
+                ).rowcount
+                db.commit()
+                if not claimed:
+                    continue
+                with self.lock:
+                    self.active.add(job.id)
+                job_tracker.create(job.owner_id, job.magnet_link, job.torrent_name, job.id, job.created_at)
+                self.priorities[job.id] = job.priority
+                enqueue_torrent({
+                    'magnet_link': job.magnet_link,
+                    'owner_id': job.owner_id,
+                    'torrent_name': job.torrent_name,
+                    'job_id': job.id,
+                    'priority': job.priority,
+                })
+
+    def _sync_priorities(self):
+        from index import torrent_queue
+
+        if not self.priorities:
+            return
+        with SessionLocal() as db:
+            rows = db.execute(
+                select(IngestJob.id, IngestJob.priority, IngestJob.stage)
+                .where(IngestJob.id.in_(list(self.priorities)))
+            ).all()
+        for job_id, priority, stage in rows:
+            if stage != JobStage.QUEUED:
+                self.priorities.pop(job_id, None)
+            elif priority != self.priorities[job_id]:
+                torrent_queue.boost(job_id, priority)
+                self.priorities[job_id] = priority
+
+    def _flush(self):
+        with self.lock:
+            changed, self.pending = self.pending, {}
+        if not changed:
+            return
+        with SessionLocal() as db:
+            for job in changed.values():
+                db.execute(
+                    update(IngestJob)
+                    .where(IngestJob.id == job["id"])
+                    .values(
+                        stage=job["stage"],
+                        progress=json.dumps(job["progress"]),
+                        updated_at=job["updated_at"],
+                        playable_at=job.get("playable_at"),
+                    )
+                )
+            db.commit()
+
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def create_ingest():
+    if setting.process_role not in ROLES:
+        raise ValueError(f"Unknown process_role '{setting.process_role}', expected one of {ROLES}")
+    return LocalIngest() if setting.process_role == "all" else DatabaseIngest()
+
+
+ingest = create_ingest()
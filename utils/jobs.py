@@ -0,0 +1,188 @@
+import asyncio
+import threading
+import time
+import uuid
+from collections import deque
+
+
+class JobStage:
+    QUEUED = 'QUEUED'
+    METADATA = 'METADATA'
+    DOWNLOADING = 'DOWNLOADING'
+    PROCESSING = 'PROCESSING'
+    COMPLETED = 'COMPLETED'
+    FAILED = 'FAILED'
+
+
+FINAL_STAGES = {JobStage.COMPLETED, JobStage.FAILED}
+
+
+def playable_stats(samples: list) -> dict:
+    """Mean and p95 of time-to-playable samples (seconds)."""
+    samples = sorted(samples)
+    if not samples:
+        return {"samples": 0, "mean_time_to_playable": None, "p95_time_to_playable": None}
+    p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+    return {
+        "samples": len(samples),
+        "mean_time_to_playable": round(sum(samples) / len(samples), 2),
+        "p95_time_to_playable": round(p95, 2),
+    }
+
+
+class JobTracker:
+    """
+    In-memory registry of ingest jobs and their per-stage progress.
+
+    The background worker publishes updates from its own thread, and every
+    subscriber (one per open event stream) gets them pushed onto an asyncio
+    queue on its event loop, so clients don't have to poll the database.
+    """
+
+    def __init__(self, keep_finished: int = 200):
+        self.keep_finished = keep_finished
+        self.jobs = {}
+        self.subscribers = {}
+        self.listeners = []
+        self.playable_samples = deque(maxlen=1000)
+        self.lock = threading.Lock()
+
+    def create(self, owner_id: str, magnet_link: str, torrent_name: str = None,
+               job_id: str = None, created_at: float = None) -> str:
+        """Register a job, under an existing id and creation time when a worker claims it from the database."""
+        job_id = job_id or uuid.uuid4().hex
+        now = time.time()
+        job = {
+            "id": job_id,
+            "owner_id": owner_id,
+            "magnet_link": magnet_link,
+            "torrent_name": torrent_name,
+            "stage": JobStage.QUEUED,
+            "progress": {},
+            "created_at": created_at or now,
+            "updated_at": now,
+        }
+        with self.lock:
+            self.jobs[job_id] = job
+            self._trim()
+            snapshot = self._snapshot(job)
+        self._publish(snapshot)
+        return job_id
+
+    def update(self, job_id: str, stage: str = None, **progress):
+        """Merge progress fields into a job and push the new state to subscribers."""
+        if job_id is None:
+            return
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return
+            if stage is not None and stage != job["stage"]:
+                job["stage"] = stage
+                job["progress"] = {}
+            job["progress"].update(progress)
+            job["updated_at"] = time.time()
+            snapshot = self._snapshot(job)
+        self._publish(snapshot)
+
+    def mark_playable(self, job_id: str):
+        """Record time-to-playable the first time one of the job's videos is ready."""
+        if job_id is None:
+            return
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None or job.get("playable_at"):
+                return
+            job["playable_at"] = time.time()
+            self.playable_samples.append(job["playable_at"] - job["created_at"])
+
+    def time_to_playable_stats(self) -> dict:
+        with self.lock:
+            samples = list(self.playable_samples)
+        return playable_stats(samples)
+
+    def stage_summary(self) -> dict:
+        """Job count and age in seconds of the oldest job, per unfinished stage."""
+        now = time.time()
+        summary = {}
+        with self.lock:
+            for job in self.jobs.values():
+                if job["stage"] in FINAL_STAGES:
+                    continue
+                count, oldest = summary.get(job["stage"], (0, 0.0))
+                summary[job["stage"]] = (count + 1, max(oldest, now - job["created_at"]))
+        return summary
+
+    def get(self, job_id: str) -> dict:
+        with self.lock:
+            job = self.jobs.get(job_id)
+            return self._snapshot(job) if job else None
+
+    def list_for_owner(self, owner_id: str) -> list:
+        with self.lock:
+            return [
+                self._snapshot(job)
+                for job in self.jobs.values()
+                if job["owner_id"] == owner_id
+            ]
+
+    def add_listener(self, listener):
+        """Call `listener(snapshot)` on the publishing thread for every job change."""
+        with self.lock:
+            self.listeners.append(listener)
+
+    def subscribe(self, owner_id: str) -> asyncio.Queue:
+        """Register an event queue bound to the calling event loop."""
+        queue = asyncio.Queue(maxsize=1000)
+        loop = asyncio.get_running_loop()
+        with self.lock:
+            self.subscribers.setdefault(owner_id, []).append((loop, queue))
+        return queue
+
+    def unsubscribe(self, owner_id: str, queue: asyncio.Queue):
+        with self.lock:
+            subscribers = self.subscribers.get(owner_id, [])
+            self.subscribers[owner_id] = [s for s in subscribers if s[1] is not queue]
+            if not self.subscribers[owner_id]:
+                del self.subscribers[owner_id]
+
+    def _publish(self, job: dict):
+        with self.lock:
+            subscribers = list(self.subscribers.get(job["owner_id"], []))
+            listeners = list(self.listeners)
+        for listener in listeners:
+            listener(job)
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(self._offer, queue, job)
+            except RuntimeError:
+                # Event loop already closed, the stream is gone
+                self.unsubscribe(job["owner_id"], queue)
+
+    @staticmethod
+    def _offer(queue: asyncio.Queue, job: dict):
+        # A slow client only loses intermediate progress, never blocks the worker
+        if queue.full():
+            try:
+                queue.get_nowait()
+            except asyncio.QueueEmpty:
+                pass
+        queue.put_nowait(job)
+
+    @staticmethod
+    def _snapshot(job: dict) -> dict:
+        snapshot = dict(job)
+        snapshot["progress"] = dict(job["progress"])
+        snapshot.pop("magnet_link", None)
+        return snapshot
+
+    def _trim(self):
+        finished = [j for j in self.jobs.values() if j["stage"] in FINAL_STAGES]
+        if len(finished) <= self.keep_finished:
+            return
+        finished.sort(key=lambda j: j["updated_at"])
+        for job in finished[:len(finished) - self.keep_finished]:
+            del self.jobs[job["id"]]
+
+
+job_tracker = JobTracker()
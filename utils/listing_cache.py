@@ -0,0 +1,79 @@
+import hashlib
+from fastapi import Request, Response
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+from models.videos import UserDataVersion
+from utils.cache import TTLCache
+from config import setting
+
+# user_id -> data version, re-read from the DB every listing_version_ttl_seconds
+data_versions = TTLCache(setting.auth_cache_max_entries, setting.listing_version_ttl_seconds)
+# (user_id, path, query) -> (version, body, headers); entries of an old version are never served
+listing_responses = TTLCache(setting.listing_cache_max_entries, ttl=10 * 60)
+
+# Response headers worth replaying from the cache
+REPLAYED_HEADERS = ("x-next-cursor", "link", "content-type")
+
+
+async def listing_version(db, user_id: str) -> int:
+    version = data_versions.get(user_id)
+    if version is None:
+        result = await db.execute(
+            select(UserDataVersion.version).where(UserDataVersion.user_id == user_id)
+        )
+        version = result.scalar() or 0
+        data_versions.set(user_id, version)
+    return version
+
+
+def _cache_key(request: Request, user_id: str) -> tuple:
+    return user_id, request.url.path, str(request.query_params)
+
+
+def _etag(key: tuple, version: int) -> str:
+    digest = hashlib.md5("\0".join(key).encode()).hexdigest()[:16]
+    return f'"{version}-{digest}"'
+
+
+def _validators(etag: str) -> dict:
+    # Clients may keep the body but have to revalidate it on every use
+    return {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+
+def cached_listing(request: Request, user_id: str, version: int) -> Response:
+    """
+    A 304 when the client's copy is current, the cached response when this
+    process already rendered it for `version`, otherwise None.
+    """
+    key = _cache_key(request, user_id)
+    etag = _etag(key, version)
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and etag in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=_validators(etag))
+
+    cached = listing_responses.get(key)
+    if cached is None or cached[0] != version:
+        return None
+    _, body, headers = cached
+    return Response(content=body, headers={**headers, **_validators(etag)})
+
+
+def store_listing(request: Request, user_id: str, version: int, response: Response) -> Response:
+    """Tag a freshly rendered listing with its ETag and keep its body for repeat requests."""
+    key = _cache_key(request, user_id)
+    etag = _etag(key, version)
+    response.headers.update(_validators(etag))
+    headers = {name: response.headers[name] for name in REPLAYED_HEADERS if name in response.headers}
+    listing_responses.set(key, (version, response.body, headers))
+    return response
+
+
+@event.listens_for(Session, "after_commit")
+def _drop_committed_versions(session):
+    for user_id in session.info.pop("bumped_owners", ()):
+        data_versions.pop(user_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_rolled_back_versions(session):
+    session.info.pop("bumped_owners", None)
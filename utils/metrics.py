@@ -0,0 +1,247 @@
+import os
+import time
+import shutil
+import logging
+import threading
+from bisect import bisect_left
+from contextvars import ContextVar
+from sqlalchemy import event
+from config import setting
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+REALTIME_FACTOR_BUCKETS = (0.25, 0.5, 1, 2, 4, 8, 16, 32)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames: tuple = ()):
+        self.name, self.help, self.labelnames = name, help, labelnames
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, labels: tuple = (), amount: float = 1):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            for labels, value in sorted(self.values.items()):
+                lines.append(f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, buckets: tuple, labelnames: tuple = ()):
+        self.name, self.help, self.labelnames = name, help, labelnames
+        self.buckets = tuple(buckets) + (float("inf"),)
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, labels: tuple, value: float):
+        with self.lock:
+            series = self.series.get(labels)
+            if series is None:
+                series = self.series[labels] = [[0] * len(self.buckets), 0.0, 0]
+            series[0][bisect_left(self.buckets, value)] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            for labels, (counts, total, count) in sorted(self.series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    le = f'le="{_number(bound)}"'
+                    lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+                lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(total)}")
+                lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Minimal Prometheus text-format registry.
+
+    Counters and histograms are updated as things happen; point-in-time values
+    (queue depth, torrents, disk usage) come from collectors called at scrape
+    time, each returning (name, type, help, [(labels dict, value), ...]) tuples.
+    """
+
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []
+
+    def counter(self, name: str, help: str, labelnames: tuple = ()) -> Counter:
+        metric = Counter(name, help, labelnames)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help: str, buckets: tuple, labelnames: tuple = ()) -> Histogram:
+        metric = Histogram(name, help, buckets, labelnames)
+        self.metrics.append(metric)
+        return metric
+
+    def register_collector(self, collector):
+        self.collectors.append(collector)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines += metric.render()
+        for collector in self.collectors:
+            try:
+                families = collector()
+            except Exception as e:
+                logger.warning(f"Metrics collector {collector.__name__} failed: {str(e)}")
+                continue
+            for name, kind, help, samples in families:
+                lines += [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+                for labels, value in samples:
+                    names = tuple(labels)
+                    lines.append(f"{name}{_labels(names, tuple(labels[n] for n in names))} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+request_duration = metrics.histogram(
+    "http_request_duration_seconds", "Time to response headers per route.",
+    LATENCY_BUCKETS, ("method", "route", "status")
+)
+request_db_queries = metrics.histogram(
+    "http_request_db_queries", "Database queries issued per request.",
+    QUERY_COUNT_BUCKETS, ("method", "route")
+)
+request_db_seconds = metrics.histogram(
+    "http_request_db_seconds", "Time spent in database queries per request.",
+    LATENCY_BUCKETS, ("method", "route")
+)
+encode_realtime_factor = metrics.histogram(
+    "encode_realtime_factor", "Seconds of video encoded per second of wall time, per preset.",
+    REALTIME_FACTOR_BUCKETS, ("preset",)
+)
+encodes_total = metrics.counter("encodes_total", "Finished encodes per preset and result.", ("preset", "result"))
+
+
+# Per-request database statistics
+
+# [query count, seconds] of the request being handled, None outside requests
+_request_db = ContextVar("request_db", default=None)
+
+
+def start_request() -> list:
+    stats = [0, 0.0]
+    _request_db.set(stats)
+    return stats
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["query_started"].pop()
+    stats = _request_db.get()
+    if stats is not None:
+        stats[0] += 1
+        stats[1] += time.perf_counter() - started
+
+
+def instrument_engine(engine):
+    """Count queries and their time against the current request. Accepts sync engines."""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def route_label(request) -> str:
+    # The route template, not the raw path, keeps label cardinality bounded
+    route = request.scope.get("route")
+    return getattr(route, "path", "unmatched")
+
+
+def observe_request(request, status_code: int, seconds: float, db_stats: list):
+    route = route_label(request)
+    request_duration.observe((request.method, route, status_code), seconds)
+    request_db_queries.observe((request.method, route), db_stats[0])
+    request_db_seconds.observe((request.method, route), db_stats[1])
+
+
+# Disk usage
+
+_disk_cache = {"at": 0.0, "families": []}
+_disk_lock = threading.Lock()
+
+
+def _tree_size(path: str) -> int:
+    total = 0
+    stack = [path]
+    while stack:
+        try:
+            entries = os.scandir(stack.pop())
+        except OSError:
+            continue
+        with entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        total += entry.stat(follow_symlinks=False).st_size
+                except OSError:
+                    continue
+    return total
+
+
+def collect_disk_usage() -> list:
+    """
+    Bytes stored per user under base_storage_path plus filesystem totals. The
+    tree walk is cached for metrics_disk_usage_ttl_seconds, scrapes stay cheap.
+    """
+    with _disk_lock:
+        if time.monotonic() - _disk_cache["at"] < setting.metrics_disk_usage_ttl_seconds:
+            return _disk_cache["families"]
+
+        base = setting.base_storage_path
+        users_dir = os.path.join(base, "users")
+        per_user = []
+        if os.path.isdir(users_dir):
+            for entry in os.scandir(users_dir):
+                if entry.is_dir(follow_symlinks=False):
+                    per_user.append(({"user": entry.name}, _tree_size(entry.path)))
+
+        families = [("storage_user_bytes", "gauge", "Bytes stored per user under base_storage_path.", per_user)]
+        if os.path.isdir(base):
+            disk = shutil.disk_usage(base)
+            families += [
+                ("storage_filesystem_size_bytes", "gauge", "Size of the filesystem holding base_storage_path.",
+                 [({}, disk.total)]),
+                ("storage_filesystem_free_bytes", "gauge", "Free bytes on the filesystem holding base_storage_path.",
+                 [({}, disk.free)]),
+            ]
+        _disk_cache.update(at=time.monotonic(), families=families)
+        return families
+
+
+metrics.register_collector(collect_disk_usage)
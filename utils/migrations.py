@@ -0,0 +1,38 @@
+import os
+import logging
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import inspect
+from db import engine
+
+logger = logging.getLogger(__name__)
+
+ALEMBIC_INI = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "alembic.ini")
+
+
+def alembic_config(connection=None) -> Config:
+    config = Config(ALEMBIC_INI)
+    config.set_main_option("script_location", os.path.join(os.path.dirname(ALEMBIC_INI), "migrations"))
+    # Keep the app's logging setup
+    config.attributes["configure_logging"] = False
+    if connection is not None:
+        config.attributes["connection"] = connection
+    return config
+
+
+def upgrade_database():
+    """
+    Bring the schema to the latest migration.
+
+    Databases created by `Base.metadata.create_all` before migrations existed
+    have no alembic_version table; they are stamped at the revision their
+    tables match first, so only the newer migrations (indexes) run.
+    """
+    with engine.begin() as connection:
+        tables = inspect(connection).get_table_names()
+        config = alembic_config(connection)
+        if "alembic_version" not in tables and "users" in tables:
+            revision = "0002" if "user_usage_daily" in tables else "0001"
+            logger.info(f"Stamping unversioned database at revision {revision}")
+            command.stamp(config, revision)
+        command.upgrade(config, "head")
@@ -0,0 +1,116 @@
+import base64
+from datetime import datetime
+from fastapi import HTTPException, Request, Response, status
+from sqlalchemy import DateTime, String, literal, tuple_
+from sqlalchemy.types import TypeDecorator
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+
+class CursorDateTime(TypeDecorator):
+    """
+    Binds a cursor's created_at the way the database stored it. SQLite keeps
+    DateTime as text and server_default now() has no fractional seconds, so the
+    regular bind ("... 12:00:00.000000") sorts after every row of that second.
+    """
+
+    impl = DateTime
+    cache_ok = True
+
+    def load_dialect_impl(self, dialect):
+        if dialect.name == "sqlite":
+            return dialect.type_descriptor(String())
+        return dialect.type_descriptor(DateTime())
+
+    def process_bind_param(self, value, dialect):
+        if value is not None and dialect.name == "sqlite":
+            # Same text as CURRENT_TIMESTAMP, or as SQLAlchemy's format when there are microseconds
+            return value.isoformat(sep=" ")
+        return value
+
+
+def encode_cursor(created_at: datetime, row_id: str) -> str:
+    raw = f"{created_at.isoformat()}|{row_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple:
+    """(created_at, id) of the last row of the previous page. Raises HTTPException 400 for a bad cursor."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, row_id = raw.split("|", 1)
+        return datetime.fromisoformat(created_at), row_id
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+
+def encode_offset_cursor(offset: int) -> str:
+    """Cursor of ranked results (search), which have no stable key to page on."""
+    return base64.urlsafe_b64encode(f"offset|{offset}".encode()).decode().rstrip("=")
+
+
+def decode_offset_cursor(cursor: str) -> int:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        kind, offset = raw.split("|", 1)
+        if kind != "offset" or int(offset) < 0:
+            raise ValueError(raw)
+        return int(offset)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+
+def keyset_page(query, created_column, id_column, cursor: str = None, limit: int = DEFAULT_PAGE_SIZE):
+    """
+    Newest-first page of `query` after `cursor`.
+    One extra row is fetched so the caller can tell whether there is a next page.
+    """
+    if cursor:
+        created_at, row_id = decode_cursor(cursor)
+        query = query.where(
+            tuple_(created_column, id_column) < tuple_(literal(created_at, CursorDateTime()), row_id)
+        )
+    return query.order_by(created_column.desc(), id_column.desc()).limit(limit + 1)
+
+
+def split_page(rows: list, limit: int) -> tuple:
+    """(rows of this page, cursor of the next page or None)."""
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(rows[-1].created_at, rows[-1].id)
+
+
+def set_next_page(request: Request, response: Response, next_cursor: str):
+    """Advertise the next page in `X-Next-Cursor` and an RFC 8288 `Link` header."""
+    if not next_cursor:
+        return
+    response.headers["X-Next-Cursor"] = next_cursor
+    next_url = request.url.include_query_params(cursor=next_cursor)
+    response.headers["Link"] = f'<{next_url}>; rel="next"'
+
+
+def parse_fields(fields: str, model) -> set:
+    """
+    Sparse field set from a comma separated `fields` parameter, validated
+    against the response model. None when every field is wanted.
+    """
+    if not fields:
+        return None
+    wanted = {field.strip() for field in fields.split(",") if field.strip()}
+    unknown = wanted - set(model.model_fields)
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown fields: {', '.join(sorted(unknown))}"
+        )
+    # The id is always returned so clients can address what they got
+    return wanted | {"id"}
+
@@ -0,0 +1,158 @@
+import os
+import re
+import logging
+import posixpath
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from models.videos import Video, VideoStatus, Playlist, PlaylistVideoMapping
+from utils.cache import TTLCache
+from utils.hls import render_master, read_playlist
+from config import setting
+
+logger = logging.getLogger(__name__)
+
+EXTINF = re.compile(r"^#EXTINF:([\d.]+)")
+
+# (user_id, video_id) -> (next video id, next storage path, quality cap), from masters requested with playlist_id
+upcoming = TTLCache(setting.auth_cache_max_entries, ttl=6 * 60 * 60)
+# (storage_path, variant playlist) -> [(segment uri, duration)]
+segment_lists = TTLCache(setting.manifest_cache_max_entries, ttl=24 * 60 * 60)
+# (storage_path, quality cap) of videos read ahead recently, so every late segment doesn't redo it
+prewarmed = TTLCache(1000, ttl=setting.prefetch_repeat_seconds)
+
+# One thread: readahead is a few fadvise calls and small playlist reads, it must never compete with serving
+prefetch_executor = ThreadPoolExecutor(1, thread_name_prefix="prefetch")
+
+
+async def next_playlist_item(db: AsyncSession, playlist_id: str, video_id: str, owner_id: str):
+    """(id, storage_path) of the playable video after `video_id` in the owner's playlist, or None."""
+    current = (
+        select(PlaylistVideoMapping.position)
+        .where(PlaylistVideoMapping.playlist_id == playlist_id, PlaylistVideoMapping.video_id == video_id)
+        .scalar_subquery()
+    )
+    result = await db.execute(
+        select(Video.id, Video.storage_path)
+        .join(PlaylistVideoMapping, PlaylistVideoMapping.video_id == Video.id)
+        .join(Playlist, Playlist.id == PlaylistVideoMapping.playlist_id)
+        .where(
+            PlaylistVideoMapping.playlist_id == playlist_id,
+            Playlist.owner_id == owner_id,
+            PlaylistVideoMapping.position > current,
+            Video.status == VideoStatus.PROCESSED,
+        )
+        .order_by(PlaylistVideoMapping.position)
+        .limit(1)
+    )
+    return result.first()
+
+
+def segments(storage_path: str, playlist_uri: str) -> list:
+    """[(segment uri relative to the video folder, duration)] of a variant playlist."""
+    key = (storage_path, playlist_uri)
+    cached = segment_lists.get(key)
+    if cached is not None:
+        return cached
+    folder = posixpath.dirname(playlist_uri)
+    entries, duration = [], 0.0
+    for line in read_playlist(storage_path, playlist_uri).splitlines():
+        match = EXTINF.match(line)
+        if match:
+            duration = float(match.group(1))
+        elif line and not line.startswith("#"):
+            entries.append((posixpath.join(folder, line), duration))
+    segment_lists.set(key, entries)
+    return entries
+
+
+def _will_need(path: str):
+    """Start reading `path` into the page cache without waiting for the disk."""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        if hasattr(os, "posix_fadvise"):
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+        else:
+            # No readahead hint on this platform: reading the file has the same effect, synchronously
+            while os.read(fd, 1024 * 1024):
+                pass
+    finally:
+        os.close(fd)
+
+
+def prewarm(storage_path: str, max_height: int = None) -> int:
+    """
+    Read ahead what a player fetches first when it starts a video: the master
+    and variant playlists, the thumbnail and the first prefetch_segments
+    segments of every variant the user may play. Returns the number of files.
+    """
+    master = render_master(storage_path, max_height)
+    files = ["master.m3u8", "thumbnail.jpg"]
+    for line in master.splitlines():
+        if line and not line.startswith("#"):
+            files.append(line)
+            files.extend(uri for uri, _ in segments(storage_path, line)[:setting.prefetch_segments])
+
+    base = os.path.join(setting.base_storage_path, storage_path)
+    advised = 0
+    for file_path in files:
+        try:
+            _will_need(os.path.join(base, file_path))
+            advised += 1
+        except FileNotFoundError:
+            continue
+    return advised
+
+
+def _run_prewarm(storage_path: str, max_height: int):
+    try:
+        advised = prewarm(storage_path, max_height)
+        logger.debug(f"Prewarmed {advised} file(s) of {storage_path}")
+    except Exception as e:
+        prewarmed.pop((storage_path, max_height))
+        logger.warning(f"Prewarming {storage_path} failed: {str(e)}")
+
+
+def schedule_prewarm(storage_path: str, max_height: int = None) -> bool:
+    """Prewarm in the background unless it was done within prefetch_repeat_seconds."""
+    key = (storage_path, max_height)
+    if prewarmed.get(key):
+        return False
+    prewarmed.set(key, True)
+    prefetch_executor.submit(_run_prewarm, storage_path, max_height)
+    return True
+
+
+def _prewarm_if_late(storage_path: str, file_path: str, next_storage_path: str, max_height: int):
+    """Prewarm the next video once the requested segment is within prefetch_lead_seconds of the end."""
+    variant_playlist = posixpath.join(posixpath.dirname(file_path), "index.m3u8")
+    try:
+        entries = segments(storage_path, variant_playlist)
+    except FileNotFoundError:
+        return
+    uris = [uri for uri, _ in entries]
+    if file_path not in uris:
+        return
+    remaining = sum(duration for _, duration in entries[uris.index(file_path) + 1:])
+    if remaining <= setting.prefetch_lead_seconds:
+        _run_prewarm(next_storage_path, max_height)
+    else:
+        # Not late yet: let a later segment try again
+        prewarmed.pop((next_storage_path, max_height))
+
+
+def segment_requested(user_id: str, video_id: str, storage_path: str, file_path: str):
+    """
+    Called for segment requests served through the API: prewarms the next
+    playlist item near the end of the video, if the master was requested
+    with a playlist_id.
+    """
+    following = upcoming.get((user_id, video_id))
+    if following is None:
+        return
+    _, next_storage_path, max_height = following
+    key = (next_storage_path, max_height)
+    if prewarmed.get(key):
+        return
+    prewarmed.set(key, True)
+    prefetch_executor.submit(_prewarm_if_late, storage_path, file_path, next_storage_path, max_height)
@@ -0,0 +1,206 @@
+import os
+import sys
+import time
+import random
+import hmac
+import logging
+import threading
+from collections import Counter
+from contextvars import ContextVar
+from sqlalchemy import event
+from config import setting
+from utils.metrics import route_label
+
+logger = logging.getLogger(__name__)
+
+# Idle leaf frames of pool threads waiting for work, not worth a flamegraph slot
+IDLE_LEAVES = {("threading.py", "wait"), ("queue.py", "get"), ("selectors.py", "select")}
+
+
+class RequestTrace:
+    """Phase timings and queries of one profiled request."""
+
+    def __init__(self):
+        self.phases = {}
+        self.queries = []
+
+    def add(self, name: str, seconds: float):
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+
+# Trace of the request being handled, None when profiling is off or the request isn't traced
+_trace = ContextVar("request_trace", default=None)
+
+
+class phase:
+    """
+    Time a block as a named phase of the current request:
+
+        with phase("serialize"):
+            response = ORJSONResponse(...)
+
+    A context variable lookup and nothing else when the request isn't traced.
+    """
+
+    __slots__ = ("name", "trace", "started")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.trace = _trace.get()
+        if self.trace is not None:
+            self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        if self.trace is not None:
+            self.trace.add(self.name, time.perf_counter() - self.started)
+        return False
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _trace.get() is not None:
+        context._profiling_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    trace = _trace.get()
+    started = getattr(context, "_profiling_started", None)
+    if trace is not None and started is not None:
+        trace.queries.append((time.perf_counter() - started, statement))
+
+
+def instrument_engine(engine):
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+class StackSampler:
+    """
+    Samples the stacks of the threads that can run request code (the event loop
+    thread and the request threadpool) every profiling_interval_ms, counting
+    them in collapsed "frame;frame;frame" form for flamegraph.pl or speedscope.
+    Concurrent requests on the same threads show up in the same profile.
+    """
+
+    def __init__(self, loop_thread_id: int):
+        self.loop_thread_id = loop_thread_id
+        self.stacks = Counter()
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self) -> Counter:
+        self.stop_event.set()
+        self.thread.join()
+        return self.stacks
+
+    def _targets(self) -> dict:
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        return {
+            ident: name for ident, name in names.items()
+            if ident == self.loop_thread_id or name.startswith("AnyIO worker thread")
+        }
+
+    def _run(self):
+        interval = setting.profiling_interval_ms / 1000
+        while not self.stop_event.wait(interval):
+            frames = sys._current_frames()
+            # The threadpool grows on demand, so the targets are looked up on every tick
+            for ident, name in self._targets().items():
+                frame = frames.get(ident)
+                if frame is None:
+                    continue
+                code = frame.f_code
+                if ident != self.loop_thread_id and (os.path.basename(code.co_filename), code.co_name) in IDLE_LEAVES:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append("event loop" if ident == self.loop_thread_id else "threadpool")
+                self.stacks[";".join(reversed(stack))] += 1
+
+
+def _profile_requested(request) -> bool:
+    value = request.headers.get(setting.profiling_header)
+    if value is None:
+        return False
+    # Profiling costs the whole process CPU, only trusted callers may ask for it
+    return not setting.profiling_token or hmac.compare_digest(value, setting.profiling_token)
+
+
+def _server_timing(trace: RequestTrace, total: float) -> str:
+    entries = [f"{name};dur={seconds * 1000:.2f}" for name, seconds in trace.phases.items()]
+    if trace.queries:
+        db_seconds = sum(seconds for seconds, _ in trace.queries)
+        entries.append(f'db;dur={db_seconds * 1000:.2f};desc="{len(trace.queries)} queries"')
+    entries.append(f"total;dur={total * 1000:.2f}")
+    return ", ".join(entries)
+
+
+def _dump_profile(request, stacks: Counter, total: float) -> str:
+    os.makedirs(setting.profiling_output_dir, exist_ok=True)
+    route = route_label(request).strip("/").replace("/", "_").replace("{", "").replace("}", "") or "root"
+    file_name = f"{time.strftime('%Y%m%d-%H%M%S')}-{request.method}-{route}-{int(total * 1000)}ms.folded"
+    path = os.path.join(setting.profiling_output_dir, file_name)
+    with open(path, "w") as f:
+        for stack, count in stacks.most_common():
+            f.write(f"{stack} {count}\n")
+    return path
+
+
+def _log_slow(request, trace: RequestTrace, total: float, profile_path: str = None):
+    phases = ", ".join(f"{name} {seconds * 1000:.1f} ms" for name, seconds in trace.phases.items())
+    message = f"Slow request {request.method} {route_label(request)} {total * 1000:.1f} ms: {phases or 'no phases'}"
+    if trace.queries:
+        slowest_seconds, slowest = max(trace.queries, key=lambda query: query[0])
+        db_seconds = sum(seconds for seconds, _ in trace.queries)
+        message += (
+            f", db {db_seconds * 1000:.1f} ms in {len(trace.queries)} queries"
+            f" (slowest {slowest_seconds * 1000:.1f} ms: {' '.join(slowest.split())[:200]})"
+        )
+    if profile_path:
+        message += f", profile {profile_path}"
+    logger.warning(message)
+
+
+async def profile_requests(request, call_next):
+    """
+    Middleware installed only when profiling_enabled is set.
+
+    Every request gets phase timings (auth, db, serialize, ...) in a
+    Server-Timing header. A profiling_sample_rate fraction of requests, and
+    requests sending profiling_header, also run the stack sampler; the
+    collapsed profile is written to profiling_output_dir when the request took
+    longer than profiling_slow_ms, or always when it was asked for by header.
+    """
+    trace = RequestTrace()
+    _trace.set(trace)
+
+    requested = _profile_requested(request)
+    sampler = None
+    if requested or random.random() < setting.profiling_sample_rate:
+        sampler = StackSampler(threading.get_ident())
+        sampler.start()
+
+    started = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        stacks = sampler.stop() if sampler else None
+    total = time.perf_counter() - started
+
+    response.headers["Server-Timing"] = _server_timing(trace, total)
+    slow = total * 1000 >= setting.profiling_slow_ms
+    profile_path = None
+    if stacks is not None and (requested or slow):
+        profile_path = _dump_profile(request, stacks, total)
+        response.headers["X-Profile-Samples"] = str(sum(stacks.values()))
+    if slow:
+        _log_slow(request, trace, total, profile_path)
+    return response
@@ -1,4 +1,17 @@
+import os
+import time
+import asyncio
+import logging
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from passlib.context import CryptContext
+from config import setting
+from utils.cache import TTLCache
+
+logger = logging.getLogger(__name__)
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
@@ -7,4 +20,128 @@ def secure_pwd(raw_password):
     return hashed
 
 def verify_pwd(plain, hash):
-    return pwd_context.verify(plain, hash)
\ No newline at end of file
+    return pwd_context.verify(plain, hash)
+
+
+def _lower_priority():
+    # Hashing yields the CPU to request handling when cores are scarce
+    try:
+        os.nice(10)
+    except OSError:
+        pass
+
+
+class PasswordHasherBusy(Exception):
+    """Raised when the hashing executor already has password_hash_max_pending calls in flight."""
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt in its own executor, so slow hashes never hold the event loop or
+    the request threadpool that segment auth depends on. The process pool is
+    spawned (not forked) because the API process runs torrent and ffmpeg threads.
+    Calls beyond the in-flight cap fail fast instead of queueing without bound.
+    A pool broken by a dying worker (OOM kill, crash) is replaced and the call
+    retried once.
+    """
+
+    def __init__(self):
+        self.executor = None
+        self.in_flight = 0
+        self.lock = threading.Lock()
+
+    def _get_executor(self):
+        with self.lock:
+            if self.executor is None:
+                if setting.password_hash_executor == "process":
+                    self.executor = ProcessPoolExecutor(
+                        setting.password_hash_workers,
+                        mp_context=multiprocessing.get_context("spawn"),
+                        initializer=_lower_priority
+                    )
+                else:
+                    self.executor = ThreadPoolExecutor(
+                        setting.password_hash_workers,
+                        thread_name_prefix="password-hash"
+                    )
+            return self.executor
+
+    def _discard(self, executor):
+        # Callers that shared the broken pool replace it only once
+        with self.lock:
+            if self.executor is executor:
+                self.executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    async def _run(self, fn, *args):
+        with self.lock:
+            if self.in_flight >= setting.password_hash_max_pending:
+                raise PasswordHasherBusy()
+            self.in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            for attempt in range(2):
+                executor = self._get_executor()
+                try:
+                    return await loop.run_in_executor(executor, fn, *args)
+                except BrokenProcessPool:
+                    self._discard(executor)
+                    if attempt:
+                        raise
+                    logger.warning("Password hashing pool broken, starting a new one")
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+    async def hash(self, raw_password: str) -> str:
+        return await self._run(secure_pwd, raw_password)
+
+    async def verify(self, plain: str, hashed: str) -> bool:
+        return await self._run(verify_pwd, plain, hashed)
+
+    def shutdown(self):
+        with self.lock:
+            executor, self.executor = self.executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+class LoginThrottle:
+    """
+    Failed login attempts per username over a sliding window. Checked before any
+    hashing, so guessing one account's password stops costing bcrypt time after
+    login_max_failures tries.
+    """
+
+    def __init__(self):
+        self.failures = TTLCache(setting.auth_cache_max_entries, setting.login_failure_window_seconds)
+        self.lock = threading.Lock()
+
+    def _recent(self, username: str, now: float) -> deque:
+        attempts = self.failures.get(username) or deque()
+        while attempts and attempts[0] <= now - setting.login_failure_window_seconds:
+            attempts.popleft()
+        return attempts
+
+    def retry_after(self, username: str) -> int:
+        """Seconds until `username` may try again, 0 when allowed."""
+        now = time.monotonic()
+        with self.lock:
+            attempts = self._recent(username, now)
+            if len(attempts) < setting.login_max_failures:
+                return 0
+            return int(attempts[0] + setting.login_failure_window_seconds - now) + 1
+
+    def failed(self, username: str):
+        now = time.monotonic()
+        with self.lock:
+            attempts = self._recent(username, now)
+            attempts.append(now)
+            self.failures.set(username, attempts)
+
+    def succeeded(self, username: str):
+        self.failures.pop(username)
+
+
+password_hasher = PasswordHasher()
+login_throttle = LoginThrottle()
@@ -0,0 +1,158 @@
+import time
+import itertools
+import threading
+from config import setting
+from utils.jobs import job_tracker
+
+POLICIES = ("fifo", "sjf", "fair")
+
+
+class IngestScheduler:
+    """
+    Drop-in replacement for the ingest `Queue` with pluggable ordering.
+
+    - fifo: arrival order.
+    - sjf:  shortest estimated job first (download + encode time from metadata).
+    - fair: round-robin between users by the estimated work already dispatched
+            to each of them, shortest job first within a user.
+
+    Priority boosts always win inside the ordering they apply to: globally for
+    fifo/sjf, and only within the owner's own jobs for fair, so a boost can't
+    be used to jump ahead of other users.
+    """
+
+    def __init__(self, policy: str = "fair"):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown scheduler policy '{policy}', expected one of {POLICIES}")
+        self.policy = policy
+        self.tasks = []
+        self.served = {}
+        self.counter = itertools.count()
+        self.unfinished = 0
+        self.closed = False
+        self.condition = threading.Condition()
+
+    # Queue interface
+
+    def put(self, task: dict):
+        with self.condition:
+            task.setdefault('priority', 0)
+            task.setdefault('estimate', None)
+            task['seq'] = next(self.counter)
+            self.tasks.append(task)
+            self.unfinished += 1
+            self.condition.notify()
+
+    def get(self) -> dict:
+        """Block until a task is due and return the best one for the current policy, None once closed."""
+        with self.condition:
+            while True:
+                if self.closed:
+                    return None
+                now = time.time()
+                ready = [t for t in self.tasks if t.get('not_before', 0) <= now]
+                if ready:
+                    task = self._select(ready)
+                    self.tasks.remove(task)
+                    self._charge(task)
+                    return task
+
+                due = [t['not_before'] for t in self.tasks if 'not_before' in t]
+                timeout = max(min(due) - now, 0.1) if due else None
+                self.condition.wait(timeout=timeout)
+
+    def requeue(self, task: dict):
+        """Return a task to the queue without counting it as a new job."""
+        with self.condition:
+            self.tasks.append(task)
+            self.condition.notify()
+
+    def close(self):
+        """Wake the worker waiting in get() and make it return None."""
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+    def task_done(self):
+        with self.condition:
+            self.unfinished -= 1
+
+    def qsize(self) -> int:
+        with self.condition:
+            return len(self.tasks)
+
+    # Scheduling inputs
+
+    def update_estimate(self, job_id: str, size_bytes: int = None, duration: float = None):
+        """Set a job's estimated cost (seconds of worker time) from its metadata."""
+        if size_bytes is None and duration is None:
+            return
+        if duration is None:
+            duration = size_bytes * 8 / setting.scheduler_assumed_source_bitrate
+        download = (size_bytes or 0) / setting.scheduler_assumed_download_rate
+        estimate = download + duration * setting.scheduler_encode_factor
+
+        with self.condition:
+            for task in self.tasks:
+                if task.get('job_id') == job_id:
+                    task['estimate'] = estimate
+
+    def boost(self, job_id: str, priority: int) -> bool:
+        with self.condition:
+            for task in self.tasks:
+                if task.get('job_id') == job_id:
+                    task['priority'] = priority
+                    return True
+        return False
+
+    def pending(self) -> list:
+        with self.condition:
+            return [
+                {k: v for k, v in task.items() if k != 'magnet_link'}
+                for task in self.tasks
+            ]
+
+    # Ordering
+
+    @staticmethod
+    def _cost(task: dict) -> float:
+        estimate = task.get('estimate')
+        return setting.scheduler_default_job_seconds if estimate is None else estimate
+
+    def _job_key(self, task: dict) -> tuple:
+        if self.policy == "fifo":
+            return (-task['priority'], task['seq'])
+        return (-task['priority'], self._cost(task), task['seq'])
+
+    def _select(self, ready: list) -> dict:
+        if self.policy != "fair":
+            return min(ready, key=self._job_key)
+
+        by_owner = {}
+        for task in ready:
+            by_owner.setdefault(task['owner_id'], []).append(task)
+
+        owner = min(by_owner, key=lambda o: (self.served.get(o, 0), min(t['seq'] for t in by_owner[o])))
+        return min(by_owner[owner], key=self._job_key)
+
+    def _charge(self, task: dict):
+        # A job deferred by admission comes back through requeue(): it was paid for on its first get()
+        if task.get('charged'):
+            return
+        task['charged'] = True
+        owner = task['owner_id']
+        active = {t['owner_id'] for t in self.tasks} | {owner}
+        # Users returning from idle start from the current minimum instead of
+        # cashing in credit for the time they had nothing queued
+        floor = min((self.served[o] for o in active if o in self.served), default=0)
+        self.served[owner] = max(self.served.get(owner, 0), floor) + self._cost(task)
+
+    # Reporting
+
+    def report(self) -> dict:
+        stats = job_tracker.time_to_playable_stats()
+        return {
+            "policy": self.policy,
+            "queued": self.qsize(),
+            **stats,
+        }
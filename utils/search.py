@@ -0,0 +1,63 @@
+import re
+from sqlalchemy import select, func, literal_column, and_, table as sql_table, column
+from models.videos import Video, Playlist
+
+# Postgres text search configuration: titles are file and torrent names in any language, so no stemming
+SEARCH_CONFIG = "simple"
+MAX_TERMS = 16
+
+# Letter/digit runs: "Show.S01E02_1080p" -> show, s01e02, 1080p (what both full-text indexes tokenize to)
+TERM = re.compile(r"[^\W_]+")
+
+
+def search_terms(q: str) -> list:
+    return [term.lower() for term in TERM.findall(q)][:MAX_TERMS]
+
+
+def pg_document(table: str) -> str:
+    """
+    Indexed expression of migration 0007's GIN index; queries must repeat it
+    verbatim (with constants, not bind parameters) for the index to be used.
+    """
+    return f"to_tsvector('{SEARCH_CONFIG}', regexp_replace({table}.title, '[^[:alnum:]]+', ' ', 'g'))"
+
+
+def title_search(dialect: str, model, columns: list, owner_id: str, terms: list):
+    """
+    Select of `columns` for `owner_id`'s rows of `model` (Video or Playlist)
+    whose title has every term as a word prefix, best match first. A `rank`
+    column is added; lower is better on every backend.
+
+    SQLite matches through the FTS5 table {table}_fts, PostgreSQL through the
+    expression GIN index on the title. Other databases get an unindexed
+    LIKE match, newest first.
+    """
+    table = model.__tablename__
+    if dialect == "sqlite":
+        fts = sql_table(f"{table}_fts", column("rowid"))
+        match = " ".join(f'"{term}"*' for term in terms)
+        rank = func.bm25(literal_column(fts.name))
+        query = (
+            select(*columns, rank.label("rank"))
+            .select_from(model)
+            .join(fts, fts.c.rowid == literal_column(f"{table}.rowid"))
+            .where(literal_column(fts.name).op("MATCH")(match))
+        )
+    elif dialect == "postgresql":
+        tsquery = func.to_tsquery(literal_column(f"'{SEARCH_CONFIG}'"), " & ".join(f"{term}:*" for term in terms))
+        document = literal_column(pg_document(table))
+        rank = -func.ts_rank(document, tsquery)
+        query = select(*columns, rank.label("rank")).where(document.op("@@")(tsquery))
+    else:
+        rank = literal_column("0")
+        query = select(*columns, rank.label("rank")).where(
+            and_(*(model.title.icontains(term, autoescape=True) for term in terms))
+        )
+        return query.where(model.owner_id == owner_id).order_by(model.created_at.desc(), model.id)
+    return query.where(model.owner_id == owner_id).order_by(rank, model.id)
+
+
+SEARCH_TARGETS = {
+    "videos": Video,
+    "playlists": Playlist,
+}
@@ -0,0 +1,71 @@
+from models.videos import Video, Playlist
+from config import setting
+
+# Response field -> column, in VideoResponse order. storage_path and thumbnail_url
+# are replaced by API URLs, so storage_path is never read.
+VIDEO_FIELDS = {
+    "id": Video.id,
+    "title": Video.title,
+    "owner_id": Video.owner_id,
+    "storage_path": None,
+    "thumbnail_url": Video.thumbnail_url,
+    "status": Video.status,
+    "created_at": Video.created_at,
+    "duration_seconds": Video.duration_seconds,
+    "width": Video.width,
+    "height": Video.height,
+    "size_bytes": Video.size_bytes,
+}
+
+PLAYLIST_FIELDS = {
+    "id": Playlist.id,
+    "title": Playlist.title,
+    "owner_id": Playlist.owner_id,
+    "created_at": Playlist.created_at,
+}
+
+
+def play_url(video_id: str) -> str:
+    return f"{setting.api_base_url}/videos/{video_id}/play"
+
+
+def thumbnail_url(video_id: str) -> str:
+    return f"{setting.api_base_url}/videos/{video_id}/thumbnail"
+
+
+def video_columns(fields: set = None) -> list:
+    """
+    Columns to select for `fields` (all when None). id and created_at are
+    always selected: the URLs and the pagination cursor are built from them.
+    """
+    wanted = VIDEO_FIELDS if fields is None else fields | {"id", "created_at"}
+    return [column for name, column in VIDEO_FIELDS.items() if name in wanted and column is not None]
+
+
+def video_dto(row, fields: set = None) -> dict:
+    """
+    Plain dict for a row selected with video_columns(), ready for orjson.
+    Built from the row alone, so no ORM instance is loaded or modified.
+    """
+    data = row._mapping
+    dto = {}
+    for name in VIDEO_FIELDS:
+        if fields is not None and name not in fields:
+            continue
+        if name == "storage_path":
+            dto[name] = play_url(data["id"])
+        elif name == "thumbnail_url":
+            dto[name] = thumbnail_url(data["id"]) if data["thumbnail_url"] else None
+        elif name == "status":
+            dto[name] = data["status"].value
+        else:
+            dto[name] = data[name]
+    return dto
+
+
+def playlist_dto(row, videos: list = None, fields: set = None) -> dict:
+    data = row._mapping
+    dto = {name: data[name] for name in PLAYLIST_FIELDS if fields is None or name in fields}
+    if fields is None or "videos" in fields:
+        dto["videos"] = videos or []
+    return dto
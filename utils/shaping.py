@@ -0,0 +1,69 @@
+import time
+import asyncio
+import anyio
+from config import setting
+from utils.cache import TTLCache
+
+CHUNK_SIZE = 64 * 1024
+
+
+class TokenBucket:
+    """
+    Async token bucket: `rate` bytes per second with up to `burst` bytes saved up.
+    Every connection of a user draws from the same bucket, and the lock makes
+    waiting connections take turns, so they split the user's rate evenly.
+    """
+
+    def __init__(self, rate: int, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def consume(self, nbytes: int):
+        async with self.lock:
+            self._refill()
+            if self.tokens < nbytes:
+                await asyncio.sleep((nbytes - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= nbytes
+
+
+# One bucket per user, dropped once the user has been idle for a while
+buckets = TTLCache(setting.auth_cache_max_entries, ttl=300)
+
+
+def user_rate(user) -> int:
+    """The user's shaped rate in bytes per second, or None when unshaped."""
+    return user.rate_limit * 1024 if user.rate_limit else None
+
+
+def bucket_for(user_id: str, rate: int) -> TokenBucket:
+    bucket = buckets.get(user_id)
+    if bucket is None or bucket.rate != rate:
+        # The burst must hold a whole chunk, or refills cap below what consume takes and the bucket runs dry
+        bucket = TokenBucket(rate, max(int(rate * setting.shaping_burst_seconds), CHUNK_SIZE))
+    # Refresh the idle timeout on every use
+    buckets.set(user_id, bucket)
+    return bucket
+
+
+async def shaped_file_chunks(path: str, start: int, length: int, bucket: TokenBucket):
+    """Yield `length` bytes of a file from `start`, pacing every chunk through the bucket."""
+    async with await anyio.open_file(path, "rb") as f:
+        await f.seek(start)
+        remaining = length
+        while remaining > 0:
+            size = min(CHUNK_SIZE, remaining)
+            await bucket.consume(size)
+            chunk = await f.read(size)
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
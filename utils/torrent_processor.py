@@ -3,8 +3,10 @@ import uuid
 import logging
 import shutil
 from utils.downloader import TorrentVideosDownloader
-from utils.downloads_processor import DownloadedVideoProcessor
-from models.videos import Video, VideoStatus, Playlist, PlaylistVideoMapping
+from utils.downloads_processor import DownloadedVideoProcessor, VIDEO_EXTENSIONS
+from utils.jobs import job_tracker, JobStage
+from utils.admission import admission, AdmissionDeferred
+from models.videos import Video, VideoStatus, Playlist, PlaylistVideoMapping, POSITION_GAP
 from db import SessionLocal
 from config import setting
 
@@ -12,33 +14,24 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
-def download_and_process_torrent(magnet_link: str, owner_id: str, torrent_name: str = None):
+def _create_and_download(db, downloader: TorrentVideosDownloader, magnet_link: str, owner_id: str,
+                         torrent_name: str, job_id: str, torrent_info: dict, video_records: list):
     """
-    Download and process videos from a torrent, creating database records and playlist if needed.
-    
-    Args:
-        magnet_link: The magnet link to download
-        owner_id: The user ID who owns these videos
-        torrent_name: Optional name for the torrent (used as folder name)
+    Create the Video rows (appended to `video_records`) and the playlist, then
+    download the torrent. Returns (folder_name, playlist), or None when the
+    torrent holds no videos.
     """
-    downloader = TorrentVideosDownloader(setting.tmp_downloading_path)
-    processor = DownloadedVideoProcessor(setting.base_storage_path, setting.tmp_downloading_path)
-    db = SessionLocal()
-    
+    download_reservation = None
     try:
-        logger.info("Fetching torrent information...")
-        torrent_info = downloader.get_info(magnet_link)
+        if torrent_info is None:
+            logger.info("Fetching torrent information...")
+            job_tracker.update(job_id, JobStage.METADATA)
+            torrent_info = downloader.get_info(magnet_link)
         logger.info(f"Torrent: {torrent_info['name']}, Files: {torrent_info['file_count']}, Total Size: {torrent_info['total_size'] / (1024**3):.2f} GB")
         
         folder_name = torrent_name or f"torrent_{uuid.uuid4().hex[:8]}"
         
         # Identify all video files from torrent metadata
-        VIDEO_EXTENSIONS = {
-            ".mp4", ".mkv", ".avi", ".mov", ".wmv", ".flv",
-            ".webm", ".mpeg", ".mpg", ".m4v", ".3gp",
-            ".3g2", ".ts", ".vob", ".ogv"
-        }
-        
         video_files = []
         for file_info in torrent_info['files']:
             file_path = file_info['path']
@@ -50,10 +43,13 @@ def download_and_process_torrent(magnet_link: str, owner_id: str, torrent_name:
         
         if not video_files:
             logger.warning("No video files found in torrent metadata. Skipping download.")
-            return
+            job_tracker.update(job_id, JobStage.FAILED, error="No video files found in torrent")
+            return None
+        
+        # Defer the whole job (before creating any records) if it can't fit on disk
+        download_reservation = admission.reserve_download(torrent_info['total_size'])
         
         # Create video records for each identified video file BEFORE downloading
-        video_records = []
         for video_file in video_files:
             video_name = os.path.basename(video_file)
             video_record = Video(
@@ -80,8 +76,62 @@ def download_and_process_torrent(magnet_link: str, owner_id: str, torrent_name:
             logger.info(f"Created playlist: {playlist.title} (ID: {playlist.id})")
         
         logger.info("Downloading torrent...")
-        download_path = downloader.download(magnet_link, folder_name)
+        job_tracker.update(
+            job_id,
+            JobStage.DOWNLOADING,
+            name=torrent_info['name'],
+            total_size=torrent_info['total_size'],
+            video_ids=[v.id for v in video_records],
+        )
+        download_path = downloader.download(
+            magnet_link,
+            folder_name,
+            progress_callback=lambda progress: job_tracker.update(job_id, **progress)
+        )
         logger.info(f"Download completed: {download_path}")
+        return folder_name, playlist
+    finally:
+        if download_reservation is not None:
+            admission.release(download_reservation)
+
+
+def download_and_process_torrent(magnet_link: str, owner_id: str, torrent_name: str = None, job_id: str = None,
+                                 torrent_info: dict = None, downloader: TorrentVideosDownloader = None,
+                                 resume: dict = None):
+    """
+    Download and process videos from a torrent, creating database records and playlist if needed.
+    
+    Args:
+        magnet_link: The magnet link to download
+        owner_id: The user ID who owns these videos
+        torrent_name: Optional name for the torrent (used as folder name)
+        job_id: Optional job tracker ID that receives per-stage progress
+        torrent_info: Metadata already fetched by the scheduler, skips a second lookup
+        downloader: Session to download in; the worker passes the one /metrics reads
+        resume: State attached to an AdmissionDeferred raised by an earlier run's encode; continues
+            with the videos that aren't finished instead of downloading again
+    """
+    if downloader is None:
+        downloader = TorrentVideosDownloader(setting.tmp_downloading_path)
+    processor = DownloadedVideoProcessor(setting.base_storage_path, setting.tmp_downloading_path)
+    db = SessionLocal()
+    video_records = []
+    
+    try:
+        if resume is None:
+            created = _create_and_download(
+                db, downloader, magnet_link, owner_id, torrent_name, job_id, torrent_info, video_records
+            )
+            if created is None:
+                return
+            folder_name, playlist = created
+        else:
+            # Deferred at an encode earlier: the records and the download already exist
+            folder_name = resume['folder_name']
+            records = {v.id: v for v in db.query(Video).filter(Video.id.in_(resume['video_ids']))}
+            video_records.extend(records[video_id] for video_id in resume['video_ids'] if video_id in records)
+            playlist = db.get(Playlist, resume['playlist_id']) if resume.get('playlist_id') else None
+            logger.info(f"Resuming {folder_name}: {len(video_records)} video record(s)")
         
         logger.info("Finding downloaded videos...")
         downloaded_vids = processor.find_all_videos(folder_name)
@@ -95,6 +145,7 @@ def download_and_process_torrent(magnet_link: str, owner_id: str, torrent_name:
                 video_record.status = VideoStatus.FAILED
             db.commit()
             logger.warning("No videos found after download. Marked all as FAILED.")
+            job_tracker.update(job_id, JobStage.FAILED, error="No videos found after download")
             return
         
         # Match downloaded videos with database records by filename
@@ -102,6 +153,9 @@ def download_and_process_torrent(magnet_link: str, owner_id: str, torrent_name:
         
         logger.info("Processing videos...")
         for idx, video_record in enumerate(video_records):
+            if video_record.status in (VideoStatus.PROCESSED, VideoStatus.FAILED):
+                # Finished by the run that was deferred
+                continue
             try:
                 video_filename = video_record.title
                 
@@ -116,6 +170,14 @@ def download_and_process_torrent(magnet_link: str, owner_id: str, torrent_name:
                 
                 video_record.status = VideoStatus.PROCESSING
                 db.commit()
+                job_tracker.update(
+                    job_id,
+                    JobStage.PROCESSING,
+                    video_id=video_record.id,
+                    title=video_filename,
+                    video_index=idx + 1,
+                    video_count=len(video_records),
+                )
                 
                 # Create storage path: users/{user_id}/videos/{video_id}
                 output_dir = os.path.join(
@@ -125,7 +187,24 @@ def download_and_process_torrent(magnet_link: str, owner_id: str, torrent_name:
                     "videos", 
                     video_record.id
                 )
-                result = processor.process_video(vid_path, output_dir)
+                meta = processor.probe_video(vid_path)
+                variants = processor.select_variants(meta['width'], meta['height'])
+                required_bytes = admission.estimate_encode_bytes(
+                    meta['duration'],
+                    [processor.presets[v][2] for v in variants]
+                )
+                if not admission.encode_can_fit(required_bytes):
+                    raise RuntimeError(
+                        f"Renditions need {required_bytes / (1024**3):.2f} GB, more than the storage disk can hold"
+                    )
+                # Bounded wait: the worker runs one job at a time, others queue behind this one
+                with admission.encode_slot(required_bytes, max_wait=setting.ingest_encode_max_wait_seconds):
+                    result = processor.process_video(
+                        vid_path,
+                        output_dir,
+                        progress_callback=lambda progress: job_tracker.update(job_id, **progress),
+                        meta=meta
+                    )
                 
                 # Store relative path from base_storage_path
                 video_record.storage_path = f"users/{owner_id}/videos/{video_record.id}"
@@ -136,6 +215,7 @@ def download_and_process_torrent(magnet_link: str, owner_id: str, torrent_name:
                 video_record.thumbnail_url = f"users/{owner_id}/videos/{video_record.id}/thumbnail.jpg"
                 video_record.status = VideoStatus.PROCESSED
                 db.commit()
+                job_tracker.mark_playable(job_id)
                 
                 logger.info(f"Video processed: {result['width']}x{result['height']}, Variants: {', '.join(result['variants'])}")
                 
@@ -148,15 +228,26 @@ def download_and_process_torrent(magnet_link: str, owner_id: str, torrent_name:
                     logger.warning(f"Failed to delete video file {video_filename}: {str(e)}")
                 
                 if playlist:
+                    # Gapped like the playlist endpoints number them, so videos can be moved in between
+                    position = (idx + 1) * POSITION_GAP
                     mapping = PlaylistVideoMapping(
                         playlist_id=playlist.id,
                         video_id=video_record.id,
-                        position=idx
+                        position=position
                     )
                     db.add(mapping)
                     db.commit()
-                    logger.info(f"Added to playlist at position {idx}")
+                    logger.info(f"Added to playlist at position {position}")
                     
+            except AdmissionDeferred as e:
+                # Leave this video PROCESSING and the download in place: the worker requeues the
+                # job and the next run resumes here rather than creating the records again
+                e.resume = {
+                    'folder_name': folder_name,
+                    'video_ids': [v.id for v in video_records],
+                    'playlist_id': playlist.id if playlist else None,
+                }
+                raise
             except Exception as e:
                 logger.error(f"Error processing video: {str(e)}")
                 video_record.status = VideoStatus.FAILED
@@ -165,6 +256,14 @@ def download_and_process_torrent(magnet_link: str, owner_id: str, torrent_name:
         successful = sum(1 for v in video_records if v.status == VideoStatus.PROCESSED)
         failed = sum(1 for v in video_records if v.status == VideoStatus.FAILED)
         logger.info(f"Summary - Total: {len(video_records)}, Successful: {successful}, Failed: {failed}")
+        job_tracker.update(
+            job_id,
+            JobStage.COMPLETED if successful else JobStage.FAILED,
+            total=len(video_records),
+            successful=successful,
+            failed=failed,
+            playlist_id=playlist.id if playlist else None,
+        )
         if playlist:
             logger.info(f"Playlist created: {playlist.title}")
         
@@ -177,8 +276,13 @@ def download_and_process_torrent(magnet_link: str, owner_id: str, torrent_name:
             except Exception as e:
                 logger.warning(f"Failed to delete download folder: {str(e)}")
         
+    except AdmissionDeferred:
+        # Raised by reserve_download before any record exists, or by an encode with resume state attached
+        raise
+        
     except Exception as e:
         logger.error(f"Fatal error: {str(e)}")
+        job_tracker.update(job_id, JobStage.FAILED, error=str(e))
         for video_record in video_records:
             if video_record.status != VideoStatus.PROCESSED:
                 video_record.status = VideoStatus.FAILED
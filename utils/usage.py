@@ -0,0 +1,277 @@
+import os
+import re
+import time
+import logging
+import threading
+from datetime import date
+from collections import defaultdict
+from sqlalchemy import insert, update, select
+from sqlalchemy.exc import IntegrityError
+from db import SessionLocal
+from models.users import UserUsage, UserUsageDaily, UserUsageMonthly
+from utils.auth import get_video_access
+from config import setting
+
+logger = logging.getLogger(__name__)
+
+MEGABYTE = 1024 * 1024
+
+# Matches both API paths (/videos/<id>/play/...) and signed nginx paths (.../users/<uid>/videos/<id>/...)
+API_PATH = re.compile(r"^/videos/([^/?]+)/(?:play|thumbnail)")
+SIGNED_PATH = re.compile(r"/users/([^/]+)/videos/([^/]+)/")
+
+
+class UsageRecorder:
+    """
+    Aggregates served bytes per (user, video) in memory and writes them to the
+    database in periodic batches: one user_usage row per pair per flush, plus
+    running totals in the daily and monthly rollup tables.
+
+    Quota checks read a per-user counter that is loaded from the rollups at
+    most every `usage_counter_ttl_seconds` and kept current with local traffic
+    in between, so play_video never sums raw usage rows.
+    """
+
+    def __init__(self):
+        self.pending = defaultdict(int)
+        self.counters = {}
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.threads = []
+
+    # Recording
+
+    def record(self, user_id: str, video_id: str, nbytes: int):
+        if not nbytes or not user_id:
+            return
+        with self.lock:
+            self.pending[(user_id, video_id)] += nbytes
+            counter = self.counters.get(user_id)
+            if counter is not None:
+                counter["daily"] += nbytes
+                counter["monthly"] += nbytes
+
+    def flush(self):
+        with self.lock:
+            batch, self.pending = self.pending, defaultdict(int)
+        if not batch:
+            return
+
+        today = date.today()
+        month = today.replace(day=1)
+        per_user = defaultdict(int)
+        for (user_id, _), nbytes in batch.items():
+            per_user[user_id] += nbytes
+
+        db = SessionLocal()
+        try:
+            db.execute(
+                insert(UserUsage),
+                [
+                    {"user_id": user_id, "video_id": video_id, "bandwidth_used": nbytes}
+                    for (user_id, video_id), nbytes in batch.items()
+                ]
+            )
+            for user_id, nbytes in per_user.items():
+                self._add_to_rollup(db, UserUsageDaily, UserUsageDaily.day, user_id, today, nbytes)
+                self._add_to_rollup(db, UserUsageMonthly, UserUsageMonthly.month, user_id, month, nbytes)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Failed to flush bandwidth usage, will retry: {str(e)}")
+            with self.lock:
+                for key, nbytes in batch.items():
+                    self.pending[key] += nbytes
+        finally:
+            db.close()
+
+    @staticmethod
+    def _add_to_rollup(db, model, period_column, user_id, period, nbytes):
+        where = (model.user_id == user_id, period_column == period)
+        result = db.execute(
+            update(model).where(*where).values(bytes_used=model.bytes_used + nbytes)
+        )
+        if result.rowcount:
+            return
+        try:
+            with db.begin_nested():
+                db.execute(insert(model).values(user_id=user_id, **{period_column.key: period}, bytes_used=nbytes))
+        except IntegrityError:
+            # Another process created the row in the meantime
+            db.execute(update(model).where(*where).values(bytes_used=model.bytes_used + nbytes))
+
+    # Quotas
+
+    def _cached_counter(self, user_id: str) -> dict:
+        with self.lock:
+            counter = self.counters.get(user_id)
+            if (
+                counter is not None
+                and counter["day"] == date.today()
+                and time.monotonic() - counter["loaded_at"] < setting.usage_counter_ttl_seconds
+            ):
+                return counter
+        return None
+
+    @staticmethod
+    def _rollup_queries(user_id: str, today: date) -> tuple:
+        return (
+            select(UserUsageDaily.bytes_used)
+            .where(UserUsageDaily.user_id == user_id, UserUsageDaily.day == today),
+            select(UserUsageMonthly.bytes_used)
+            .where(UserUsageMonthly.user_id == user_id, UserUsageMonthly.month == today.replace(day=1)),
+        )
+
+    def _store_counter(self, user_id: str, today: date, daily: int, monthly: int) -> dict:
+        with self.lock:
+            unflushed = sum(n for (uid, _), n in self.pending.items() if uid == user_id)
+            counter = {
+                "day": today,
+                "daily": (daily or 0) + unflushed,
+                "monthly": (monthly or 0) + unflushed,
+                "loaded_at": time.monotonic(),
+            }
+            self.counters[user_id] = counter
+            return counter
+
+    def _counter(self, db, user_id: str) -> dict:
+        counter = self._cached_counter(user_id)
+        if counter is not None:
+            return counter
+        today = date.today()
+        daily_query, monthly_query = self._rollup_queries(user_id, today)
+        return self._store_counter(user_id, today, db.execute(daily_query).scalar(), db.execute(monthly_query).scalar())
+
+    async def _counter_async(self, db, user_id: str) -> dict:
+        counter = self._cached_counter(user_id)
+        if counter is not None:
+            return counter
+        today = date.today()
+        daily_query, monthly_query = self._rollup_queries(user_id, today)
+        daily = (await db.execute(daily_query)).scalar()
+        monthly = (await db.execute(monthly_query)).scalar()
+        return self._store_counter(user_id, today, daily, monthly)
+
+    def usage(self, db, user_id: str) -> dict:
+        counter = self._counter(db, user_id)
+        return {"daily_bytes": counter["daily"], "monthly_bytes": counter["monthly"]}
+
+    @staticmethod
+    def _quota_reason(user, counter: dict) -> str:
+        if user.daily_bandwidth_limit is not None and counter["daily"] >= user.daily_bandwidth_limit * MEGABYTE:
+            return "Daily bandwidth limit reached"
+        if user.monthly_bandwidth_limit is not None and counter["monthly"] >= user.monthly_bandwidth_limit * MEGABYTE:
+            return "Monthly bandwidth limit reached"
+        return ""
+
+    def over_quota(self, db, user) -> str:
+        """Return why the user is over their bandwidth limit, or an empty string."""
+        if user.daily_bandwidth_limit is None and user.monthly_bandwidth_limit is None:
+            return ""
+        return self._quota_reason(user, self._counter(db, user.id))
+
+    async def over_quota_async(self, db, user) -> str:
+        if user.daily_bandwidth_limit is None and user.monthly_bandwidth_limit is None:
+            return ""
+        return self._quota_reason(user, await self._counter_async(db, user.id))
+
+    # nginx access log ingestion
+
+    def record_log_line(self, db, line: str):
+        """Parse a `$status $body_bytes_sent $request_uri` line and record it."""
+        parts = line.split()
+        if len(parts) < 3 or not parts[0].startswith("2"):
+            return
+        try:
+            nbytes = int(parts[1])
+        except ValueError:
+            return
+        uri = parts[2]
+
+        signed = SIGNED_PATH.search(uri)
+        if signed:
+            self.record(signed.group(1), signed.group(2), nbytes)
+            return
+
+        api = API_PATH.match(uri)
+        if api:
+            # Only owners can play their videos, so the owner is the viewer
+            access = get_video_access(db, api.group(1))
+            if access:
+                self.record(access[0], api.group(1), nbytes)
+
+    def tail_access_log(self, path: str):
+        """Follow the nginx usage log from its end, reopening it after rotation."""
+        handle, inode = None, None
+        from_start = False
+        db = SessionLocal()
+        try:
+            while not self.stop_event.is_set():
+                if handle is None:
+                    try:
+                        handle = open(path, "r", encoding="utf-8", errors="ignore")
+                    except FileNotFoundError:
+                        from_start = True
+                        self.stop_event.wait(5)
+                        continue
+                    inode = os.fstat(handle.fileno()).st_ino
+                    # A file that appeared after rotation only holds new traffic
+                    if not from_start:
+                        handle.seek(0, os.SEEK_END)
+
+                line = handle.readline()
+                if line:
+                    try:
+                        self.record_log_line(db, line)
+                    except Exception as e:
+                        db.rollback()
+                        logger.warning(f"Skipping usage log line: {str(e)}")
+                    continue
+
+                try:
+                    rotated = os.stat(path).st_ino != inode
+                except FileNotFoundError:
+                    rotated = True
+                if rotated:
+                    handle.close()
+                    handle = None
+                    from_start = True
+                db.close()
+                self.stop_event.wait(1)
+        finally:
+            if handle:
+                handle.close()
+            db.close()
+
+    # Lifecycle
+
+    def _flush_loop(self):
+        while not self.stop_event.wait(setting.usage_flush_seconds):
+            self.flush()
+
+    def start(self, tail_access_log: bool = False):
+        """
+        Start flushing. Only one process may tail usage_access_log, or every
+        line gets counted once per process: `tail_access_log` is set by the
+        single-process role "all" and by the worker, never by API workers.
+        """
+        self.stop_event.clear()
+        self.threads = [threading.Thread(target=self._flush_loop, daemon=True, name="usage-flush")]
+        if tail_access_log and setting.usage_access_log:
+            self.threads.append(threading.Thread(
+                target=self.tail_access_log,
+                args=(setting.usage_access_log,),
+                daemon=True,
+                name="usage-log-tailer"
+            ))
+        for thread in self.threads:
+            thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        for thread in self.threads:
+            thread.join(timeout=5)
+        self.flush()
+
+
+usage_recorder = UsageRecorder()
@@ -0,0 +1,47 @@
+"""
+Ingest worker process for deployments with process_role=api API processes.
+
+Claims the torrent jobs those processes insert into ingest_jobs, downloads
+and encodes them, and writes their progress back to the table:
+
+    process_role=worker python worker.py
+
+Run one per machine that should encode; several workers never claim the same job.
+"""
+
+import signal
+import logging
+import threading
+from config import setting
+from utils.migrations import upgrade_database
+from utils.ingest import JobTableBridge
+from utils.usage import usage_recorder
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    if setting.process_role != "worker":
+        raise SystemExit(f"worker.py runs with process_role=worker (got '{setting.process_role}')")
+    if setting.migrate_on_startup:
+        upgrade_database()
+
+    import index
+    index.start()
+    # The worker tails the nginx usage log, API workers don't (each would count it again)
+    usage_recorder.start(tail_access_log=True)
+    bridge = JobTableBridge()
+    bridge.start()
+    logging.getLogger(__name__).info(f"Ingest worker {bridge.worker_id} started")
+
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    signal.signal(signal.SIGINT, lambda *_: stop.set())
+    stop.wait()
+
+    index.stop()
+    bridge.stop()
+    usage_recorder.stop()
+
+
+if __name__ == "__main__":
+    main()